@@ -0,0 +1,28 @@
+"""content_fingerprint: stable per-account content hash on collected_posts
+
+Revision ID: 000001_fingerprint
+Revises: 000000_baseline
+Create Date: 2026-10-18 00:00:00.000000
+
+Existing rows start with NULL fingerprints (NULLs do not collide in the
+unique constraint). Run `python backfill_fingerprints.py` afterwards to
+collapse existing duplicates and fill the column.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000001_fingerprint'
+down_revision = '000000_baseline'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('collected_posts', sa.Column('content_fingerprint', sa.String(length=64), nullable=True))
+    op.create_index('ix_collected_posts_content_fingerprint', 'collected_posts', ['content_fingerprint'])
+    op.create_unique_constraint('_username_fingerprint_uc', 'collected_posts', ['username', 'content_fingerprint'])
+
+def downgrade():
+    op.drop_constraint('_username_fingerprint_uc', 'collected_posts', type_='unique')
+    op.drop_index('ix_collected_posts_content_fingerprint', table_name='collected_posts')
+    op.drop_column('collected_posts', 'content_fingerprint')
@@ -0,0 +1,77 @@
+"""post search: pg_trgm index and bigram tsvector on collected_posts
+
+Revision ID: 000002_search
+Revises: 000001_fingerprint
+Create Date: 2026-10-18 00:00:00.000000
+
+- pg_trgm GIN index on original_text so `ILIKE '%kw%'` (3文字以上) can use an index.
+- post_search_tsvector(): 日本語向けの文字バイグラム tsvector。
+  lower() + 空白除去した本文を2文字ずつに切り、位置付きの語彙素として格納する
+  (パーサーや辞書を通さないので、かな・漢字・記号もそのまま検索できる)。
+- post_search_tsquery(): 同じ正規化でキーワードをバイグラムの tsquery に変換する。
+  op='&' は全バイグラムを含む (fulltext)。op='<->' (隣接) は部分一致の絞り込みには使わない
+  (位置は least(i, 16383) で頭打ち、同じ語彙素の位置は 256 個までなので長い本文の一致を落とす)。
+- search_vector: 上記関数による GENERATED STORED 列 + GIN index。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '000002_search'
+down_revision = '000001_fingerprint'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.execute(r"""
+        CREATE OR REPLACE FUNCTION post_search_normalize(t text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$ SELECT regexp_replace(lower(coalesce(t, '')), '\s+', '', 'g') $$
+    """)
+    op.execute(r"""
+        CREATE OR REPLACE FUNCTION post_search_lexeme(t text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$ SELECT '''' || replace(replace(t, '\', '\\'), '''', '''''') || '''' $$
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION post_search_tsvector(t text) RETURNS tsvector
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+            SELECT coalesce(
+                string_agg(post_search_lexeme(substr(s, i, 2)) || ':' || least(i, 16383), ' '), ''
+            )::tsvector
+            FROM post_search_normalize(t) AS s, generate_series(1, length(s) - 1) AS i
+        $$
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION post_search_tsquery(q text, op text DEFAULT '&') RETURNS tsquery
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+            SELECT nullif(
+                coalesce(string_agg(post_search_lexeme(substr(s, i, 2)), ' ' || op || ' ' ORDER BY i), ''), ''
+            )::tsquery
+            FROM post_search_normalize(q) AS s, generate_series(1, length(s) - 1) AS i
+        $$
+    """)
+
+    op.create_index(
+        'ix_collected_posts_original_text_trgm', 'collected_posts', ['original_text'],
+        postgresql_using='gin', postgresql_ops={'original_text': 'gin_trgm_ops'}
+    )
+    op.add_column('collected_posts', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed('post_search_tsvector(original_text)', persisted=True), nullable=True
+    ))
+    op.create_index('ix_collected_posts_search_vector', 'collected_posts', ['search_vector'], postgresql_using='gin')
+
+def downgrade():
+    op.drop_index('ix_collected_posts_search_vector', table_name='collected_posts')
+    op.drop_column('collected_posts', 'search_vector')
+    op.drop_index('ix_collected_posts_original_text_trgm', table_name='collected_posts')
+    op.execute("DROP FUNCTION IF EXISTS post_search_tsquery(text, text)")
+    op.execute("DROP FUNCTION IF EXISTS post_search_tsvector(text)")
+    op.execute("DROP FUNCTION IF EXISTS post_search_lexeme(text)")
+    op.execute("DROP FUNCTION IF EXISTS post_search_normalize(text)")
@@ -0,0 +1,30 @@
+"""feed sort: composite (sort key, id) indexes on collected_posts
+
+Revision ID: 000003_feed_sort
+Revises: 000002_search
+Create Date: 2026-10-18 00:00:00.000000
+
+/api/filter-posts の並び順 (posted_at / like_count / retweet_count) ごとに
+キーセットページング `(key, id) < (:key, :id) ORDER BY key DESC, id DESC`
+をインデックスの逆順走査だけで返すための複合インデックス。
+like_count / retweet_count は NULL 許容なので coalesce(..., 0) の式インデックスにする
+(utils_feed.SORT_KEYS と同じ式)。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000003_feed_sort'
+down_revision = '000002_search'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_collected_posts_posted_at_id', 'collected_posts', ['posted_at', 'id'])
+    op.create_index('ix_collected_posts_like_count_id', 'collected_posts', [sa.text('coalesce(like_count, 0)'), 'id'])
+    op.create_index('ix_collected_posts_retweet_count_id', 'collected_posts', [sa.text('coalesce(retweet_count, 0)'), 'id'])
+
+def downgrade():
+    op.drop_index('ix_collected_posts_retweet_count_id', table_name='collected_posts')
+    op.drop_index('ix_collected_posts_like_count_id', table_name='collected_posts')
+    op.drop_index('ix_collected_posts_posted_at_id', table_name='collected_posts')
@@ -0,0 +1,21 @@
+"""history: (analyzed_at, id) index on analysis_results
+
+Revision ID: 000004_history
+Revises: 000003_feed_sort
+Create Date: 2026-10-18 00:00:00.000000
+
+/history のキーセットページング `ORDER BY analyzed_at DESC, id DESC` 用。
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '000004_history'
+down_revision = '000003_feed_sort'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_analysis_results_analyzed_at_id', 'analysis_results', ['analyzed_at', 'id'])
+
+def downgrade():
+    op.drop_index('ix_analysis_results_analyzed_at_id', table_name='analysis_results')
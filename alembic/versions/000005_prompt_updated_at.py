@@ -0,0 +1,23 @@
+"""prompt: updated_at column on prompts
+
+Revision ID: 000005_prompt
+Revises: 000004_history
+Create Date: 2026-10-18 00:00:00.000000
+
+/api/get-prompts の ETag (件数・最大 id・最大 updated_at) 用。既存行は created_at で埋める。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000005_prompt'
+down_revision = '000004_history'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('prompts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE prompts SET updated_at = COALESCE(created_at, now())")
+
+def downgrade():
+    op.drop_column('prompts', 'updated_at')
@@ -0,0 +1,104 @@
+"""heatmap: ticker_sentiment_daily rollup maintained by triggers
+
+Revision ID: 000006_heatmap
+Revises: 000005_prompt
+Create Date: 2026-10-18 00:00:00.000000
+
+/api/heatmap 用の集計表。(投稿日 = collected_posts.posted_at の UTC 日付, ticker) ごとの
+Positive / Negative / Neutral 件数を持つ。
+
+ticker_sentiment の INSERT / UPDATE / DELETE に文単位のトリガー (遷移テーブル) を掛け、
+変更された行の差分だけを集計表に加算する。バッチ分析の1コミットにつき集計表の数行を更新するだけで、
+読み取り側は ticker_sentiment / collected_posts を結合しない。
+複数行の upsert は (day, ticker) 順に行い、同時実行時のデッドロックを避ける。
+TRUNCATE では発火しないので、その場合は utils_heatmap.rebuild_heatmap_aggregates で作り直す。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000006_heatmap'
+down_revision = '000005_prompt'
+branch_labels = None
+depends_on = None
+
+ROLLUP_SELECT = """
+    SELECT p.posted_at::date AS day, s.ticker,
+           count(*) FILTER (WHERE lower(s.sentiment) = 'positive') AS positive,
+           count(*) FILTER (WHERE lower(s.sentiment) = 'negative') AS negative,
+           count(*) FILTER (WHERE lower(s.sentiment) = 'neutral') AS neutral,
+           count(*) AS total
+    FROM {rows} s JOIN collected_posts p ON p.id = s.collected_post_id
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+
+def _apply_delta(rows, sign):
+    return f"""
+        INSERT INTO ticker_sentiment_daily AS d (day, ticker, positive, negative, neutral, total)
+        SELECT day, ticker, {sign} positive, {sign} negative, {sign} neutral, {sign} total
+        FROM ({ROLLUP_SELECT.format(rows=rows)}) delta
+        ON CONFLICT (day, ticker) DO UPDATE SET
+            positive = d.positive + EXCLUDED.positive,
+            negative = d.negative + EXCLUDED.negative,
+            neutral = d.neutral + EXCLUDED.neutral,
+            total = d.total + EXCLUDED.total;
+    """
+
+
+def upgrade():
+    op.create_table(
+        'ticker_sentiment_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('ticker', sa.String(length=10), nullable=False),
+        sa.Column('positive', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('negative', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('neutral', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('day', 'ticker'),
+    )
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION ticker_sentiment_rollup() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                {_apply_delta('old_rows', '-')}
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                {_apply_delta('new_rows', '')}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER ticker_sentiment_rollup_insert AFTER INSERT ON ticker_sentiment
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ticker_sentiment_rollup()
+    """)
+    op.execute("""
+        CREATE TRIGGER ticker_sentiment_rollup_update AFTER UPDATE ON ticker_sentiment
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ticker_sentiment_rollup()
+    """)
+    op.execute("""
+        CREATE TRIGGER ticker_sentiment_rollup_delete AFTER DELETE ON ticker_sentiment
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ticker_sentiment_rollup()
+    """)
+
+    # 既存データから初期値を作る
+    op.execute(f"""
+        INSERT INTO ticker_sentiment_daily (day, ticker, positive, negative, neutral, total)
+        {ROLLUP_SELECT.format(rows='ticker_sentiment')}
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS ticker_sentiment_rollup_delete ON ticker_sentiment")
+    op.execute("DROP TRIGGER IF EXISTS ticker_sentiment_rollup_update ON ticker_sentiment")
+    op.execute("DROP TRIGGER IF EXISTS ticker_sentiment_rollup_insert ON ticker_sentiment")
+    op.execute("DROP FUNCTION IF EXISTS ticker_sentiment_rollup()")
+    op.drop_table('ticker_sentiment_daily')
@@ -0,0 +1,316 @@
+"""partitions: monthly range partitioning of collected_posts and ticker_sentiment
+
+Revision ID: 000007_partitions
+Revises: 000006_heatmap
+Create Date: 2026-10-18 00:00:00.000000
+
+collected_posts と ticker_sentiment を posted_at で月ごとにレンジ分割する (ticker_sentiment.posted_at は
+この版で追加する、対象投稿の posted_at の写し)。センチメントは必ず投稿と同じ月のパーティションに入る。パーティションは <table>_pYYYY_MM と、範囲外の行を受ける <table>_default。
+既存データの最古の月から今月 + MONTHS_AHEAD か月までを作り、以降は utils_partitions.ensure_partitions
+(worker.py の起動時 / cron) が先の月を作る。
+
+パーティション表の主キー・一意制約にはパーティションキーを含める必要があるため:
+- collected_posts: 主キー (id, posted_at)、一意制約 (post_id, posted_at) / (username, content_fingerprint, posted_at)。
+  これだけでは重複防止にならない (フィンガープリントは 48 時間バケットなので、相対時刻から取り込んだ同じ投稿でも
+  posted_at がずれる)。そこで全体で一意な post_id / (username, content_fingerprint) はパーティションしない
+  post_keys に持たせる。collected_posts の BEFORE INSERT トリガーがキーを登録し、既に別の投稿のキーがあれば
+  その行を黙って捨てる (以前の ON CONFLICT DO NOTHING と同じ振る舞い)。削除・更新もトリガーで post_keys に反映する。
+- ticker_sentiment: 主キー (id, posted_at)。collected_posts.id だけを参照する外部キーは張れないので、
+  (collected_post_id, posted_at) -> collected_posts (id, posted_at) の複合外部キーに張り替える。
+  archive_posts.py は投稿を先に消す / センチメントを先に戻すので DEFERRABLE INITIALLY DEFERRED にする。
+- analysis_posts_link: posted_at を持たないので collected_posts への外部キーは外す。
+  utils_partitions.detach_partitions_before が投稿の月を切り離すときに、同じトランザクションで
+  その月のリンク・post_keys・ticker_sentiment_daily の件数を片付け、ticker_sentiment の同じ月も切り離す。
+  孤立行は utils_partitions.check_consistency (python utils_partitions.py --check) で確かめられる。
+
+テーブルは作り直し (新しい親テーブルへ全行をコピー) なので、大きい DB ではメンテナンス時間を取って実行する。
+id のシーケンスはそのまま引き継ぐ。ticker_sentiment_daily のトリガーは新しい親テーブルに張り直す。
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000007_partitions'
+down_revision = '000006_heatmap'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+ROLLUP_TRIGGERS = {
+    'ticker_sentiment_rollup_insert': "AFTER INSERT ON ticker_sentiment REFERENCING NEW TABLE AS new_rows",
+    'ticker_sentiment_rollup_update': "AFTER UPDATE ON ticker_sentiment REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    'ticker_sentiment_rollup_delete': "AFTER DELETE ON ticker_sentiment REFERENCING OLD TABLE AS old_rows",
+}
+
+POST_COLUMNS = ("id, username, post_id, original_text, source_url, posted_at, like_count, retweet_count, "
+                "ai_summary, link_summary, content_fingerprint, created_at")
+SENTIMENT_COLUMNS = "id, analysis_result_id, collected_post_id, ticker, sentiment, reasoning"
+
+POST_KEY_TRIGGERS = {
+    'collected_posts_claim_key': "BEFORE INSERT ON collected_posts FOR EACH ROW EXECUTE FUNCTION collected_posts_claim_key()",
+    'collected_posts_update_keys': "AFTER UPDATE ON collected_posts REFERENCING NEW TABLE AS new_rows "
+                                   "FOR EACH STATEMENT EXECUTE FUNCTION collected_posts_update_keys()",
+    'collected_posts_release_keys': "AFTER DELETE ON collected_posts REFERENCING OLD TABLE AS old_rows "
+                                    "FOR EACH STATEMENT EXECUTE FUNCTION collected_posts_release_keys()",
+}
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partitions(table, first_month):
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    month = min(first_month or this_month, this_month)
+    while month <= _add_months(this_month, MONTHS_AHEAD):
+        upper = _add_months(month, 1)
+        op.execute(f"CREATE TABLE {table}_p{month.year:04d}_{month.month:02d} PARTITION OF {table} "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')")
+        month = upper
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def _first_month(sql):
+    value = op.get_bind().execute(sa.text(sql)).scalar()
+    return value.date().replace(day=1) if value else None
+
+
+def _drop_foreign_keys_to(table, referred):
+    inspector = sa.inspect(op.get_bind())
+    for fk in inspector.get_foreign_keys(table):
+        if fk['referred_table'] == referred and fk.get('name'):
+            op.drop_constraint(fk['name'], table, type_='foreignkey')
+
+
+def _drop_rollup_triggers():
+    for name in ROLLUP_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON ticker_sentiment")
+
+
+def _create_rollup_triggers():
+    for name, timing in ROLLUP_TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {timing} FOR EACH STATEMENT EXECUTE FUNCTION ticker_sentiment_rollup()")
+
+
+def _create_post_indexes():
+    op.create_index('ix_collected_posts_username', 'collected_posts', ['username'])
+    op.create_index('ix_collected_posts_post_id', 'collected_posts', ['post_id'])
+    op.create_index('ix_collected_posts_content_fingerprint', 'collected_posts', ['content_fingerprint'])
+    op.create_index('ix_collected_posts_posted_at_id', 'collected_posts', ['posted_at', 'id'])
+    op.execute("CREATE INDEX ix_collected_posts_like_count_id ON collected_posts (coalesce(like_count, 0), id)")
+    op.execute("CREATE INDEX ix_collected_posts_retweet_count_id ON collected_posts (coalesce(retweet_count, 0), id)")
+    op.create_index(
+        'ix_collected_posts_original_text_trgm', 'collected_posts', ['original_text'],
+        postgresql_using='gin', postgresql_ops={'original_text': 'gin_trgm_ops'}
+    )
+    op.create_index('ix_collected_posts_search_vector', 'collected_posts', ['search_vector'], postgresql_using='gin')
+    op.create_foreign_key('collected_posts_username_fkey', 'collected_posts', 'target_accounts',
+                          ['username'], ['username'])
+
+
+def _create_sentiment_indexes():
+    op.create_index('ix_ticker_sentiment_analysis_result_id', 'ticker_sentiment', ['analysis_result_id'])
+    op.create_index('ix_ticker_sentiment_collected_post_id', 'ticker_sentiment', ['collected_post_id'])
+    op.create_index('ix_ticker_sentiment_ticker', 'ticker_sentiment', ['ticker'])
+    op.create_foreign_key('ticker_sentiment_analysis_result_id_fkey', 'ticker_sentiment', 'analysis_results',
+                          ['analysis_result_id'], ['id'])
+    op.create_foreign_key('ticker_sentiment_ticker_fkey', 'ticker_sentiment', 'stock_ticker_map',
+                          ['ticker'], ['ticker'])
+
+
+def _create_sentiment_post_fkey():
+    op.create_foreign_key('ticker_sentiment_collected_post_fkey', 'ticker_sentiment', 'collected_posts',
+                          ['collected_post_id', 'posted_at'], ['id', 'posted_at'],
+                          deferrable=True, initially='DEFERRED')
+
+
+def _create_post_keys():
+    """post_keys と、collected_posts から post_keys を保つトリガーを作る (既存行のキーも入れる)。"""
+    op.execute("""
+        CREATE TABLE post_keys (
+            post_id varchar NOT NULL PRIMARY KEY,
+            username varchar NOT NULL,
+            content_fingerprint varchar(64),
+            CONSTRAINT post_keys_username_fingerprint_uc UNIQUE (username, content_fingerprint)
+        )
+    """)
+    op.execute("INSERT INTO post_keys (post_id, username, content_fingerprint) "
+               "SELECT post_id, username, content_fingerprint FROM collected_posts")
+    # キーが既にあっても、それが同じ投稿のキー (utils_db.claim_post_key で先に登録したもの) で
+    # 投稿がまだ保存されていなければ通す。キーの行をロックしてから確かめるので、同時に同じ投稿を入れても1件になる
+    op.execute("""
+        CREATE OR REPLACE FUNCTION collected_posts_claim_key() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO post_keys (post_id, username, content_fingerprint)
+            VALUES (NEW.post_id, NEW.username, NEW.content_fingerprint)
+            ON CONFLICT DO NOTHING;
+            IF FOUND THEN
+                RETURN NEW;
+            END IF;
+            PERFORM 1 FROM post_keys k
+            WHERE k.post_id = NEW.post_id AND k.username = NEW.username
+              AND k.content_fingerprint IS NOT DISTINCT FROM NEW.content_fingerprint
+            FOR UPDATE;
+            IF FOUND AND NOT EXISTS (SELECT 1 FROM collected_posts p WHERE p.post_id = NEW.post_id) THEN
+                RETURN NEW;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION collected_posts_update_keys() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE post_keys k SET username = n.username, content_fingerprint = n.content_fingerprint
+            FROM new_rows n
+            WHERE k.post_id = n.post_id
+              AND (k.username, k.content_fingerprint) IS DISTINCT FROM (n.username, n.content_fingerprint);
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION collected_posts_release_keys() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            DELETE FROM post_keys k USING old_rows o WHERE k.post_id = o.post_id;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for name, definition in POST_KEY_TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {definition}")
+
+
+def _drop_post_keys():
+    for name in POST_KEY_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON collected_posts")
+    for function in POST_KEY_TRIGGERS:
+        op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+    op.execute("DROP TABLE IF EXISTS post_keys")
+
+
+POSTS_TABLE_BODY = """
+    id integer NOT NULL DEFAULT nextval('collected_posts_id_seq'::regclass),
+    username varchar NOT NULL,
+    post_id varchar NOT NULL,
+    original_text text NOT NULL,
+    source_url varchar NOT NULL,
+    posted_at timestamp NOT NULL,
+    like_count integer,
+    retweet_count integer,
+    ai_summary text,
+    link_summary text,
+    content_fingerprint varchar(64),
+    search_vector tsvector GENERATED ALWAYS AS (post_search_tsvector(original_text)) STORED,
+    created_at timestamp
+"""
+
+SENTIMENT_TABLE_BODY = """
+    id integer NOT NULL DEFAULT nextval('ticker_sentiment_id_seq'::regclass),
+    analysis_result_id integer NOT NULL,
+    collected_post_id integer NOT NULL,
+    ticker varchar(10) NOT NULL,
+    sentiment varchar(10) NOT NULL,
+    reasoning text
+"""
+SENTIMENT_POSTED_AT = ", posted_at timestamp NOT NULL"
+
+
+def upgrade():
+    _drop_foreign_keys_to('ticker_sentiment', 'collected_posts')
+    _drop_foreign_keys_to('analysis_posts_link', 'collected_posts')
+    _drop_rollup_triggers()
+
+    # --- collected_posts: posted_at で月ごと ---
+    first_post_month = _first_month("SELECT min(posted_at) FROM collected_posts")
+    op.execute("ALTER TABLE collected_posts RENAME TO collected_posts_old")
+    op.execute(f"CREATE TABLE collected_posts ({POSTS_TABLE_BODY}) PARTITION BY RANGE (posted_at)")
+    _create_partitions('collected_posts', first_post_month)
+    op.execute(f"INSERT INTO collected_posts ({POST_COLUMNS}) SELECT {POST_COLUMNS} FROM collected_posts_old")
+    op.execute("ALTER SEQUENCE collected_posts_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE collected_posts_old")
+    op.execute("ALTER SEQUENCE collected_posts_id_seq OWNED BY collected_posts.id")
+    op.create_primary_key('collected_posts_pkey', 'collected_posts', ['id', 'posted_at'])
+    op.create_unique_constraint('collected_posts_post_id_key', 'collected_posts', ['post_id', 'posted_at'])
+    op.create_unique_constraint('_username_fingerprint_uc', 'collected_posts',
+                                ['username', 'content_fingerprint', 'posted_at'])
+    _create_post_indexes()
+    _create_post_keys()
+
+    # --- ticker_sentiment: 対象投稿の posted_at で月ごと (投稿と同じ月の範囲を作る) ---
+    op.execute("ALTER TABLE ticker_sentiment RENAME TO ticker_sentiment_old")
+    op.execute(f"CREATE TABLE ticker_sentiment ({SENTIMENT_TABLE_BODY}{SENTIMENT_POSTED_AT}) PARTITION BY RANGE (posted_at)")
+    _create_partitions('ticker_sentiment', first_post_month)
+    # 以前は collected_posts への外部キーがあったので、内部結合で落ちる行はない
+    op.execute(f"""
+        INSERT INTO ticker_sentiment ({SENTIMENT_COLUMNS}, posted_at)
+        SELECT s.id, s.analysis_result_id, s.collected_post_id, s.ticker, s.sentiment, s.reasoning, p.posted_at
+        FROM ticker_sentiment_old s JOIN collected_posts p ON p.id = s.collected_post_id
+    """)
+    op.execute("ALTER SEQUENCE ticker_sentiment_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE ticker_sentiment_old")
+    op.execute("ALTER SEQUENCE ticker_sentiment_id_seq OWNED BY ticker_sentiment.id")
+    op.create_primary_key('ticker_sentiment_pkey', 'ticker_sentiment', ['id', 'posted_at'])
+    _create_sentiment_indexes()
+    _create_sentiment_post_fkey()
+    _create_rollup_triggers()
+
+    op.execute("ANALYZE collected_posts")
+    op.execute("ANALYZE ticker_sentiment")
+
+
+def downgrade():
+    _drop_rollup_triggers()
+
+    # --- ticker_sentiment を通常のテーブルに戻す (posted_at は落とす) ---
+    op.execute("ALTER TABLE ticker_sentiment RENAME TO ticker_sentiment_old")
+    op.execute("ALTER TABLE ticker_sentiment_old DROP CONSTRAINT ticker_sentiment_collected_post_fkey")
+    op.execute("ALTER TABLE ticker_sentiment_old DROP CONSTRAINT ticker_sentiment_pkey")
+    for name in ('ix_ticker_sentiment_analysis_result_id', 'ix_ticker_sentiment_collected_post_id', 'ix_ticker_sentiment_ticker'):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    for name in ('ticker_sentiment_analysis_result_id_fkey', 'ticker_sentiment_ticker_fkey'):
+        op.execute(f"ALTER TABLE ticker_sentiment_old DROP CONSTRAINT IF EXISTS {name}")
+    op.execute(f"CREATE TABLE ticker_sentiment ({SENTIMENT_TABLE_BODY})")
+    op.execute(f"INSERT INTO ticker_sentiment ({SENTIMENT_COLUMNS}) SELECT {SENTIMENT_COLUMNS} FROM ticker_sentiment_old")
+    op.execute("ALTER SEQUENCE ticker_sentiment_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE ticker_sentiment_old")
+    op.execute("ALTER SEQUENCE ticker_sentiment_id_seq OWNED BY ticker_sentiment.id")
+    op.create_primary_key('ticker_sentiment_pkey', 'ticker_sentiment', ['id'])
+    op.create_index('ix_ticker_sentiment_id', 'ticker_sentiment', ['id'])
+    _create_sentiment_indexes()
+
+    # --- collected_posts を通常のテーブルに戻す ---
+    _drop_post_keys()
+    op.execute("ALTER TABLE collected_posts RENAME TO collected_posts_old")
+    op.execute("ALTER TABLE collected_posts_old DROP CONSTRAINT collected_posts_pkey")
+    op.execute("ALTER TABLE collected_posts_old DROP CONSTRAINT collected_posts_post_id_key")
+    op.execute("ALTER TABLE collected_posts_old DROP CONSTRAINT _username_fingerprint_uc")
+    op.execute("ALTER TABLE collected_posts_old DROP CONSTRAINT IF EXISTS collected_posts_username_fkey")
+    for name in ('ix_collected_posts_username', 'ix_collected_posts_post_id', 'ix_collected_posts_content_fingerprint',
+                 'ix_collected_posts_posted_at_id', 'ix_collected_posts_like_count_id',
+                 'ix_collected_posts_retweet_count_id', 'ix_collected_posts_original_text_trgm',
+                 'ix_collected_posts_search_vector'):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(f"CREATE TABLE collected_posts ({POSTS_TABLE_BODY})")
+    op.execute(f"INSERT INTO collected_posts ({POST_COLUMNS}) SELECT {POST_COLUMNS} FROM collected_posts_old")
+    op.execute("ALTER SEQUENCE collected_posts_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE collected_posts_old")
+    op.execute("ALTER SEQUENCE collected_posts_id_seq OWNED BY collected_posts.id")
+    op.create_primary_key('collected_posts_pkey', 'collected_posts', ['id'])
+    op.create_index('ix_collected_posts_id', 'collected_posts', ['id'])
+    op.create_unique_constraint('collected_posts_post_id_key', 'collected_posts', ['post_id'])
+    op.create_unique_constraint('_username_fingerprint_uc', 'collected_posts', ['username', 'content_fingerprint'])
+    _create_post_indexes()
+
+    op.create_foreign_key('ticker_sentiment_collected_post_id_fkey', 'ticker_sentiment', 'collected_posts',
+                          ['collected_post_id'], ['id'])
+    op.create_foreign_key('analysis_posts_link_collected_post_id_fkey', 'analysis_posts_link', 'collected_posts',
+                          ['collected_post_id'], ['id'])
+    _create_rollup_triggers()
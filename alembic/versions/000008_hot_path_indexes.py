@@ -0,0 +1,81 @@
+"""indexes: composite indexes for the hot-path queries (built CONCURRENTLY)
+
+Revision ID: 000008_indexes
+Revises: 000007_partitions
+Create Date: 2026-10-18 00:00:00.000000
+
+index_advisor.py の EXPLAIN (ANALYZE, BUFFERS) で Seq Scan / Sort が出ていたクエリ用:
+- collected_posts (username, id): worker の「アカウントの最新投稿」(username = ? ORDER BY id DESC LIMIT 1) と
+  /api/filter-posts のアカウント絞り込み + 既定の id 降順。
+- ticker_sentiment (ticker, sentiment, collected_post_id): /api/filter-posts の銘柄 / センチメントの EXISTS。
+- analysis_posts_link (collected_post_id, analysis_result_id): 投稿 -> 分析結果の逆引き (主キーは逆順)。
+
+書き込みを止めないように CONCURRENTLY で作る (トランザクション外で実行するため autocommit_block)。
+パーティション表の親には CREATE INDEX CONCURRENTLY が使えないので、親に ON ONLY で (無効な) インデックスを作り、
+各パーティションに CONCURRENTLY で作ったものを ATTACH する。全パーティションが付くと親のインデックスが有効になり、
+以降 utils_partitions が作るパーティションには自動で作られる。
+途中で失敗して INVALID のまま残ったインデックスは作り直すので、再実行してよい。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000008_indexes'
+down_revision = '000007_partitions'
+branch_labels = None
+depends_on = None
+
+# (テーブル, インデックス名, 列, パーティション側の名前の接尾辞)
+INDEXES = [
+    ('collected_posts', 'ix_collected_posts_username_id', 'username, id', 'username_id_idx'),
+    ('ticker_sentiment', 'ix_ticker_sentiment_ticker_sentiment_post', 'ticker, sentiment, collected_post_id',
+     'ticker_sentiment_post_idx'),
+    ('analysis_posts_link', 'ix_analysis_posts_link_collected_post_id', 'collected_post_id, analysis_result_id', None),
+]
+
+
+def _scalar(sql, **params):
+    return op.get_bind().execute(sa.text(sql), params).scalar()
+
+
+def _is_partitioned(table):
+    return _scalar("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)", table=table) is True
+
+
+def _partitions(table):
+    return list(op.get_bind().execute(sa.text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+        ORDER BY c.relname
+    """), {"table": table}).scalars())
+
+
+def _create_concurrently(name, table, columns):
+    """CONCURRENTLY で作る。前回の失敗で INVALID のまま残っていれば消してから作り直す。"""
+    if _scalar("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)", name=name):
+        op.execute(f"DROP INDEX CONCURRENTLY {name}")
+    op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for table, name, columns, suffix in INDEXES:
+            if not _is_partitioned(table):
+                _create_concurrently(name, table, columns)
+                continue
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} ({columns})")
+            for partition in _partitions(table):
+                partition_index = f"{partition}_{suffix}"
+                _create_concurrently(partition_index, partition, columns)
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+        for table, _, _, _ in INDEXES:
+            op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, name, _, _ in reversed(INDEXES):
+            # パーティション表の親のインデックスは CONCURRENTLY で消せない (各パーティションのものも一緒に消える)
+            concurrently = "" if _is_partitioned(table) else "CONCURRENTLY "
+            op.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
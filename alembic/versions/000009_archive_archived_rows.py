@@ -0,0 +1,142 @@
+"""archive: keep the keys and heatmap counts of archived posts
+
+Revision ID: 000009_archive
+Revises: 000008_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+archive_posts.py で Parquet に移した投稿の扱いを、削除の順番に頼らず明示的にする。
+- post_keys.archived: アーカイブ済みの投稿のキーは残す (削除トリガーは archived のキーを消さない)。
+  残さないとインポート / worker が同じ投稿を新規とみなして再分析する (課金される)。
+  archived のキーの投稿は rehydrate の INSERT だけが通り (archive.rehydrate 設定)、そのとき archived を外す。
+- ticker_sentiment_daily_archived: アーカイブした月の (日, 銘柄) ごとの件数。ticker_sentiment_daily は
+  これを含んだ合計のまま保ち、utils_heatmap.rebuild_heatmap_aggregates は ticker_sentiment とこの表から作り直す。
+- ticker_sentiment_rollup(): collected_posts と結合せず ticker_sentiment.posted_at (000007 で追加した写し) で
+  日付を出す。投稿が先に消えていても差分が出るので、件数は削除 / 挿入の順番に左右されない。
+
+この版より前にアーカイブした月の件数は ticker_sentiment_daily に残っているが、この表には入っていない。
+python archive_posts.py rollup でアーカイブのファイルから作り直せる。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000009_archive'
+down_revision = '000008_indexes'
+branch_labels = None
+depends_on = None
+
+ROLLUP_SELECT = """
+    SELECT {day} AS day, s.ticker,
+           count(*) FILTER (WHERE lower(s.sentiment) = 'positive') AS positive,
+           count(*) FILTER (WHERE lower(s.sentiment) = 'negative') AS negative,
+           count(*) FILTER (WHERE lower(s.sentiment) = 'neutral') AS neutral,
+           count(*) AS total
+    FROM {rows} s {join}
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+
+def _apply_delta(rows, sign, day, join):
+    select = ROLLUP_SELECT.format(rows=rows, day=day, join=join)
+    return f"""
+        INSERT INTO ticker_sentiment_daily AS d (day, ticker, positive, negative, neutral, total)
+        SELECT day, ticker, {sign} positive, {sign} negative, {sign} neutral, {sign} total
+        FROM ({select}) delta
+        ON CONFLICT (day, ticker) DO UPDATE SET
+            positive = d.positive + EXCLUDED.positive,
+            negative = d.negative + EXCLUDED.negative,
+            neutral = d.neutral + EXCLUDED.neutral,
+            total = d.total + EXCLUDED.total;
+    """
+
+
+def _create_rollup_function(day, join):
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION ticker_sentiment_rollup() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                {_apply_delta('old_rows', '-', day, join)}
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                {_apply_delta('new_rows', '', day, join)}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+
+
+def _create_claim_key_function(unarchive):
+    """
+    000007_partitions と同じ。unarchive なら、archived のキーは rehydrate (SET LOCAL archive.rehydrate = 'on')
+    の INSERT だけを通し、通した行のキーの archived を外す。
+    """
+    archived = """
+              AND (NOT k.archived OR current_setting('archive.rehydrate', true) = 'on')""" if unarchive else ""
+    release = """
+                UPDATE post_keys SET archived = false WHERE post_id = NEW.post_id AND archived;""" if unarchive else ""
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION collected_posts_claim_key() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO post_keys (post_id, username, content_fingerprint)
+            VALUES (NEW.post_id, NEW.username, NEW.content_fingerprint)
+            ON CONFLICT DO NOTHING;
+            IF FOUND THEN
+                RETURN NEW;
+            END IF;
+            PERFORM 1 FROM post_keys k
+            WHERE k.post_id = NEW.post_id AND k.username = NEW.username
+              AND k.content_fingerprint IS NOT DISTINCT FROM NEW.content_fingerprint{archived}
+            FOR UPDATE;
+            IF FOUND AND NOT EXISTS (SELECT 1 FROM collected_posts p WHERE p.post_id = NEW.post_id) THEN{release}
+                RETURN NEW;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+
+
+def _create_release_keys_function(keep_archived):
+    condition = " AND NOT k.archived" if keep_archived else ""
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION collected_posts_release_keys() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            DELETE FROM post_keys k USING old_rows o WHERE k.post_id = o.post_id{condition};
+            RETURN NULL;
+        END
+        $$
+    """)
+
+
+def upgrade():
+    op.add_column('post_keys', sa.Column('archived', sa.Boolean(), nullable=False, server_default=sa.false()))
+    _create_claim_key_function(unarchive=True)
+    _create_release_keys_function(keep_archived=True)
+
+    op.create_table(
+        'ticker_sentiment_daily_archived',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('ticker', sa.String(length=10), nullable=False),
+        sa.Column('positive', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('negative', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('neutral', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('day', 'ticker'),
+    )
+    _create_rollup_function("s.posted_at::date", "")
+
+
+def downgrade():
+    _create_rollup_function("p.posted_at::date", "JOIN collected_posts p ON p.id = s.collected_post_id")
+    op.drop_table('ticker_sentiment_daily_archived')
+
+    _create_release_keys_function(keep_archived=False)
+    _create_claim_key_function(unarchive=False)
+    # 残したキー (投稿が無い) は以前の振る舞いどおり消す
+    op.execute("DELETE FROM post_keys WHERE archived")
+    op.drop_column('post_keys', 'archived')
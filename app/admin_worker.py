@@ -6,15 +6,20 @@ This blueprint expects:
 - WORKER_CONFIRM_PHRASE or default "RUN_WORKER" in config/env
 - ADMIN_USERS (optional) env var as comma-separated admin usernames if User model lacks is_admin
 """
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, abort
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, abort, jsonify
 from flask_login import login_required, current_user
 import os
 import sys
 import subprocess
 from pathlib import Path
 import time
+import json
 import logging
 import threading
+import uuid
+from datetime import datetime, timezone
+
+from worker_events import parse_event_line
 
 admin_bp = Blueprint("admin_worker", __name__, template_folder="templates")
 
@@ -24,6 +29,10 @@ PID_FILE = Path("/tmp/worker_runner.pid")
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / "worker_run.log"
+# worker の進捗イベント (1行1 JSON)。worker を起動するたびに別ファイルとして作り直し、
+# 先頭行に実行ごとの run_id を書く (画面は run_id が変わったら offset 0 から読み直す)
+EVENTS_FILE = LOG_DIR / "worker_events.jsonl"
+LOG_TAIL_MAX_BYTES = 64 * 1024
 ADMIN_ACTION_LOG = LOG_DIR / "admin_actions.log"
 
 # Setup logger for admin actions
@@ -41,60 +50,131 @@ if not any(isinstance(h, logging.StreamHandler) for h in logger.handlers):
     sh.setFormatter(formatter)  # 上で作った formatter を使うか再定義
     logger.addHandler(sh)
 
-def _stream_process_output_to_file_and_stdout(proc, logfile_path):
+def _write_to_stdout(line: bytes) -> None:
+    # stdout にも書く（Render の Logs に流す）
+    try:
+        sys.stdout.buffer.write(line)
+        sys.stdout.buffer.flush()
+    except Exception:
+        # Python implementation 依存で buffer が無い場合 fallback
+        try:
+            sys.stdout.write(line.decode(errors="ignore"))
+            sys.stdout.flush()
+        except Exception:
+            pass
+
+
+def _append_event(events_file, payload: dict) -> None:
+    events_file.write((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+    events_file.flush()
+
+
+def _new_events_file(path: Path) -> str:
+    """
+    path を新しい run_id の見出し行だけのファイルに置き換え、run_id を返す。
+    切り詰めではなく置き換えなので、読み手は 1 つのファイルから run_id と offset を一貫して読める。
+    """
+    run_id = uuid.uuid4().hex
+    header = {"event": "events_opened", "run_id": run_id, "ts": datetime.now(timezone.utc).isoformat()}
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes((json.dumps(header) + "\n").encode("utf-8"))
+    os.replace(tmp, path)
+    return run_id
+
+
+def _relay_process_output(proc, logfile_path, events_path):
     """
-    Read proc.stdout and write each line to logfile_path (append) and to sys.stdout.
-    Non-blocking: run in a daemon thread.
+    Relay proc.stdout line by line to logfile_path (append) and sys.stdout, and
+    append worker progress events (worker_events) to events_path.
+    readline() blocks until the worker writes a line or exits, so there is no
+    polling loop. Run in a daemon thread.
     """
     try:
-        # バイナリで開いてそのまま書く
-        with open(logfile_path, "ab") as f:
-            while True:
-                line = proc.stdout.readline()
-                if not line:
-                    # プロセス終了してもう読み出せない場合はループを抜ける
-                    if proc.poll() is not None:
-                        break
-                    # そうでなければ小さいスリープで待つ
-                    time.sleep(0.1)
-                    continue
-                try:
-                    # ファイルへ書き込み
-                    f.write(line)
-                    f.flush()
-                    # stdout にも書く（Render の Logs に流す）
-                    try:
-                        sys.stdout.buffer.write(line)
-                        sys.stdout.buffer.flush()
-                    except Exception:
-                        # Python implementation 依存で buffer が無い場合 fallback
-                        try:
-                            sys.stdout.write(line.decode(errors="ignore"))
-                            sys.stdout.flush()
-                        except Exception:
-                            pass
-                except Exception:
-                    # ファイル書き込み失敗でもループは継続
-                    current_app.logger.exception("Error while streaming process output")
-            # 最後に残りを読んで終了
-            remaining = proc.stdout.read()
-            if remaining:
+        with open(logfile_path, "ab") as log_file, open(events_path, "ab") as events_file:
+            for line in iter(proc.stdout.readline, b""):
                 try:
-                    f.write(remaining)
-                    f.flush()
-                    try:
-                        sys.stdout.buffer.write(remaining)
-                        sys.stdout.buffer.flush()
-                    except Exception:
-                        try:
-                            sys.stdout.write(remaining.decode(errors="ignore"))
-                            sys.stdout.flush()
-                        except Exception:
-                            pass
+                    log_file.write(line)
+                    log_file.flush()
+                    _write_to_stdout(line)
+                    event = parse_event_line(line)
+                    if event is not None:
+                        _append_event(events_file, event)
                 except Exception:
-                    current_app.logger.exception("Error while flushing remaining output")
+                    # 書き込み失敗でもループは継続
+                    logger.exception("Error while relaying worker output")
+            returncode = proc.wait()
+            _append_event(events_file, {
+                "event": "process_exited",
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "pid": proc.pid,
+                "returncode": returncode,
+            })
     except Exception:
-        current_app.logger.exception("_stream_process_output_to_file_and_stdout failed")
+        logger.exception("_relay_process_output failed")
+
+
+def _read_from_offset(path: Path, offset: int, max_bytes: int):
+    """
+    path の offset 以降の完全な行 (最大 max_bytes) を読む。
+    offset < 0 なら末尾 max_bytes から、ファイルが offset より短ければ (作り直された) 先頭から読む。
+
+    Returns:
+        (data, 実際に読み始めた offset, 次の offset, ファイルサイズ)
+    """
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return b"", 0, 0, 0
+    from_tail = offset < 0
+    if from_tail:
+        offset = max(0, size - max_bytes)
+    elif offset > size:
+        offset = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    if from_tail and offset > 0 and b"\n" in data:
+        # 末尾からの読み出しは行の途中から始まりうるので、最初の改行までを捨てる
+        cut = data.index(b"\n") + 1
+        data, offset = data[cut:], offset + cut
+    # 書き込み途中の最終行は次回に回す
+    complete = data[:data.rfind(b"\n") + 1]
+    return complete, offset, offset + len(complete), size
+
+
+def _read_events(path: Path, run_id: str, offset: int):
+    """
+    イベントファイルの offset 以降の完全な行を読む。先頭行の run_id が run_id と違えば
+    (別の実行のファイルに置き換わった) 先頭から読み直す。
+
+    Returns:
+        (ファイルの run_id, 読み直したか, イベントのリスト, 次の offset)
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None, bool(run_id), [], 0
+    with f:
+        header = f.readline()
+        try:
+            current = json.loads(header).get("run_id")
+        except ValueError:
+            current = None
+        reset = current != run_id or offset > os.fstat(f.fileno()).st_size
+        # 見出し行は返さない
+        offset = len(header) if reset else max(offset, len(header))
+        f.seek(offset)
+        data = f.read(LOG_TAIL_MAX_BYTES)
+    # 書き込み途中の最終行は次回に回す
+    complete = data[:data.rfind(b"\n") + 1]
+    events = []
+    for line in complete.splitlines():
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue
+    return current, reset, events, offset + len(complete)
+
 
 def is_worker_running() -> bool:
     if not PID_FILE.exists():
@@ -191,21 +271,28 @@ def worker_settings():
 
             # Start detached process and log output
             try:
-                # proc を PIPE で開始
+                # 前回の実行のイベントは新しい run_id のファイルに置き換える
+                _new_events_file(EVENTS_FILE)
+                # proc を PIPE で開始。print がブロックバッファされないよう unbuffered にする
+                env = os.environ.copy()
+                env["PYTHONUNBUFFERED"] = "1"
+                # gunicorn 用の集計ディレクトリを継承すると、worker の値が /metrics に混ざり、ファイルも消されずに残る
+                # (worker の値は export_worker_metrics で textfile / Pushgateway に出す)
+                env.pop("PROMETHEUS_MULTIPROC_DIR", None)
                 proc = subprocess.Popen(
                     cmd,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
                     cwd=cwd,
-                    env=os.environ.copy()
+                    env=env
                 )
                 # PID ファイルに書く
                 PID_FILE.write_text(str(proc.pid))
 
                 # スレッドで stdout を読み取り、ファイルと親 stdout に中継
                 t = threading.Thread(
-                    target=_stream_process_output_to_file_and_stdout,
-                    args=(proc, str(LOG_FILE)),
+                    target=_relay_process_output,
+                    args=(proc, str(LOG_FILE), str(EVENTS_FILE)),
                     daemon=True,
                 )
                 t.start()
@@ -240,4 +327,50 @@ def worker_settings():
             return redirect(url_for(".worker_settings"))
 
     # Render GET: CSRF token injected via Flask-WTF; template should include {{ csrf_token() }}
-    return render_template("admin/worker_settings.html", status=status, pid=pid, log_file=str(LOG_FILE), required_phrase=current_app.config.get("WORKER_CONFIRM_PHRASE", "RUN_WORKER"))
\ No newline at end of file
+    return render_template("admin/worker_settings.html", status=status, pid=pid, log_file=str(LOG_FILE), required_phrase=current_app.config.get("WORKER_CONFIRM_PHRASE", "RUN_WORKER"))
+
+
+@admin_bp.route("/admin/worker/log", methods=["GET"])
+@login_required
+def worker_log_tail():
+    """Offset-based tail of worker_run.log: ?offset=N (omit for the last 64 KB)."""
+    require_admin_or_abort()
+    offset = request.args.get("offset", type=int, default=-1)
+    data, _, next_offset, size = _read_from_offset(LOG_FILE, offset, LOG_TAIL_MAX_BYTES)
+    return jsonify({
+        "offset": next_offset,
+        "size": size,
+        "text": data.decode("utf-8", errors="replace"),
+        "running": is_worker_running(),
+    })
+
+
+@admin_bp.route("/admin/worker/events", methods=["GET"])
+@login_required
+def worker_events_poll():
+    """
+    Offset-based poll of worker_events.jsonl: ?run=<run_id>&offset=N.
+    A different run id (a new worker run replaced the file) restarts from 0
+    and sets "reset". Plain polling keeps the sync gunicorn workers free.
+    """
+    require_admin_or_abort()
+    run_id, reset, events, next_offset = _read_events(
+        EVENTS_FILE, request.args.get("run", ""), request.args.get("offset", type=int, default=0)
+    )
+    return jsonify({
+        "run": run_id,
+        "reset": reset,
+        "offset": next_offset,
+        "events": events,
+        "running": is_worker_running(),
+    })
+
+@admin_bp.route("/admin/db-pool", methods=["GET"])
+@login_required
+def db_pool_status():
+    """Connection pool snapshot of this process (size, checked out, checkout wait percentiles)."""
+    require_admin_or_abort()
+    # imported here so that importing the blueprint does not create the engine
+    from models import engine
+    from db_pool import pool_stats
+    return jsonify(pool_stats(engine))
@@ -0,0 +1,56 @@
+"""Request-scoped SQLAlchemy sessions for the Flask app.
+
+Views call get_db() instead of SessionLocal(): the first call in a request
+opens a session and stores it on flask.g. Later calls in the same request
+(user_loader, helpers, the view itself) reuse it, and teardown closes it, so a
+request holds at most one pooled connection.
+
+DB_STATEMENT_TIMEOUT_MS (0 = off) sets `SET LOCAL statement_timeout` for every
+transaction of a request session. It applies only to web requests; the
+worker, importers and CLI scripts keep using SessionLocal without a timeout.
+"""
+import os
+
+from flask import g
+from sqlalchemy import event, text
+
+from models import SessionLocal
+
+try:
+    STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+except ValueError:
+    STATEMENT_TIMEOUT_MS = 0
+
+_G_KEY = "_db_session"
+
+
+def get_db():
+    """Return this request's session, creating it on first use."""
+    db = g.get(_G_KEY)
+    if db is None:
+        db = SessionLocal()
+        db.info["request_scoped"] = True
+        setattr(g, _G_KEY, db)
+    return db
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    if STATEMENT_TIMEOUT_MS > 0 and session.info.get("request_scoped"):
+        connection.execute(text(f"SET LOCAL statement_timeout = {STATEMENT_TIMEOUT_MS}"))
+
+
+def close_db(exc=None):
+    db = g.pop(_G_KEY, None)
+    if db is None:
+        return
+    try:
+        if exc is not None:
+            db.rollback()
+    finally:
+        db.close()
+
+
+def init_db_session(app):
+    """Register the teardown handler that closes the request session."""
+    app.teardown_appcontext(close_db)
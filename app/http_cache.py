@@ -0,0 +1,110 @@
+"""Conditional GET (ETag / 304) and response compression for the JSON APIs.
+
+Views build a strong ETag from a content version (make_etag) or from the
+serialized body (json_with_etag) and answer 304 Not Modified when the client
+sends a matching If-None-Match. The fetch helper in static/js/httpCache.js
+keeps the last body per request and sends the header. POST endpoints such
+as /api/filter-posts need it because the browser HTTP cache never stores POST
+responses.
+
+init_http_cache(app) registers an after_request hook. It compresses JSON
+responses of at least COMPRESS_MIN_BYTES with brotli, when the optional
+`brotli` package is installed and the client accepts it, or with gzip. The
+encoding is appended to the ETag ("<tag>--gzip"), so each representation
+keeps a distinct strong validator. etag_matches() strips the suffix again.
+"""
+import gzip
+import hashlib
+import os
+
+from flask import current_app, jsonify, request
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_MIMETYPES = {"application/json"}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+_ENCODING_SEP = "--"
+
+# キャッシュはさせるが毎回検証させる (ログインユーザー専用のデータなので private)
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """バージョンを表す値 (件数・最大 id・最大 updated_at など) から強い ETag を作る。"""
+    return hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def etag_matches(etag: str) -> bool:
+    """リクエストの If-None-Match が etag (圧縮時のサフィックス付きを含む) に一致するか。"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    if if_none_match.star_tag:
+        return True
+    return any(tag.split(_ENCODING_SEP, 1)[0] == etag for tag in if_none_match.as_set())
+
+
+def not_modified(etag: str):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def json_with_etag(payload, etag: str = None):
+    """
+    payload を JSON で返す。etag 省略時は本文のハッシュを ETag にする。
+    クライアントの If-None-Match が一致すれば本文なしの 304 を返す。
+    """
+    response = jsonify(payload)
+    if etag is None:
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+    if etag_matches(etag):
+        return not_modified(etag)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def _choose_encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept.quality("br") > 0:
+        return "br"
+    if accept.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def _compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if encoding == "br":
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = encoding
+
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}{_ENCODING_SEP}{encoding}", weak)
+    return response
+
+
+def init_http_cache(app):
+    """Register response compression for JSON responses."""
+    app.after_request(_compress_response)
@@ -1,3 +1,5 @@
+import os
+
 from flask_talisman import Talisman
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -50,6 +52,13 @@ def init_security(app):
         strict_transport_security=strict_transport_security
     )
 
+    # RATELIMIT_ENABLED=0 でレート制限をすべて無効にする (負荷試験用。本番では設定しない)
+    # Flask-Limiter は init 時に app.config["RATELIMIT_ENABLED"] を読む
+    app.config.setdefault(
+        "RATELIMIT_ENABLED",
+        os.environ.get("RATELIMIT_ENABLED", "1").lower() not in ("0", "false", "no"),
+    )
+
     # NOTE: avoid passing `app` positionally — older/newer flask-limiter signatures
     # may interpret the first positional arg as key_func. Use keyword arg to be safe.
     limiter = Limiter(
@@ -0,0 +1,648 @@
+# archive_posts.py
+"""
+Cold archive of old posts, sentiments and analysis results as Parquet files.
+
+Each month of collected_posts before a cutoff (by posted_at) is written to
+ARCHIVE_DIR/month=YYYY-MM/ together with the ticker_sentiment rows and
+analysis_posts_link rows of those posts and the analysis_results they
+reference. The rows are then deleted from Postgres. manifest.json lists every
+file with row counts, a sha256, the posted_at range and the accounts it
+contains. Requires pyarrow (pip install pyarrow); the app itself does not.
+
+    python archive_posts.py archive --before 2025-01 [--dry-run] [--keep]
+    python archive_posts.py rehydrate --account alice --from 2024-03-01 --to 2024-03-31
+    python archive_posts.py list
+    python archive_posts.py rollup
+
+Each run adds new part files (<table>-<run>.parquet), so a month can hold
+several parts. An analysis result that spans months is written with every
+month and deleted once nothing references it, so readers dedupe by id.
+Offline, the directory reads as a hive-partitioned dataset, e.g. in DuckDB:
+
+    SELECT * FROM read_parquet('archive/month=*/posts-*.parquet', hive_partitioning = true)
+
+The post_keys rows of archived posts are kept with archived = true, so the
+importer and the worker do not collect and analyze those posts again.
+Rehydrate only brings back posts whose keys are still theirs; the rest are
+counted as skipped.
+
+ticker_sentiment_daily (the heatmap rollup) keeps the archived counts: the
+(day, ticker) counts of each archived month are recorded in
+ticker_sentiment_daily_archived and added back after the delete trigger has
+taken them out, and rehydrate moves them back. utils_heatmap.rebuild_heatmap_aggregates
+adds ticker_sentiment_daily_archived to the hot rows. For months archived
+before alembic 000009_archive, rebuild that table from the files:
+
+    python archive_posts.py rollup
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, CollectedPost, TickerSentiment, AnalysisResult, Prompt, StockTickerMap, TargetAccount, analysis_posts_link
+from utils_partitions import month_start, add_months
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional
+    pa = None
+
+ARCHIVE_DIR = Path(os.environ.get("ARCHIVE_DIR", Path(__file__).resolve().parent / "archive"))
+ARCHIVE_COMPRESSION = os.environ.get("ARCHIVE_COMPRESSION", "zstd")
+FETCH_BATCH_SIZE = 20000
+INSERT_BATCH_SIZE = 1000
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+
+# データセット -> (列名, arrow の型名)。search_vector は生成列なので持たない
+DATASETS: Dict[str, List[tuple]] = {
+    "posts": [
+        ("id", "int64"), ("username", "string"), ("post_id", "string"), ("original_text", "string"),
+        ("source_url", "string"), ("posted_at", "timestamp"), ("like_count", "int64"),
+        ("retweet_count", "int64"), ("ai_summary", "string"), ("link_summary", "string"),
+        ("content_fingerprint", "string"), ("created_at", "timestamp"),
+    ],
+    "sentiments": [
+        ("id", "int64"), ("analysis_result_id", "int64"), ("collected_post_id", "int64"),
+        ("ticker", "string"), ("sentiment", "string"), ("reasoning", "string"), ("posted_at", "timestamp"),
+    ],
+    "links": [("analysis_result_id", "int64"), ("collected_post_id", "int64")],
+    "analysis_results": [
+        ("id", "int64"), ("prompt_id", "int64"), ("raw_json_response", "string"),
+        ("extracted_summary", "string"), ("analyzed_at", "timestamp"), ("ai_model", "string"),
+        ("cost_usd", "float64"), ("input_tokens", "int64"), ("output_tokens", "int64"),
+        ("extracted_tickers", "string"),
+    ],
+}
+
+# 対象月の行を読むクエリ。archive_post_ids / archive_result_ids は月ごとの一時テーブル
+_EXPORT_SQL = {
+    "posts": "SELECT {cols} FROM collected_posts p JOIN archive_post_ids a ON a.id = p.id "
+             "WHERE p.posted_at >= :lower AND p.posted_at < :upper ORDER BY p.posted_at, p.id",
+    "sentiments": "SELECT {cols} FROM ticker_sentiment s JOIN archive_post_ids a ON a.id = s.collected_post_id "
+                  "WHERE s.posted_at >= :lower AND s.posted_at < :upper ORDER BY s.id",
+    "links": "SELECT {cols} FROM analysis_posts_link l JOIN archive_post_ids a ON a.id = l.collected_post_id "
+             "ORDER BY l.collected_post_id, l.analysis_result_id",
+    "analysis_results": "SELECT {cols} FROM analysis_results r JOIN archive_result_ids a ON a.id = r.id ORDER BY r.id",
+}
+_TABLE_ALIAS = {"posts": "p", "sentiments": "s", "links": "l", "analysis_results": "r"}
+
+# ヒートマップの集計表 (ticker_sentiment_daily / ticker_sentiment_daily_archived) の件数列
+_COUNT_FIELDS = ("positive", "negative", "neutral", "total")
+_ADD_COUNTS_SQL = """
+    INSERT INTO {table} AS d (day, ticker, positive, negative, neutral, total)
+    VALUES (:day, :ticker, :positive, :negative, :neutral, :total)
+    ON CONFLICT (day, ticker) DO UPDATE SET
+        positive = d.positive + EXCLUDED.positive,
+        negative = d.negative + EXCLUDED.negative,
+        neutral = d.neutral + EXCLUDED.neutral,
+        total = d.total + EXCLUDED.total
+"""
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise SystemExit("pyarrow is required for the archive (pip install pyarrow).")
+
+
+def _schema(dataset: str):
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(), "timestamp": pa.timestamp("us")}
+    return pa.schema([(name, types[kind]) for name, kind in DATASETS[dataset]])
+
+
+def _columns(dataset: str) -> List[str]:
+    return [name for name, _ in DATASETS[dataset]]
+
+
+# ============================================================
+# Manifest
+# ============================================================
+
+def load_manifest(archive_dir: Path = ARCHIVE_DIR) -> Dict:
+    path = archive_dir / MANIFEST_NAME
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return {
+        "format": MANIFEST_FORMAT,
+        "compression": ARCHIVE_COMPRESSION,
+        "datasets": {name: _columns(name) for name in DATASETS},
+        "months": {},
+        "rehydrated": [],
+    }
+
+
+def _write_manifest(manifest: Dict, archive_dir: Path) -> None:
+    """一時ファイルに書いてから置き換える (読み手が書きかけを見ないように)。"""
+    manifest["updated_at"] = datetime.now(timezone.utc).isoformat()
+    tmp_path = archive_dir / f"{MANIFEST_NAME}.tmp"
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, archive_dir / MANIFEST_NAME)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ============================================================
+# Heatmap counts
+# ============================================================
+
+def _count_sentiments(rows: Iterable[Dict]) -> List[Dict]:
+    """センチメントの行 (posted_at, ticker, sentiment) を (日, 銘柄) ごとの件数にする。"""
+    counts: Dict[Tuple[date, str], Dict] = {}
+    for row in rows:
+        key = (row["posted_at"].date(), row["ticker"])
+        bucket = counts.get(key)
+        if bucket is None:
+            bucket = counts[key] = {"day": key[0], "ticker": key[1], **{field: 0 for field in _COUNT_FIELDS}}
+        sentiment = (row["sentiment"] or "").lower()
+        if sentiment in ("positive", "negative", "neutral"):
+            bucket[sentiment] += 1
+        bucket["total"] += 1
+    return list(counts.values())
+
+
+def _add_rollup_counts(db: Session, table: str, counts: List[Dict], sign: int = 1) -> None:
+    """
+    (日, 銘柄) ごとの件数を table に足す (sign=-1 なら引き、0 件以下になった行は消す)。
+    集計トリガーと同じく (日, 銘柄) 順に更新してデッドロックを避ける。
+    """
+    if not counts:
+        return
+    rows = [dict(c, **{field: sign * c[field] for field in _COUNT_FIELDS})
+            for c in sorted(counts, key=lambda c: (c["day"], c["ticker"]))]
+    db.execute(text(_ADD_COUNTS_SQL.format(table=table)), rows)
+    if sign < 0:
+        db.execute(text(f"DELETE FROM {table} WHERE total <= 0"))
+
+
+def rebuild_archived_rollup(archive_dir: Path = ARCHIVE_DIR) -> int:
+    """
+    ticker_sentiment_daily_archived をアーカイブのファイルから作り直す (000009_archive より前にアーカイブした月用)。
+    DB に戻っている (ticker_sentiment にある) センチメントは数えない。行数を返す。
+    ticker_sentiment_daily にも反映するには、続けて utils_heatmap.py --rebuild を実行する。
+    """
+    _require_pyarrow()
+    manifest = load_manifest(archive_dir)
+    sentiments: Dict[int, Dict] = {}
+    for entry in manifest.get("months", {}).values():
+        for part in entry["parts"]:
+            info = part["files"].get("sentiments")
+            if not part.get("deleted") or not info or not info["rows"]:
+                continue
+            table = pq.read_table(archive_dir / info["path"], columns=["id", "posted_at", "ticker", "sentiment"])
+            for row in table.to_pylist():
+                sentiments[row["id"]] = row
+
+    db = SessionLocal()
+    try:
+        ids = sorted(sentiments)
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            hot = db.execute(text("SELECT id FROM ticker_sentiment WHERE id = ANY(:ids)"),
+                             {"ids": ids[i:i + FETCH_BATCH_SIZE]}).scalars()
+            for sentiment_id in hot:
+                sentiments.pop(sentiment_id, None)
+        counts = _count_sentiments(sentiments.values())
+        db.execute(text("DELETE FROM ticker_sentiment_daily_archived"))
+        _add_rollup_counts(db, "ticker_sentiment_daily_archived", counts)
+        db.commit()
+        return len(counts)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ============================================================
+# Archive
+# ============================================================
+
+def _first_post_month(db: Session, before: date) -> Optional[date]:
+    value = db.execute(text("SELECT min(posted_at) FROM collected_posts WHERE posted_at < :before"),
+                       {"before": before}).scalar()
+    return month_start(value) if value else None
+
+
+def _collect_ids(db: Session, lower: date, upper: date) -> int:
+    """対象月の投稿 id と、その投稿が参照する分析結果の id を一時テーブルに入れる。投稿数を返す。"""
+    db.execute(text("CREATE TEMP TABLE archive_post_ids (id integer PRIMARY KEY) ON COMMIT DROP"))
+    db.execute(text("CREATE TEMP TABLE archive_result_ids (id integer PRIMARY KEY) ON COMMIT DROP"))
+    posts = db.execute(text(
+        "INSERT INTO archive_post_ids SELECT id FROM collected_posts WHERE posted_at >= :lower AND posted_at < :upper"
+    ), {"lower": lower, "upper": upper}).rowcount
+    db.execute(text(
+        "INSERT INTO archive_result_ids "
+        "SELECT l.analysis_result_id FROM analysis_posts_link l JOIN archive_post_ids a ON a.id = l.collected_post_id "
+        "UNION SELECT s.analysis_result_id FROM ticker_sentiment s JOIN archive_post_ids a ON a.id = s.collected_post_id "
+        "WHERE s.posted_at >= :lower AND s.posted_at < :upper"
+    ), {"lower": lower, "upper": upper})
+    db.execute(text("ANALYZE archive_post_ids"))
+    return posts
+
+
+def _export_dataset(db: Session, dataset: str, path: Path, params: Dict) -> int:
+    """dataset の行を FETCH_BATCH_SIZE ずつ読み、1バッチ = 1行グループで Parquet に書く。行数を返す。"""
+    columns = _columns(dataset)
+    alias = _TABLE_ALIAS[dataset]
+    sql = _EXPORT_SQL[dataset].format(cols=", ".join(f"{alias}.{c}" for c in columns))
+    schema = _schema(dataset)
+    rows = 0
+    result = db.execute(text(sql), params, execution_options={"yield_per": FETCH_BATCH_SIZE})
+    with pq.ParquetWriter(path, schema, compression=ARCHIVE_COMPRESSION) as writer:
+        for chunk in result.partitions():
+            values = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values[i], type=schema.field(i).type) for i in range(len(columns))], schema=schema
+            ))
+            rows += len(chunk)
+    return rows
+
+
+def _delete_archived(db: Session, lower: date, upper: date) -> None:
+    """
+    アーカイブ済みの行を消す。
+    投稿のキー (post_keys) は archived にして残す (削除トリガーは消さない。再収集・再分析させない)。
+    センチメントの削除で集計トリガーが ticker_sentiment_daily から引く件数は、ticker_sentiment_daily_archived に
+    記録して ticker_sentiment_daily に足し戻す (ヒートマップはアーカイブした月も数える)。
+    分析結果は、もうどの投稿・センチメントからも参照されていないものだけ消す。
+    """
+    params = {"lower": lower, "upper": upper}
+    db.execute(text(
+        "UPDATE post_keys k SET archived = true FROM collected_posts p JOIN archive_post_ids a ON a.id = p.id "
+        "WHERE k.post_id = p.post_id AND p.posted_at >= :lower AND p.posted_at < :upper"
+    ), params)
+    counts = [dict(row) for row in db.execute(text("""
+        SELECT s.posted_at::date AS day, s.ticker,
+               count(*) FILTER (WHERE lower(s.sentiment) = 'positive') AS positive,
+               count(*) FILTER (WHERE lower(s.sentiment) = 'negative') AS negative,
+               count(*) FILTER (WHERE lower(s.sentiment) = 'neutral') AS neutral,
+               count(*) AS total
+        FROM ticker_sentiment s JOIN archive_post_ids a ON a.id = s.collected_post_id
+        WHERE s.posted_at >= :lower AND s.posted_at < :upper
+        GROUP BY 1, 2
+    """), params).mappings()]
+
+    db.execute(text("DELETE FROM analysis_posts_link l USING archive_post_ids a WHERE l.collected_post_id = a.id"))
+    db.execute(text("DELETE FROM ticker_sentiment s USING archive_post_ids a "
+                    "WHERE s.collected_post_id = a.id AND s.posted_at >= :lower AND s.posted_at < :upper"), params)
+    db.execute(text("DELETE FROM collected_posts p USING archive_post_ids a "
+                    "WHERE p.id = a.id AND p.posted_at >= :lower AND p.posted_at < :upper"), params)
+    _add_rollup_counts(db, "ticker_sentiment_daily_archived", counts)
+    _add_rollup_counts(db, "ticker_sentiment_daily", counts)
+    db.execute(text(
+        "DELETE FROM analysis_results r USING archive_result_ids a WHERE r.id = a.id "
+        "AND NOT EXISTS (SELECT 1 FROM analysis_posts_link l WHERE l.analysis_result_id = r.id) "
+        "AND NOT EXISTS (SELECT 1 FROM ticker_sentiment s WHERE s.analysis_result_id = r.id)"
+    ))
+
+
+def _month_summary(db: Session, lower: date, upper: date) -> Dict:
+    row = db.execute(text(
+        "SELECT min(posted_at), max(posted_at) FROM collected_posts p JOIN archive_post_ids a ON a.id = p.id "
+        "WHERE p.posted_at >= :lower AND p.posted_at < :upper"
+    ), {"lower": lower, "upper": upper}).one()
+    accounts = db.execute(text(
+        "SELECT p.username, count(*) FROM collected_posts p JOIN archive_post_ids a ON a.id = p.id "
+        "WHERE p.posted_at >= :lower AND p.posted_at < :upper GROUP BY 1 ORDER BY 1"
+    ), {"lower": lower, "upper": upper}).all()
+    return {
+        "posted_at_min": row[0].isoformat() if row[0] else None,
+        "posted_at_max": row[1].isoformat() if row[1] else None,
+        "accounts": {username: count for username, count in accounts},
+    }
+
+
+def archive_month(month: date, archive_dir: Path = ARCHIVE_DIR, keep: bool = False,
+                  run_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    1か月分をアーカイブする (1か月 = 1トランザクション)。投稿がなければ None。
+    ファイルとマニフェストを書いてからコミットし、コミットに失敗したらファイルとマニフェストを元に戻す。
+    REPEATABLE READ なので、書き出した行と消す行は同じスナップショットになる。
+    """
+    run_id = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    label = month.strftime("%Y-%m")
+    lower, upper = month, add_months(month, 1)
+    month_dir = archive_dir / f"month={label}"
+    db = SessionLocal()
+    written: List[Path] = []
+    manifest = load_manifest(archive_dir)
+    previous = json.loads(json.dumps(manifest))
+    try:
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        if not _collect_ids(db, lower, upper):
+            db.rollback()
+            return None
+
+        month_dir.mkdir(parents=True, exist_ok=True)
+        part = {"run": run_id, "archived_at": datetime.now(timezone.utc).isoformat(), "files": {}}
+        for dataset in DATASETS:
+            path = month_dir / f"{dataset}-{run_id}.parquet"
+            written.append(path)
+            rows = _export_dataset(db, dataset, path, {"lower": lower, "upper": upper})
+            part["files"][dataset] = {
+                "path": path.relative_to(archive_dir).as_posix(),
+                "rows": rows,
+                "bytes": path.stat().st_size,
+                "sha256": _sha256(path),
+            }
+        part.update(_month_summary(db, lower, upper))
+        part["deleted"] = not keep
+
+        if not keep:
+            _delete_archived(db, lower, upper)
+        manifest.setdefault("months", {}).setdefault(label, {"parts": []})["parts"].append(part)
+        _write_manifest(manifest, archive_dir)
+        db.commit()
+        return part
+    except BaseException:
+        db.rollback()
+        for path in written:
+            path.unlink(missing_ok=True)
+        if (archive_dir / MANIFEST_NAME).exists():
+            _write_manifest(previous, archive_dir)
+        raise
+    finally:
+        db.close()
+
+
+def archive_before(before: date, archive_dir: Path = ARCHIVE_DIR, keep: bool = False, dry_run: bool = False) -> List[Dict]:
+    """before (月初) より前の月を古い順にアーカイブする。dry_run なら件数だけ数える。"""
+    db = SessionLocal()
+    try:
+        month = _first_post_month(db, before)
+        if dry_run:
+            counts = []
+            while month and month < before:
+                posts = db.execute(text(
+                    "SELECT count(*) FROM collected_posts WHERE posted_at >= :lower AND posted_at < :upper"
+                ), {"lower": month, "upper": add_months(month, 1)}).scalar()
+                if posts:
+                    counts.append({"month": month.strftime("%Y-%m"), "posts": posts})
+                month = add_months(month, 1)
+            return counts
+    finally:
+        db.close()
+
+    _require_pyarrow()
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    results = []
+    while month and month < before:
+        part = archive_month(month, archive_dir, keep=keep, run_id=run_id)
+        if part:
+            part = dict(part, month=month.strftime("%Y-%m"))
+            results.append(part)
+            print(f"{part['month']}: " + ", ".join(f"{name} {info['rows']}" for name, info in part["files"].items()))
+        month = add_months(month, 1)
+    return results
+
+
+# ============================================================
+# Rehydrate
+# ============================================================
+
+def _parts_for(manifest: Dict, accounts: Set[str], start: Optional[datetime], end: Optional[datetime]) -> Iterable[Dict]:
+    """条件に合いうるパートだけを返す (月とアカウント一覧で絞る)。"""
+    for label, entry in sorted(manifest.get("months", {}).items()):
+        lower = datetime.strptime(label, "%Y-%m")
+        upper = datetime.combine(add_months(lower.date(), 1), datetime.min.time())
+        if (start and upper <= start) or (end and lower >= end):
+            continue
+        for part in entry["parts"]:
+            if accounts and not accounts & set(part.get("accounts", {})):
+                continue
+            yield part
+
+
+def _read(archive_dir: Path, part: Dict, dataset: str, filters=None) -> List[Dict]:
+    info = part["files"].get(dataset)
+    if not info or not info["rows"]:
+        return []
+    return pq.read_table(archive_dir / info["path"], filters=filters).to_pylist()
+
+
+def _insert_rows(db: Session, table, rows: List[Dict]) -> int:
+    inserted = 0
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        stmt = pg_insert(table).values(rows[i:i + INSERT_BATCH_SIZE]).on_conflict_do_nothing()
+        inserted += db.execute(stmt).rowcount
+    return inserted
+
+
+def _insert_sentiments(db: Session, rows: List[Dict]) -> List[Dict]:
+    """センチメントを入れ、実際に入った行の (posted_at, ticker, sentiment) を返す (既にある行は飛ばす)。"""
+    table = TickerSentiment.__table__
+    inserted = []
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        stmt = pg_insert(table).values(rows[i:i + INSERT_BATCH_SIZE]).on_conflict_do_nothing().returning(
+            table.c.posted_at, table.c.ticker, table.c.sentiment)
+        inserted.extend(dict(row) for row in db.execute(stmt).mappings())
+    return inserted
+
+
+def _restorable_posts(db: Session, posts: Dict[int, Dict]) -> Set[int]:
+    """
+    戻せる投稿の id を返す。post_keys のキーがまだその投稿のもの (archived、または同じ id の投稿が既に DB にある) か、
+    キーが無い (000009_archive より前にアーカイブした) 投稿だけ。アーカイブ後に同じ post_id / フィンガープリントで
+    別の投稿が登録されていると、INSERT トリガーが行を黙って捨て、その投稿のセンチメントが外部キー違反になる。
+    """
+    rows = list(posts.values())
+    keys = db.execute(text("""
+        SELECT k.post_id, k.username, k.content_fingerprint, k.archived FROM post_keys k
+        WHERE k.post_id = ANY(:post_ids)
+        UNION
+        SELECT k.post_id, k.username, k.content_fingerprint, k.archived FROM post_keys k
+        JOIN unnest(CAST(:usernames AS varchar[]), CAST(:fingerprints AS varchar[])) AS c(username, fp)
+          ON k.username = c.username AND k.content_fingerprint = c.fp
+    """), {
+        "post_ids": [p["post_id"] for p in rows],
+        "usernames": [p["username"] for p in rows if p["content_fingerprint"]],
+        "fingerprints": [p["content_fingerprint"] for p in rows if p["content_fingerprint"]],
+    }).all()
+    by_post_id = {k.post_id: k for k in keys}
+    by_fingerprint = {(k.username, k.content_fingerprint): k for k in keys if k.content_fingerprint}
+    present = set(db.execute(text("SELECT id FROM collected_posts WHERE id = ANY(:ids)"),
+                             {"ids": list(posts)}).scalars())
+
+    restorable = set()
+    for post in rows:
+        own = by_post_id.get(post["post_id"])
+        other = by_fingerprint.get((post["username"], post["content_fingerprint"])) if post["content_fingerprint"] else None
+        if own is None:
+            ok = other is None
+        else:
+            ok = (own.username == post["username"] and own.content_fingerprint == post["content_fingerprint"]
+                  and (own.archived or post["id"] in present))
+        if ok:
+            restorable.add(post["id"])
+    return restorable
+
+
+def rehydrate(accounts: Iterable[str] = (), start: Optional[date] = None, end: Optional[date] = None,
+              archive_dir: Path = ARCHIVE_DIR) -> Dict[str, int]:
+    """
+    アーカイブから accounts / 期間 [start, end] (posted_at) の投稿と、そのセンチメント・分析結果を DB に戻す。
+    既に DB にある行は ON CONFLICT で飛ばす。アーカイブのファイルは消さない。
+    アーカイブ後に別の投稿がキー (post_id / フィンガープリント) を取った投稿と、プロンプトや銘柄が DB から
+    消えている分析結果・センチメントは戻せないので、参照する行ごと飛ばして stats["skipped"] に数える。
+    """
+    _require_pyarrow()
+    accounts = set(accounts)
+    start_at = datetime.combine(start, datetime.min.time()) if start else None
+    end_at = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None
+    manifest = load_manifest(archive_dir)
+
+    filters = []
+    if accounts:
+        filters.append(("username", "in", sorted(accounts)))
+    if start_at:
+        filters.append(("posted_at", ">=", start_at))
+    if end_at:
+        filters.append(("posted_at", "<", end_at))
+
+    posts, sentiments, links, results = {}, {}, set(), {}
+    for part in _parts_for(manifest, accounts, start_at, end_at):
+        part_posts = _read(archive_dir, part, "posts", filters or None)
+        if not part_posts:
+            continue
+        for row in part_posts:
+            posts[row["id"]] = row
+        post_ids = [row["id"] for row in part_posts]
+        for row in _read(archive_dir, part, "sentiments", [("collected_post_id", "in", post_ids)]):
+            sentiments[row["id"]] = row
+        for row in _read(archive_dir, part, "links", [("collected_post_id", "in", post_ids)]):
+            links.add((row["analysis_result_id"], row["collected_post_id"]))
+        result_ids = {r for r, _ in links} | {s["analysis_result_id"] for s in sentiments.values()}
+        for row in _read(archive_dir, part, "analysis_results", [("id", "in", sorted(result_ids))]):
+            results[row["id"]] = row
+
+    stats = {"posts": 0, "sentiments": 0, "links": 0, "analysis_results": 0, "skipped": 0}
+    if not posts:
+        return stats
+
+    db = SessionLocal()
+    try:
+        # archived のキーの投稿を通すのは、このトランザクションの INSERT だけ (alembic 000009_archive)
+        db.execute(text("SET LOCAL archive.rehydrate = 'on'"))
+        restorable = _restorable_posts(db, posts)
+        prompt_ids = {pid for (pid,) in db.query(Prompt.id).filter(Prompt.id.in_({r["prompt_id"] for r in results.values()}))}
+        tickers = {t for (t,) in db.query(StockTickerMap.ticker).filter(
+            StockTickerMap.ticker.in_({s["ticker"] for s in sentiments.values()}))}
+        usable = {rid for rid, r in results.items() if r["prompt_id"] in prompt_ids}
+        sentiment_rows = [s for s in sentiments.values()
+                          if s["collected_post_id"] in restorable and s["analysis_result_id"] in usable
+                          and s["ticker"] in tickers]
+        link_rows = [{"analysis_result_id": r, "collected_post_id": p} for r, p in sorted(links)
+                     if p in restorable and r in usable]
+        result_ids = {s["analysis_result_id"] for s in sentiment_rows} | {l["analysis_result_id"] for l in link_rows}
+        post_rows = [posts[p] for p in sorted(restorable)]
+        stats["skipped"] = ((len(posts) - len(post_rows)) + (len(results) - len(result_ids))
+                            + (len(sentiments) - len(sentiment_rows)) + (len(links) - len(link_rows)))
+
+        existing = {u for (u,) in db.query(TargetAccount.username).filter(
+            TargetAccount.username.in_({p["username"] for p in post_rows}))}
+        for username in sorted({p["username"] for p in post_rows} - existing):
+            # 収集対象には戻さない (投稿の外部キーを満たすためだけに作る)
+            db.add(TargetAccount(username=username, is_active=False))
+        db.flush()
+
+        stats["analysis_results"] = _insert_rows(db, AnalysisResult.__table__, [results[r] for r in sorted(result_ids)])
+        stats["posts"] = _insert_rows(db, CollectedPost.__table__, post_rows)
+        # 確かめた後に別の投稿がキーを取っていれば、INSERT トリガーが捨てている
+        present = db.execute(text("SELECT count(*) FROM collected_posts WHERE id = ANY(:ids)"),
+                             {"ids": sorted(restorable)}).scalar()
+        if present != len(restorable):
+            raise RuntimeError(f"{len(restorable) - present} post(s) were taken by new posts during the rehydrate; "
+                               "run it again to skip them.")
+        inserted = _insert_sentiments(db, sentiment_rows)
+        stats["sentiments"] = len(inserted)
+        # 集計トリガーが足した件数は ticker_sentiment_daily に (アーカイブ分として) 既に入っている
+        counts = _count_sentiments(inserted)
+        _add_rollup_counts(db, "ticker_sentiment_daily", counts, sign=-1)
+        _add_rollup_counts(db, "ticker_sentiment_daily_archived", counts, sign=-1)
+        stats["links"] = _insert_rows(db, analysis_posts_link, link_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    manifest.setdefault("rehydrated", []).append({
+        "at": datetime.now(timezone.utc).isoformat(),
+        "accounts": sorted(accounts),
+        "from": start.isoformat() if start else None,
+        "to": end.isoformat() if end else None,
+        "rows": stats,
+    })
+    _write_manifest(manifest, archive_dir)
+    return stats
+
+
+def _parse_month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old posts to Parquet and rehydrate them.")
+    parser.add_argument("--dir", type=Path, default=ARCHIVE_DIR, help=f"Archive directory (default: {ARCHIVE_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive_cmd = commands.add_parser("archive", help="Move the months before a cutoff to the archive")
+    cutoff = archive_cmd.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument("--before", type=_parse_month, metavar="YYYY-MM", help="Archive the months before YYYY-MM")
+    cutoff.add_argument("--older-than-months", type=int, metavar="N", help="Archive the months before this month - N")
+    archive_cmd.add_argument("--keep", action="store_true", help="Write the files but keep the rows in the DB")
+    archive_cmd.add_argument("--dry-run", action="store_true", help="Only count the posts per month")
+
+    rehydrate_cmd = commands.add_parser("rehydrate", help="Copy archived posts back into the DB")
+    rehydrate_cmd.add_argument("--account", action="append", default=[], help="Username (repeatable)")
+    rehydrate_cmd.add_argument("--from", dest="start", type=_parse_date, metavar="YYYY-MM-DD")
+    rehydrate_cmd.add_argument("--to", dest="end", type=_parse_date, metavar="YYYY-MM-DD")
+
+    commands.add_parser("list", help="Show the archived months")
+    commands.add_parser("rollup", help="Rebuild ticker_sentiment_daily_archived from the archived sentiments")
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        before = args.before or add_months(month_start(datetime.now(timezone.utc).date()), -args.older_than_months)
+        results = archive_before(before, args.dir, keep=args.keep, dry_run=args.dry_run)
+        if args.dry_run:
+            for row in results:
+                print(f"{row['month']}: {row['posts']} posts")
+        elif results and not args.keep:
+            print("Run VACUUM (ANALYZE) on collected_posts, ticker_sentiment, analysis_posts_link, analysis_results "
+                  "and drop the emptied partitions (utils_partitions.py --detach-before --drop) to reclaim space.")
+        print(f"{len(results)} month(s) before {before:%Y-%m}")
+    elif args.command == "rehydrate":
+        if not (args.account or args.start or args.end):
+            parser.error("rehydrate needs --account and/or --from/--to")
+        print(f"Rehydrated: {rehydrate(args.account, args.start, args.end, args.dir)}")
+    elif args.command == "rollup":
+        print(f"Rebuilt ticker_sentiment_daily_archived: {rebuild_archived_rollup(args.dir)} rows. "
+              "Run utils_heatmap.py --rebuild to apply it to the heatmap.")
+    else:
+        manifest = load_manifest(args.dir)
+        for label, entry in sorted(manifest.get("months", {}).items()):
+            posts = sum(p["files"]["posts"]["rows"] for p in entry["parts"])
+            size = sum(f["bytes"] for p in entry["parts"] for f in p["files"].values())
+            print(f"{label}: {len(entry['parts'])} part(s), {posts} posts, {size / 1e6:.1f} MB")
@@ -0,0 +1,113 @@
+import argparse
+from datetime import timedelta
+from sqlalchemy import text
+from models import SessionLocal, CollectedPost, TargetAccount
+from utils_parser import compute_content_fingerprint, normalize_post_text, FINGERPRINT_BUCKET_HOURS
+
+UPDATE_BATCH_SIZE = 5000
+
+
+def _find_clusters(db, username):
+    """
+    アカウントの投稿を posted_at 順に走査し、同じ正規化本文で
+    時刻の差が FINGERPRINT_BUCKET_HOURS 以内に連なる投稿を1つのクラスタにまとめる。
+    各クラスタは [(post_id, fingerprint), ...] のリスト。
+    """
+    tolerance = timedelta(hours=FINGERPRINT_BUCKET_HOURS)
+    open_clusters = {}  # 正規化本文 -> (最後の posted_at, クラスタ)
+    clusters = []
+    rows = db.query(CollectedPost.id, CollectedPost.original_text, CollectedPost.posted_at).filter(
+        CollectedPost.username == username
+    ).order_by(CollectedPost.posted_at, CollectedPost.id).yield_per(UPDATE_BATCH_SIZE)
+
+    for post_id, original_text, posted_at in rows:
+        key = normalize_post_text(original_text)
+        fp = compute_content_fingerprint(original_text, posted_at)
+        current = open_clusters.get(key)
+        if current and posted_at - current[0] <= tolerance:
+            current[1].append((post_id, fp))
+            open_clusters[key] = (posted_at, current[1])
+        else:
+            cluster = [(post_id, fp)]
+            clusters.append(cluster)
+            open_clusters[key] = (posted_at, cluster)
+    return clusters
+
+
+def _merge_duplicates(db, dup_ids, survivor_ids):
+    """重複投稿の分析結果を残す投稿へ付け替えてから、重複投稿を削除する。"""
+    params = {"dups": dup_ids, "survivors": survivor_ids}
+    mapping = "unnest(CAST(:dups AS integer[]), CAST(:survivors AS integer[])) AS m(dup, survivor)"
+    db.execute(text(
+        f"UPDATE ticker_sentiment t SET collected_post_id = m.survivor FROM {mapping} "
+        "WHERE t.collected_post_id = m.dup"
+    ), params)
+    db.execute(text(
+        "INSERT INTO analysis_posts_link (analysis_result_id, collected_post_id) "
+        f"SELECT l.analysis_result_id, m.survivor FROM analysis_posts_link l JOIN {mapping} "
+        "ON l.collected_post_id = m.dup ON CONFLICT DO NOTHING"
+    ), params)
+    db.execute(text("DELETE FROM analysis_posts_link WHERE collected_post_id = ANY(CAST(:dups AS integer[]))"), params)
+    db.execute(text("DELETE FROM collected_posts WHERE id = ANY(CAST(:dups AS integer[]))"), params)
+
+
+def _update_fingerprints(db, pairs):
+    for i in range(0, len(pairs), UPDATE_BATCH_SIZE):
+        batch = pairs[i:i + UPDATE_BATCH_SIZE]
+        db.execute(text(
+            "UPDATE collected_posts c SET content_fingerprint = m.fp "
+            "FROM unnest(CAST(:ids AS integer[]), CAST(:fps AS text[])) AS m(id, fp) "
+            "WHERE c.id = m.id AND c.content_fingerprint IS DISTINCT FROM m.fp"
+        ), {"ids": [p[0] for p in batch], "fps": [p[1] for p in batch]})
+
+
+def backfill_fingerprints(usernames=None, dry_run=False):
+    """
+    既存投稿の content_fingerprint を埋め、同一投稿の重複 (相対時刻のずれで
+    別 post_id になったもの) を最も古い行 (最小ID) に集約する一回限りのジョブ。
+    アカウント単位でコミットする。
+    """
+    print("--- Fingerprint backfill started ---")
+    db = SessionLocal()
+    try:
+        if not usernames:
+            usernames = [row[0] for row in db.query(TargetAccount.username).order_by(TargetAccount.username).all()]
+
+        total_merged = 0
+        for username in usernames:
+            clusters = _find_clusters(db, username)
+            dup_ids, survivor_ids, fingerprints = [], [], []
+            for cluster in clusters:
+                survivor_id, survivor_fp = min(cluster)
+                fingerprints.append((survivor_id, survivor_fp))
+                for post_id, _ in cluster:
+                    if post_id != survivor_id:
+                        dup_ids.append(post_id)
+                        survivor_ids.append(survivor_id)
+
+            print(f"{username}: {len(clusters)} unique posts, {len(dup_ids)} duplicates")
+            if dry_run:
+                continue
+
+            if dup_ids:
+                _merge_duplicates(db, dup_ids, survivor_ids)
+            _update_fingerprints(db, fingerprints)
+            db.commit()
+            total_merged += len(dup_ids)
+
+        print(f"--- Fingerprint backfill finished. Collapsed {total_merged} duplicate posts. ---")
+
+    except Exception as e:
+        db.rollback()
+        print(f"Error during fingerprint backfill: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill collected_posts.content_fingerprint and collapse duplicates.")
+    parser.add_argument("--account", action="append", help="Only process this username (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Report duplicates without modifying the database")
+    args = parser.parse_args()
+    backfill_fingerprints(usernames=args.account, dry_run=args.dry_run)
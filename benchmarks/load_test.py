@@ -0,0 +1,286 @@
+"""
+Web アプリの負荷試験。ログインした仮想ユーザーが実際の操作に近いセッションを繰り返し、
+同時ユーザー数を段階的に上げながら、エンドポイントごとのスループット・レイテンシ・エラー率を測る。
+
+    # 1. データ投入 (ログインユーザー bench / bench もできる)
+    python benchmarks/seed.py --scale 100k
+    # 2. OpenAI のスタブとアプリを起動 (レート制限は無効に)
+    python benchmarks/stub_openai.py --port 8100 --latency lognormal:800:0.6 --quiet &
+    RATELIMIT_ENABLED=0 OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=stub \\
+        DISABLE_FORCE_HTTPS=1 gunicorn --workers 3 --bind 127.0.0.1:8000 wsgi:app
+    # 3. 計測
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --stages 1,5,10,20,40 --duration 30
+
+仮想ユーザーは /login の CSRF トークンを読んでログインし、以下のシナリオを重み付きで選んで繰り返す:
+  - index    トップページ
+  - scroll   /api/filter-posts を絞り込み条件を変えて next_cursor で数ページ
+  - suggest  銘柄を1文字ずつ入力した /api/suggest
+  - history  /history、分析結果の詳細 /api/history/<id>、次のページ
+  - analyze  /api/analyze-batch (既定の重みは 0。スタブの OpenAI に向けたときに --weight analyze=1 などで有効にする)
+
+各段階の結果を表で表示し、--output に JSON で保存する。429 はエラーとは別に数える。
+Talisman の force_https が有効なサーバーに http で繋ぐとリダイレクトされるので、DISABLE_FORCE_HTTPS=1 で起動する。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+SCENARIO_WEIGHTS = {"index": 2, "scroll": 5, "suggest": 3, "history": 2, "analyze": 0}
+
+FILTERS = [
+    {},
+    {"keyword": "決算", "match_mode": "fulltext"},
+    {"keyword": "guidance", "match_mode": "substring"},
+    {"ticker": ["NVDA"]},
+    {"sector": ["Information Technology"]},
+    {"sentiment": "Positive"},
+    {"likes": 300},
+    {"period_days": 7},
+    {"sort": "like_count"},
+    {"sort": "posted_at", "sentiment": "Negative"},
+]
+SUGGEST_WORDS = ["NVDA", "AAPL", "TSLA", "Micro", "Information"]
+
+_CSRF_INPUT_RE = re.compile(r'name="csrf_token"\s+value="([^"]+)"')
+_CSRF_JS_RE = re.compile(r'window\.CSRF_TOKEN\s*=\s*"([^"]+)"')
+_RESULT_ID_RE = re.compile(r'data-result-id="(\d+)"')
+_NEXT_PAGE_RE = re.compile(r'href="(/history\?cursor=[^"]+)"')
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """エンドポイントごとの (レイテンシ, 結果) を集める。全仮想ユーザーのスレッドで共有する。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, endpoint, elapsed_ms, outcome):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((elapsed_ms, outcome))
+
+    def summary(self, duration):
+        endpoints = {}
+        total = errors = 0
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = [ms for ms, _ in samples]
+            failed = sum(1 for _, outcome in samples if outcome == "error")
+            limited = sum(1 for _, outcome in samples if outcome == "rate_limited")
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "rps": round(len(samples) / duration, 2),
+                "p50_ms": round(_percentile(latencies, 50), 1),
+                "p95_ms": round(_percentile(latencies, 95), 1),
+                "p99_ms": round(_percentile(latencies, 99), 1),
+                "mean_ms": round(statistics.mean(latencies), 1),
+                "error_rate": round(failed / len(samples), 4),
+                "rate_limited": limited,
+            }
+            total += len(samples)
+            errors += failed
+        return {
+            "requests": total,
+            "rps": round(total / duration, 2) if duration else 0,
+            "error_rate": round(errors / total, 4) if total else 0,
+            "endpoints": endpoints,
+        }
+
+
+class VirtualUser:
+    def __init__(self, base_url, username, password, recorder, rng, think_ms, verify=True, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.rng = rng
+        self.think_ms = think_ms
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.csrf_token = None
+        self.seen_post_ids = []
+
+    def request(self, endpoint, method, path, **kwargs):
+        """1リクエストを送って記録する。例外・4xx/5xx は error、429 は rate_limited として数える。"""
+        headers = kwargs.pop("headers", {})
+        if method != "GET" and self.csrf_token:
+            headers["X-CSRFToken"] = self.csrf_token
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, headers=headers,
+                                            timeout=self.timeout, allow_redirects=False, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, "error")
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if response.status_code == 429:
+            outcome = "rate_limited"
+        elif response.status_code >= 400 or (response.status_code in (301, 302) and "/login" in response.headers.get("Location", "")):
+            outcome = "error"
+        else:
+            outcome = "ok"
+        self.recorder.add(endpoint, elapsed_ms, outcome)
+        return response if outcome == "ok" else None
+
+    def think(self, scale=1.0):
+        if self.think_ms:
+            time.sleep(self.rng.uniform(0, self.think_ms * scale) / 1000.0)
+
+    def login(self):
+        page = self.request("GET /login", "GET", "/login")
+        match = _CSRF_INPUT_RE.search(page.text) if page is not None else None
+        if not match:
+            raise RuntimeError("No csrf_token on /login")
+        response = self.request("POST /login", "POST", "/login", data={
+            "csrf_token": match.group(1), "username": self.username, "password": self.password,
+        })
+        if response is None or response.status_code != 302:
+            raise RuntimeError(f"Login as '{self.username}' failed")
+        self.index()
+
+    # --- シナリオ ---
+
+    def index(self):
+        page = self.request("GET /", "GET", "/")
+        if page is not None:
+            match = _CSRF_JS_RE.search(page.text)
+            if match:
+                self.csrf_token = match.group(1)
+
+    def scroll(self):
+        data = dict(self.rng.choice(FILTERS))
+        for _ in range(self.rng.randint(1, 4)):
+            response = self.request("POST /api/filter-posts", "POST", "/api/filter-posts", json=data)
+            if response is None:
+                return
+            payload = response.json()
+            self.seen_post_ids = ([p["id"] for p in payload.get("posts", [])] + self.seen_post_ids)[:200]
+            if not payload.get("next_cursor"):
+                return
+            data["cursor"] = payload["next_cursor"]
+            self.think()
+
+    def suggest(self):
+        word = self.rng.choice(SUGGEST_WORDS)
+        search_type = "sector" if word == "Information" else "ticker"
+        for end in range(1, len(word) + 1):
+            self.request("POST /api/suggest", "POST", "/api/suggest", json={"q": word[:end], "type": search_type})
+            self.think(0.2)
+
+    def history(self):
+        page = self.request("GET /history", "GET", "/history")
+        if page is None:
+            return
+        ids = _RESULT_ID_RE.findall(page.text)
+        if ids:
+            self.think()
+            self.request("GET /api/history/<id>", "GET", f"/api/history/{self.rng.choice(ids)}")
+        next_page = _NEXT_PAGE_RE.search(page.text)
+        if next_page and self.rng.random() < 0.5:
+            self.think()
+            self.request("GET /history?cursor", "GET", next_page.group(1).replace("&amp;", "&"))
+
+    def analyze(self):
+        if not self.seen_post_ids:
+            return self.scroll()
+        post_ids = self.rng.sample(self.seen_post_ids, min(3, len(self.seen_post_ids)))
+        self.request("POST /api/analyze-batch", "POST", "/api/analyze-batch", json={
+            "postIds": post_ids, "promptText": "Load test prompt {texts} {ticker_context}",
+            "modelName": "gpt-4o-mini", "promptName": "__bench_prompt__",
+        })
+
+    def run(self, stop_at, weights):
+        names = [name for name, weight in weights.items() if weight > 0]
+        scenario_weights = [weights[name] for name in names]
+        while time.monotonic() < stop_at:
+            getattr(self, self.rng.choices(names, weights=scenario_weights)[0])()
+            self.think()
+
+
+def run_stage(args, users, weights, seed):
+    recorder = Recorder()
+    virtual_users = [VirtualUser(args.base_url, args.username, args.password, recorder,
+                                 random.Random(seed * 1000 + i), args.think_ms, verify=not args.insecure)
+                     for i in range(users)]
+    # ログインは計測期間の外で済ませる (ログインの記録は結果に残す)
+    for user in virtual_users:
+        user.login()
+    started = time.monotonic()
+    stop_at = started + args.duration
+    threads = [threading.Thread(target=user.run, args=(stop_at, weights), daemon=True) for user in virtual_users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.monotonic() - started)
+
+
+def print_stage(users, summary):
+    print(f"\n=== {users} users: {summary['rps']} req/s, error rate {summary['error_rate'] * 100:.2f}% ===")
+    print(f"{'endpoint':<28} {'req':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6} {'429':>5}")
+    for endpoint, s in summary["endpoints"].items():
+        print(f"{endpoint:<28} {s['requests']:>6} {s['rps']:>7.2f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+              f"{s['p99_ms']:>8.1f} {s['error_rate'] * 100:>6.2f} {s['rate_limited']:>5}")
+
+
+def _parse_weight(value):
+    name, _, weight = value.partition("=")
+    if name not in SCENARIO_WEIGHTS or not weight.isdigit():
+        raise argparse.ArgumentTypeError(f"expected <scenario>=<int> with scenario in {list(SCENARIO_WEIGHTS)}")
+    return name, int(weight)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the web app with logged-in user sessions.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench")
+    parser.add_argument("--stages", default="1,5,10,20", help="Comma-separated concurrent user counts")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per stage")
+    parser.add_argument("--think-ms", type=float, default=500, help="Max think time between actions (uniform)")
+    parser.add_argument("--weight", action="append", type=_parse_weight, default=[],
+                        help="Scenario weight, e.g. --weight analyze=1 (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--insecure", action="store_true", help="Do not verify TLS certificates")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    weights = dict(SCENARIO_WEIGHTS, **dict(args.weight))
+    stages = [int(n) for n in args.stages.split(",") if n.strip()]
+    report = {
+        "meta": {"timestamp": datetime.now(timezone.utc).isoformat(), "base_url": args.base_url,
+                 "duration": args.duration, "think_ms": args.think_ms, "weights": weights},
+        "stages": [],
+    }
+    for users in stages:
+        summary = run_stage(args, users, weights, args.seed)
+        report["stages"].append(dict(summary, users=users))
+        print_stage(users, summary)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'users':>6} {'req/s':>8} {'err%':>6}")
+    for stage in report["stages"]:
+        print(f"{stage['users']:>6} {stage['rps']:>8.2f} {stage['error_rate'] * 100:>6.2f}")
+    print(f"\nSaved: {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+主要な処理 (hot path) のベンチマーク。シード済みのデータセットに対して計測し、結果を JSON に保存する。
+
+    python benchmarks/run_benchmarks.py --scale 100k --repeat 20
+    python benchmarks/run_benchmarks.py --scale 1m --only filter --compare benchmarks/results/<前回>.json
+
+計測対象:
+  - parse_threads_data_from_lines  メモリ上に作った Threads のテキスト (--parse-posts 件)
+  - recalculate_all_weights        全アカウントの重み再計算
+  - /api/filter-posts              絞り込み条件の組み合わせごとに 1 ページ目と 2 ページ目 (next_cursor)
+  - /history                       1 ページ目と 2 ページ目
+  - /api/suggest                   銘柄 (ティッカー・社名) / セクター
+  - _run_analysis_logic            スタブの OpenAI クライアント (stub_openai) で --analysis-batch 件。計測後にロールバック
+  - load_jsonl_file                 一時ファイルに書いた JSONL (--jsonl-posts 件) の COPY 取り込み。毎回取り込んだ投稿を消して入れ直す
+
+データは benchmarks/seed.py で投入する (件数が --scale と違えば入れ直す)。
+HTTP のケースは Flask のテストクライアントでログインして呼ぶ (CSRF とレート制限は無効にする)。
+各ケースの p50 / p95 / max (ms) と 1 回あたりのクエリ数 (query_profiler) を表にして表示し、
+benchmarks/results/<日時>-<scale>.json に保存する。--compare で前回の JSON との差を表示する。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import CollectedPost, SessionLocal, StockTickerMap, engine
+from query_profiler import instrument_engine, profile_queries
+import seed as bench_seed
+from stub_openai import StubOpenAIClient
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# load_jsonl_file の計測で取り込む投稿のアカウント (計測の前後に投稿を消す)
+JSONL_BENCH_USER = "bench_jsonl"
+
+# /api/filter-posts の条件の組み合わせ (名前 -> リクエスト JSON)
+FILTER_CASES = {
+    "all": {},
+    "keyword_substring": {"keyword": "決算", "match_mode": "substring"},
+    "keyword_fulltext": {"keyword": "決算", "match_mode": "fulltext"},
+    "keyword_fuzzy": {"keyword": "guidanse", "match_mode": "fuzzy"},
+    "ticker": {"ticker": ["NVDA"]},
+    "sector": {"sector": ["Information Technology"]},
+    "sentiment": {"sentiment": "Positive"},
+    "accounts": {"accounts": ["bench_user_1", "bench_user_2", "bench_user_3"]},
+    "likes_rts": {"likes": 500, "rts": 100},
+    "period_7d": {"period_days": 7},
+    "sort_likes": {"sort": "like_count"},
+    "sort_posted_at": {"sort": "posted_at"},
+    "combined": {"keyword": "決算", "match_mode": "fulltext", "sector": ["Information Technology"],
+                 "sentiment": "Positive", "period_days": 30, "sort": "posted_at"},
+}
+
+SUGGEST_CASES = {
+    "ticker": {"q": "NV", "type": "ticker"},
+    "sector": {"q": "Info", "type": "sector"},
+    "company_name": {"q": "micro", "type": "ticker"},
+}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(name, fn, repeat, prepare=None, warmup=1):
+    """
+    fn を warmup + repeat 回実行し、後半 repeat 回の所要時間 (ms) とクエリ数を集計する。
+    prepare があれば毎回 fn の前に (計測外で) 呼び、その戻り値を fn に渡す。
+    """
+    samples, queries = [], []
+    for i in range(warmup + repeat):
+        arg = prepare() if prepare else None
+        with profile_queries(name) as profile, contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn(arg) if prepare else fn()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        if i >= warmup:
+            samples.append(elapsed_ms)
+            queries.append(profile.count)
+    return {
+        "name": name,
+        "runs": repeat,
+        "p50_ms": round(_percentile(samples, 50), 2),
+        "p95_ms": round(_percentile(samples, 95), 2),
+        "max_ms": round(max(samples), 2),
+        "mean_ms": round(statistics.mean(samples), 2),
+        "queries": round(statistics.mean(queries), 1),
+    }
+
+
+# --- HTTP (Flask テストクライアント) ---
+
+def _make_client():
+    import run
+    run.app.config["WTF_CSRF_ENABLED"] = False
+    if run.limiter is not None:
+        run.limiter.enabled = False
+    client = run.app.test_client()
+    response = client.post("/login", base_url="https://localhost",
+                           data={"username": bench_seed.BENCH_USER[0], "password": bench_seed.BENCH_USER[1]})
+    if response.status_code != 302:
+        raise RuntimeError(f"Login as '{bench_seed.BENCH_USER[0]}' failed ({response.status_code}). Run benchmarks/seed.py first.")
+    return client
+
+
+def _checked(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.path}: HTTP {response.status_code}")
+    return response
+
+
+def bench_filter_posts(client, repeat):
+    results = []
+    for case, data in FILTER_CASES.items():
+        post = lambda payload: _checked(client.post("/api/filter-posts", json=payload, base_url="https://localhost"))
+        results.append(measure(f"filter-posts:{case}", lambda: post(data), repeat))
+        next_cursor = post(data).get_json().get("next_cursor")
+        if next_cursor:
+            page2 = dict(data, cursor=next_cursor)
+            results.append(measure(f"filter-posts:{case}:page2", lambda: post(page2), repeat))
+    return results
+
+
+def bench_history(client, repeat):
+    from utils_history import query_history_page
+    get = lambda url: _checked(client.get(url, base_url="https://localhost"))
+    results = [measure("history", lambda: get("/history"), repeat)]
+    db = SessionLocal()
+    try:
+        _, next_cursor = query_history_page(db)
+    finally:
+        db.close()
+    if next_cursor:
+        results.append(measure("history:page2", lambda: get(f"/history?cursor={next_cursor}"), repeat))
+    return results
+
+
+def bench_suggest(client, repeat):
+    return [
+        measure(f"suggest:{case}", lambda data=data: _checked(
+            client.post("/api/suggest", json=data, base_url="https://localhost")), repeat)
+        for case, data in SUGGEST_CASES.items()
+    ]
+
+
+# --- 関数を直接呼ぶケース ---
+
+def _threads_lines(posts):
+    lines = ["bench_parser", "Bench Parser", "フォロワー1.2万人", ""]
+    for i in range(posts):
+        lines.append(f"{i % 23 + 1}時間前" if i % 5 else f"{i % 6 + 1}日")
+        lines.append(f"決算 #{i} $NVDA ガイダンス上方修正。earnings beat, guidance raised ({i})")
+        lines.append("1 / 2")
+        lines.append("https://example.com/link")
+        lines.append("")
+    return lines
+
+
+def bench_parser(repeat, posts):
+    from utils_parser import parse_threads_data_from_lines
+    lines = _threads_lines(posts)
+    return [measure(f"parse_threads:{posts}", lambda: list(parse_threads_data_from_lines(lines)), repeat)]
+
+
+def bench_weights(repeat):
+    from calculate_weights import recalculate_all_weights
+    return [measure("recalculate_all_weights", recalculate_all_weights, repeat)]
+
+
+def bench_analysis(repeat, batch):
+    import utils_db
+    db = SessionLocal()
+    original_client = utils_db.client_openai
+    utils_db.client_openai = StubOpenAIClient()
+    try:
+        ticker_map = db.query(StockTickerMap).all()
+
+        def prepare():
+            # 前回の分析はロールバック済み。投稿は毎回読み直す (期限切れ属性の遅延ロードを計測に含めない)
+            return db.query(CollectedPost).filter(CollectedPost.post_id.like("bench\\_%")) \
+                .order_by(CollectedPost.id).limit(batch).all()
+
+        def analyze(posts):
+            try:
+                utils_db._run_analysis_logic(db, posts, "Benchmark prompt {texts} {ticker_context}",
+                                             "gpt-4o-mini", "__bench_prompt__", ticker_map)
+                db.flush()
+            finally:
+                db.rollback()
+
+        return [measure(f"run_analysis_logic:{batch}", analyze, repeat, prepare=prepare)]
+    finally:
+        utils_db.client_openai = original_client
+        db.close()
+
+
+def _write_jsonl(path, posts):
+    started = datetime(2024, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(posts):
+            f.write(json.dumps({
+                "post_id": f"bench-jsonl-{i}",
+                "username": JSONL_BENCH_USER,
+                "original_text": f"決算 #{i} $NVDA ガイダンス上方修正。earnings beat, guidance raised ({i})",
+                "posted_at": (started + timedelta(minutes=i)).isoformat(),
+                "like_count": i % 500,
+            }, ensure_ascii=False) + "\n")
+
+
+def _delete_jsonl_posts():
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM collected_posts WHERE username = :username"), {"username": JSONL_BENCH_USER})
+
+
+def bench_jsonl_import(repeat, posts):
+    from utils_import import load_jsonl_file
+    with tempfile.TemporaryDirectory(prefix="bench-jsonl-") as tmp:
+        path = os.path.join(tmp, "posts.jsonl")
+        _write_jsonl(path, posts)
+        try:
+            result = measure(f"load_jsonl_file:{posts}", lambda _: load_jsonl_file(path), repeat,
+                             prepare=_delete_jsonl_posts)
+        finally:
+            _delete_jsonl_posts()
+    result["posts_per_sec"] = round(posts / (result["p50_ms"] / 1000)) if result["p50_ms"] else None
+    return [result]
+
+
+SUITES = ("parser", "weights", "filter", "history", "suggest", "analysis", "jsonl")
+
+
+def run_suite(scale, repeat, only=None, parse_posts=5000, analysis_batch=20, jsonl_posts=50000):
+    instrument_engine(engine)
+    bench_seed.seed(bench_seed._scale_to_count(scale))
+    suites = only or SUITES
+    results = []
+    client = _make_client() if {"filter", "history", "suggest"} & set(suites) else None
+    for suite in suites:
+        print(f"Running {suite}...")
+        if suite == "parser":
+            results += bench_parser(repeat, parse_posts)
+        elif suite == "weights":
+            results += bench_weights(max(1, repeat // 5))
+        elif suite == "filter":
+            results += bench_filter_posts(client, repeat)
+        elif suite == "history":
+            results += bench_history(client, repeat)
+        elif suite == "suggest":
+            results += bench_suggest(client, repeat)
+        elif suite == "analysis":
+            results += bench_analysis(max(1, repeat // 5), analysis_batch)
+        elif suite == "jsonl":
+            results += bench_jsonl_import(max(1, repeat // 5), jsonl_posts)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "scale": scale,
+            "posts": bench_seed._scale_to_count(scale),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def print_table(report, previous=None):
+    before = {r["name"]: r for r in (previous or {}).get("results", [])}
+    header = f"{'case':<40} {'p50':>9} {'p95':>9} {'max':>9} {'queries':>8}"
+    if before:
+        header += f" {'Δp50':>8} {'Δp95':>8}"
+    print(f"\nscale={report['meta']['scale']} repeat={report['meta']['repeat']} commit={report['meta']['git_commit']}")
+    print(header)
+    print("-" * len(header))
+    for r in report["results"]:
+        line = f"{r['name']:<40} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['max_ms']:>9.2f} {r['queries']:>8}"
+        old = before.get(r["name"])
+        if old:
+            delta = lambda key: f"{(r[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else "-"
+            line += f" {delta('p50_ms'):>8} {delta('p95_ms'):>8}"
+        if r.get("posts_per_sec"):
+            line += f"  {r['posts_per_sec']:,} posts/s"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths on a seeded dataset.")
+    parser.add_argument("--scale", default="10k", help="10k, 100k, 1m or a post count")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per case")
+    parser.add_argument("--only", action="append", choices=SUITES, help="Run only these suites (repeatable)")
+    parser.add_argument("--parse-posts", type=int, default=5000, help="Posts in the synthetic Threads text")
+    parser.add_argument("--analysis-batch", type=int, default=20, help="Posts per _run_analysis_logic call")
+    parser.add_argument("--jsonl-posts", type=int, default=50000, help="Records in the JSONL file for load_jsonl_file")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/<time>-<scale>.json)")
+    parser.add_argument("--compare", help="Previous result JSON to compare against")
+    args = parser.parse_args()
+
+    report = run_suite(args.scale, args.repeat, args.only, args.parse_posts, args.analysis_batch,
+                       args.jsonl_posts)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{args.scale}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_table(report, previous)
+    print(f"\nSaved: {output}")
+
+
+if __name__ == "__main__":
+    main()
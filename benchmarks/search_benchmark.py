@@ -0,0 +1,103 @@
+"""
+/api/filter-posts のキーワード検索を match_mode ごとに計測する。
+
+    python benchmarks/search_benchmark.py --keyword 決算 --keyword NVDA --repeat 20 --explain
+
+各モードで utils_feed.query_post_page を repeat 回実行し、p50 / p95 / max (ms) と件数を表示する。
+--baseline を付けると、索引を使わない従来の ILIKE (bitmap scan 無効) も計測する。
+--explain を付けると、各モードのページ取得クエリの EXPLAIN (ANALYZE, BUFFERS) を表示する。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import event, text
+from models import SessionLocal, engine
+from utils_feed import query_post_page
+from utils_search import MATCH_MODES
+
+BASELINE_MODE = "baseline"
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _run_once(db, keyword, mode, limit):
+    if mode == BASELINE_MODE:
+        # 索引導入前の挙動: ILIKE は bitmap (GIN) を使えず、id 順に走査しながらフィルタする
+        db.execute(text("SET LOCAL enable_bitmapscan = off"))
+        data = {"keyword": keyword, "match_mode": "substring", "limit": limit}
+    else:
+        data = {"keyword": keyword, "match_mode": mode, "limit": limit}
+    start = time.perf_counter()
+    posts, _ = query_post_page(db, data)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    db.rollback()
+    return elapsed_ms, len(posts)
+
+
+def _explain(db, keyword, mode, limit):
+    """ページ取得クエリ (collected_posts を引く最初の SELECT) を捕まえて EXPLAIN する。"""
+    captured = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if not captured and statement.lstrip().startswith("SELECT collected_posts.id"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        _run_once(db, keyword, mode, limit)
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+    if not captured:
+        return "(query not captured)"
+
+    statement, parameters = captured[0]
+    raw = db.connection().connection
+    cur = raw.cursor()
+    try:
+        if mode == BASELINE_MODE:
+            cur.execute("SET LOCAL enable_bitmapscan = off")
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+        return "\n".join(row[0] for row in cur.fetchall())
+    finally:
+        cur.close()
+        db.rollback()
+
+
+def run_benchmark(keywords, repeat=10, limit=50, baseline=False, explain=False):
+    modes = ([BASELINE_MODE] if baseline else []) + list(MATCH_MODES)
+    db = SessionLocal()
+    try:
+        print(f"{'keyword':<20} {'mode':<10} {'rows':>5} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for keyword in keywords:
+            for mode in modes:
+                _run_once(db, keyword, mode, limit)  # warm-up (キャッシュ / プラン)
+                samples, rows = [], 0
+                for _ in range(repeat):
+                    elapsed_ms, rows = _run_once(db, keyword, mode, limit)
+                    samples.append(elapsed_ms)
+                print(f"{keyword[:20]:<20} {mode:<10} {rows:>5} "
+                      f"{statistics.median(samples):>9.2f} {_percentile(samples, 95):>9.2f} {max(samples):>9.2f}")
+                if explain:
+                    print(_explain(db, keyword, mode, limit))
+                    print()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark keyword search per match_mode.")
+    parser.add_argument("--keyword", action="append", required=True, help="Search keyword (repeatable)")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per keyword and mode")
+    parser.add_argument("--limit", type=int, default=50, help="Page size")
+    parser.add_argument("--baseline", action="store_true", help="Also time ILIKE without the search indexes")
+    parser.add_argument("--explain", action="store_true", help="Print EXPLAIN (ANALYZE, BUFFERS) per mode")
+    args = parser.parse_args()
+    run_benchmark(args.keyword, repeat=args.repeat, limit=args.limit, baseline=args.baseline, explain=args.explain)
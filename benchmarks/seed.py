@@ -0,0 +1,87 @@
+"""
+ベンチマーク用のデータを Postgres に投入する。
+
+    python benchmarks/seed.py --scale 100k          # 10k / 100k / 1m または件数
+    python benchmarks/seed.py --reset               # ベンチマーク用データを削除
+
+行の生成は generate_test_data.generate (COPY で流し込む合成データ生成) に任せ、接頭辞 bench で呼ぶ。
+銘柄・語彙・分布・content_fingerprint の埋め方はそちらと共通。同じ --seed と件数なら同じ分布になる。
+
+投入するもの (既存データとは bench_ 接頭辞で区別する):
+  - 監視対象アカウント bench_user_1..N と UserTickerWeight
+  - 投稿 (post_id = bench_<n>): 過去90日、分析結果と analysis_posts_link、言及銘柄ごとの TickerSentiment
+  - プロンプト __bench_prompt__、ログイン用ユーザー bench / bench
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+
+import generate_test_data
+from models import SessionLocal
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BENCH_USER = ("bench", "bench")
+BENCH_PREFIX = "bench"
+BENCH_PROMPT = "__bench_prompt__"
+BENCH_DAYS = 90
+
+
+def _scale_to_count(scale: str) -> int:
+    scale = scale.lower()
+    return SCALES[scale] if scale in SCALES else int(scale)
+
+
+def bench_post_count(db) -> int:
+    return db.execute(text("SELECT count(*) FROM collected_posts WHERE post_id LIKE 'bench\\_%'")).scalar()
+
+
+def reset() -> None:
+    """ベンチマーク用データを削除する。"""
+    generate_test_data.reset(BENCH_PREFIX)
+
+
+def _ensure_bench_user(db) -> None:
+    if not db.execute(text("SELECT 1 FROM users WHERE username = :u"), {"u": BENCH_USER[0]}).first():
+        db.execute(text(
+            "INSERT INTO users (username, password_hash, created_at) VALUES (:u, :p, now())"
+        ), {"u": BENCH_USER[0], "p": generate_password_hash(BENCH_USER[1])})
+
+
+def seed(count: int, accounts: int = 200, seed_value: int = 42) -> None:
+    db = SessionLocal()
+    try:
+        existing = bench_post_count(db)
+        if existing == count:
+            print(f"Benchmark data already seeded ({count} posts).")
+            return
+        _ensure_bench_user(db)
+        db.commit()
+    finally:
+        db.close()
+    if existing:
+        print(f"Removing previous benchmark data ({existing} posts)...")
+        reset()
+
+    started = time.perf_counter()
+    generate_test_data.generate(count, accounts=accounts, days=BENCH_DAYS, seed=seed_value,
+                                prefix=BENCH_PREFIX, prompt_name=BENCH_PROMPT)
+    print(f"Seeded {count} posts in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed benchmark data.")
+    parser.add_argument("--scale", default="10k", help="10k, 100k, 1m or a post count")
+    parser.add_argument("--accounts", type=int, default=200, help="Number of bench_user_N accounts")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--reset", action="store_true", help="Only remove benchmark data")
+    args = parser.parse_args()
+    if args.reset:
+        reset()
+    else:
+        seed(_scale_to_count(args.scale), accounts=args.accounts, seed_value=args.seed)
@@ -0,0 +1,269 @@
+"""
+OpenAI の chat completions のスタブ (プロセス内のクライアントと、ローカルの HTTP サーバー)。
+
+プロンプトの POST_DB_ID と本文中の $TICKER (ticker_context に載っている銘柄のみ) から
+_run_analysis_logic / analyze_post が読む形の JSON (overall_summary, summary, detailed_analysis) を組み立てる。
+usage は文字数からの概算 (ASCII 4文字 ≒ 1トークン、日本語 1文字 ≒ 1トークン)。ネットワークには出ない。
+
+プロセス内 (ベンチマーク):
+
+    from stub_openai import StubOpenAIClient
+    utils_db.client_openai = StubOpenAIClient(latency_ms=0)
+
+HTTP サーバー (Web / worker をそのまま繋ぐ。負荷試験用):
+
+    python benchmarks/stub_openai.py --port 8100 --latency lognormal:800:0.6 --rate-429 0.05 --rate-500 0.01 --rate-malformed 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=stub gunicorn ...
+
+--latency は const:MS / uniform:MIN_MS:MAX_MS / lognormal:MEDIAN_MS:SIGMA。
+--rate-429 / --rate-500 の割合で OpenAI と同じ形のエラーを返し、--rate-malformed の割合で
+message.content が壊れた JSON の応答を返す。GET /stub/stats で結果ごとの件数を返す。
+openai クライアントは 429 / 5xx を既定で2回まで再試行する点に注意。
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+_POST_ID_RE = re.compile(r"^POST_DB_ID:\s*(\d+)", re.MULTILINE)
+_TEXT_RE = re.compile(r"^TEXT:\s*(.*)$", re.MULTILINE)
+_CONTEXT_RE = re.compile(r"^([A-Z][A-Z0-9.\-]{0,9}):\s", re.MULTILINE)
+_MENTION_RE = re.compile(r"\$([A-Z][A-Z0-9.\-]{0,9})")
+_SENTIMENTS = ("Positive", "Negative", "Neutral")
+
+
+def estimate_tokens(text: str) -> int:
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return max(1, ascii_chars // 4 + (len(text) - ascii_chars))
+
+
+def _pick_sentiment(post_id: int, ticker: str) -> str:
+    # 同じ投稿・銘柄なら毎回同じ結果にする (計測のたびに保存件数が変わらないように)
+    digest = hashlib.sha1(f"{post_id}:{ticker}".encode()).digest()
+    return _SENTIMENTS[digest[0] % len(_SENTIMENTS)]
+
+
+def build_content(prompt: str) -> str:
+    """プロンプトから分析結果の JSON 文字列 (message.content) を作る。"""
+    match = _POST_ID_RE.search(prompt)
+    post_id = int(match.group(1)) if match else 0
+    text_match = _TEXT_RE.search(prompt)
+    body = text_match.group(1) if text_match else prompt
+    known = set(_CONTEXT_RE.findall(prompt))
+    # ticker_context が無いプロンプト (analyze_post) では $ 付きの語をそのまま銘柄とみなす
+    tickers = [t for t in dict.fromkeys(_MENTION_RE.findall(body)) if not known or t in known]
+    summary = f"Stub summary for post {post_id}" if match else "Stub summary"
+    return json.dumps({
+        "overall_summary": summary,
+        "summary": summary,
+        "detailed_analysis": [{
+            "post_db_id": post_id,
+            "ticker_sentiments": [
+                {"ticker": t, "sentiment": _pick_sentiment(post_id, t), "reason": "stub"} for t in tickers
+            ],
+        }],
+    }, ensure_ascii=False)
+
+
+def completion_payload(messages: List[Dict], model: str, content: str = None) -> Dict:
+    """OpenAI の chat.completion と同じ形の dict。content を省くと build_content で作る。"""
+    prompt = "\n".join(m.get("content") or "" for m in messages)
+    content = build_content(prompt) if content is None else content
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+            "logprobs": None,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+# --- プロセス内のクライアント ---
+
+class _Usage(SimpleNamespace):
+    def model_dump(self) -> Dict:
+        return dict(vars(self))
+
+
+def build_completion(messages: List[Dict], model: str) -> SimpleNamespace:
+    """messages から ChatCompletion 相当のオブジェクトを作る。"""
+    payload = completion_payload(messages, model)
+    return SimpleNamespace(
+        id=payload["id"],
+        model=model,
+        choices=[SimpleNamespace(index=c["index"], finish_reason=c["finish_reason"],
+                                 message=SimpleNamespace(**c["message"])) for c in payload["choices"]],
+        usage=_Usage(**payload["usage"]),
+    )
+
+
+class _Completions:
+    def __init__(self, owner: "StubOpenAIClient"):
+        self._owner = owner
+
+    def create(self, model: str, messages: List[Dict], **kwargs) -> SimpleNamespace:
+        self._owner.calls += 1
+        if self._owner.latency_ms:
+            time.sleep(self._owner.latency_ms / 1000.0)
+        return build_completion(messages, model)
+
+
+class StubOpenAIClient:
+    """openai.OpenAI の chat.completions.create だけを持つスタブ。calls に呼び出し回数を数える。"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+
+# --- HTTP サーバー ---
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """--latency の指定を、乱数から待ち時間 (ms) を返す関数にする。"""
+    kind, _, rest = spec.partition(":")
+    args = [float(x) for x in rest.split(":")] if rest else []
+    if kind == "const" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(max(args[0], 0.001))
+        return lambda rng: rng.lognormvariate(mu, args[1])
+    raise argparse.ArgumentTypeError(f"invalid latency spec: {spec!r}")
+
+
+class StubBehavior:
+    """待ち時間と障害注入の設定。乱数と件数はスレッド間で共有するのでロックで守る。"""
+
+    def __init__(self, latency, rate_429=0.0, rate_500=0.0, rate_malformed=0.0, seed=None):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_malformed = rate_malformed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def draw(self):
+        """(待ち時間 ms, 結果) を決める。結果は ok / rate_limited / server_error / malformed。"""
+        with self._lock:
+            delay = max(0.0, self.latency(self._rng))
+            roll = self._rng.random()
+            if roll < self.rate_429:
+                outcome = "rate_limited"
+            elif roll < self.rate_429 + self.rate_500:
+                outcome = "server_error"
+            elif roll < self.rate_429 + self.rate_500 + self.rate_malformed:
+                outcome = "malformed"
+            else:
+                outcome = "ok"
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        return delay, outcome
+
+
+def _error_body(message: str, kind: str, code: str) -> Dict:
+    return {"error": {"message": message, "type": kind, "param": None, "code": code}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    behavior: StubBehavior = None
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stub/stats":
+            return self._send_json(200, {"counts": dict(self.behavior.counts)})
+        self._send_json(404, _error_body("Not found", "invalid_request_error", "not_found"))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, _error_body("Invalid JSON body", "invalid_request_error", "invalid_json"))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, _error_body("Not found", "invalid_request_error", "not_found"))
+
+        delay_ms, outcome = self.behavior.draw()
+        time.sleep(delay_ms / 1000.0)
+        model = request.get("model", "gpt-4o-mini")
+        if outcome == "rate_limited":
+            return self._send_json(429, _error_body("Rate limit reached (stub)", "requests", "rate_limit_exceeded"),
+                                   {"retry-after": "1"})
+        if outcome == "server_error":
+            return self._send_json(500, _error_body("The server had an error (stub)", "server_error", None))
+
+        messages = request.get("messages") or []
+        payload = completion_payload(messages, model)
+        if outcome == "malformed":
+            # 途中で切れた JSON (max_tokens 到達時のような応答)
+            content = payload["choices"][0]["message"]["content"]
+            payload = completion_payload(messages, model, content[: max(1, len(content) // 2)])
+            payload["choices"][0]["finish_reason"] = "length"
+        self._send_json(200, payload)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def serve(host: str, port: int, behavior: StubBehavior, quiet: bool = False) -> None:
+    StubHandler.behavior = behavior
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.quiet = quiet
+    print(f"Stub OpenAI server on http://{host}:{port}/v1 (set OPENAI_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Responses: {behavior.counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible chat completions stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=parse_latency, default=parse_latency("const:0"),
+                        help="const:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS:SIGMA")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="Share of responses with truncated JSON content")
+    parser.add_argument("--seed", type=int, help="Random seed for latency and failure injection")
+    parser.add_argument("--quiet", action="store_true", help="Do not log each request")
+    args = parser.parse_args()
+    serve(args.host, args.port,
+          StubBehavior(args.latency, args.rate_429, args.rate_500, args.rate_malformed, args.seed),
+          quiet=args.quiet)
@@ -0,0 +1,141 @@
+# db_pool.py
+"""
+Connection pool settings and instrumentation for models.engine.
+
+Pool parameters come from the environment so they can be sized per deployment
+(gunicorn workers x DB_POOL_SIZE + DB_MAX_OVERFLOW must stay below the server's
+max_connections):
+
+  DB_POOL_SIZE (5), DB_MAX_OVERFLOW (10), DB_POOL_TIMEOUT seconds (30),
+  DB_POOL_RECYCLE seconds (1800), DB_POOL_PRE_PING (1)
+
+InstrumentedQueuePool records how long each checkout waited for a free
+connection plus peak / current usage. pool_stats() returns a snapshot,
+served by /admin/db-pool.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger("db_pool")
+
+# 待ち時間がこれを超えたチェックアウトは警告ログに出す (ミリ秒)
+POOL_WAIT_WARN_MS = float(os.environ.get("DB_POOL_WAIT_WARN_MS", "100"))
+# パーセンタイル計算に使う直近のサンプル数
+WAIT_SAMPLE_SIZE = 1000
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+        self._recent_waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    def record_checkout(self, wait: float, checked_out: int) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            self._recent_waits.append(wait)
+        if wait * 1000 >= POOL_WAIT_WARN_MS:
+            logger.warning("DB pool checkout waited %.1f ms (checked out: %d)", wait * 1000, checked_out)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            checkouts, wait_total = self.checkouts, self.wait_total
+
+            def _pct(p: float) -> float:
+                if not waits:
+                    return 0.0
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3)
+
+            return {
+                "checkouts": checkouts,
+                "timeouts": self.timeouts,
+                "peak_checked_out": self.peak_checked_out,
+                "wait_ms_avg": round(wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+                "wait_ms_p50": _pct(0.50),
+                "wait_ms_p95": _pct(0.95),
+                "wait_ms_p99": _pct(0.99),
+            }
+
+
+POOL_METRICS = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that measures the time spent waiting for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            POOL_METRICS.record_timeout()
+            logger.error("DB pool checkout timed out after %.1f s", time.perf_counter() - started)
+            raise
+        POOL_METRICS.record_checkout(time.perf_counter() - started, self.checkedout())
+        return connection
+
+
+def engine_options_from_env() -> Dict:
+    """create_engine に渡すプール設定。"""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+    }
+
+
+def pool_stats(engine) -> Dict:
+    """プールの現在の状態と累積メトリクス。"""
+    pool = engine.pool
+    stats = {
+        "pid": os.getpid(),
+        "pool_class": type(pool).__name__,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    stats.update(POOL_METRICS.snapshot())
+    return stats
@@ -1,94 +1,380 @@
-# Small script to generate many test posts and related ticker sentiments for local testing.
-# Usage: python scripts/generate_test_data.py --count 5000
-import random
+# Generate a large synthetic dataset (posts, analysis results, ticker sentiments, weights) for local load testing.
+# Usage: python generate_test_data.py --count 1000000 --seed 42
+#        python generate_test_data.py --reset            # remove the rows generated with --prefix
+#
+# Rows are streamed to PostgreSQL with COPY in chunks of --chunk-size posts, one transaction per chunk,
+# so memory stays flat and 1M posts take minutes instead of hours.
+# The same --seed, --count, --accounts, --days and --end-date always produce the same rows.
+#
+# Distributions:
+#   - account activity: power law (a few accounts write most posts)
+#   - ticker mentions: Zipf over the tickers in stock_ticker_map
+#   - posted_at: uniform over --days, hour of day follows a JST daily curve (morning and evening peaks)
+#   - like / retweet counts: log-normal, higher for more active accounts
+#
+# content_fingerprint is filled like worker.py does (utils_parser.compute_content_fingerprint), so the
+# generated posts exercise the post_keys dedupe and the fingerprint indexes like real ones.
+# benchmarks/seed.py uses generate() / reset() with the 'bench' prefix.
+#
+# Posts are generated in runs per account, like worker.py: each analysed run gets one AnalysisResult,
+# its analysis_posts_link rows and one TickerSentiment per mentioned ticker. UserTickerWeight totals and
+# weight_ratio are updated for the generated accounts at the end. ticker_sentiment_daily is kept up to
+# date by its triggers (COPY fires them like INSERT).
 import argparse
-from datetime import datetime, timezone, timedelta
-from models import SessionLocal, CollectedPost, TickerSentiment, TargetAccount, StockTickerMap, Prompt, AnalysisResult
-import string
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
 
-SAMPLE_TICKERS = ['AAPL','TSLA','MSFT','AMZN','GOOG','FB','NFLX','NVDA','INTC','AMD','BABA','FOX']
+from sqlalchemy import text
 
-def random_text():
-    words = ['market','price','buy','sell','earnings','growth','quarter','guidance','downgrade','upgrade','rumor','ipo']
-    return ' '.join(random.choices(words, k=random.randint(6,20)))
+from models import SessionLocal, engine
+from utils_parser import compute_content_fingerprint
 
-def ensure_seed_data(db):
-    # ensure tickers exist
-    for t in SAMPLE_TICKERS:
-        existing = db.query(StockTickerMap).filter(StockTickerMap.ticker==t).first()
-        if not existing:
-            db.add(StockTickerMap(ticker=t, company_name=f"{t} Corp", gics_sector='Technology', gics_sub_industry='Software'))
-    db.commit()
+# StockTickerMap が空 (S&P500 未投入) のときに登録する銘柄
+SAMPLE_TICKERS = [
+    ('AAPL', 'Apple Inc.', 'Information Technology', 'Technology Hardware, Storage & Peripherals'),
+    ('MSFT', 'Microsoft Corporation', 'Information Technology', 'Systems Software'),
+    ('NVDA', 'NVIDIA Corporation', 'Information Technology', 'Semiconductors'),
+    ('AMD', 'Advanced Micro Devices, Inc.', 'Information Technology', 'Semiconductors'),
+    ('INTC', 'Intel Corporation', 'Information Technology', 'Semiconductors'),
+    ('AVGO', 'Broadcom Inc.', 'Information Technology', 'Semiconductors'),
+    ('ORCL', 'Oracle Corporation', 'Information Technology', 'Application Software'),
+    ('CRM', 'Salesforce, Inc.', 'Information Technology', 'Application Software'),
+    ('GOOGL', 'Alphabet Inc.', 'Communication Services', 'Interactive Media & Services'),
+    ('META', 'Meta Platforms, Inc.', 'Communication Services', 'Interactive Media & Services'),
+    ('NFLX', 'Netflix, Inc.', 'Communication Services', 'Movies & Entertainment'),
+    ('DIS', 'The Walt Disney Company', 'Communication Services', 'Movies & Entertainment'),
+    ('AMZN', 'Amazon.com, Inc.', 'Consumer Discretionary', 'Broadline Retail'),
+    ('TSLA', 'Tesla, Inc.', 'Consumer Discretionary', 'Automobile Manufacturers'),
+    ('NKE', 'NIKE, Inc.', 'Consumer Discretionary', 'Apparel, Accessories & Luxury Goods'),
+    ('SBUX', 'Starbucks Corporation', 'Consumer Discretionary', 'Restaurants'),
+    ('JPM', 'JPMorgan Chase & Co.', 'Financials', 'Diversified Banks'),
+    ('BAC', 'Bank of America Corporation', 'Financials', 'Diversified Banks'),
+    ('GS', 'The Goldman Sachs Group, Inc.', 'Financials', 'Investment Banking & Brokerage'),
+    ('V', 'Visa Inc.', 'Financials', 'Transaction & Payment Processing Services'),
+    ('XOM', 'Exxon Mobil Corporation', 'Energy', 'Integrated Oil & Gas'),
+    ('CVX', 'Chevron Corporation', 'Energy', 'Integrated Oil & Gas'),
+    ('LLY', 'Eli Lilly and Company', 'Health Care', 'Pharmaceuticals'),
+    ('JNJ', 'Johnson & Johnson', 'Health Care', 'Pharmaceuticals'),
+    ('UNH', 'UnitedHealth Group Incorporated', 'Health Care', 'Managed Health Care'),
+    ('KO', 'The Coca-Cola Company', 'Consumer Staples', 'Soft Drinks & Non-alcoholic Beverages'),
+    ('WMT', 'Walmart Inc.', 'Consumer Staples', 'Consumer Staples Merchandise Retail'),
+    ('CAT', 'Caterpillar Inc.', 'Industrials', 'Construction Machinery & Heavy Transportation Equipment'),
+    ('BA', 'The Boeing Company', 'Industrials', 'Aerospace & Defense'),
+    ('NEE', 'NextEra Energy, Inc.', 'Utilities', 'Multi-Utilities'),
+]
+
+WORDS = [
+    '決算', '上方修正', '下方修正', '利下げ', '利上げ', '株価', '急騰', '急落', '買い増し', '利確', '損切り',
+    'ガイダンス', '増配', '自社株買い', '半導体', '需要', '在庫', '円安', '金利', '雇用統計', '強気', '弱気',
+    'market', 'price', 'buy', 'sell', 'earnings', 'growth', 'quarter', 'guidance', 'downgrade', 'upgrade',
+    'rumor', 'margin', 'revenue', 'beat', 'miss', 'breakout', 'support', 'AI',
+]
+
+# JST の時間帯ごとの投稿の多さ (0時〜23時)。朝の通勤時間と夜にピーク
+JST_HOURLY_WEIGHTS = [4, 2, 1, 1, 1, 2, 4, 8, 10, 8, 6, 6, 8, 6, 5, 5, 6, 7, 8, 10, 12, 13, 11, 7]
+JST_OFFSET_HOURS = 9
+
+# 1投稿あたりの銘柄言及数 (0〜3) の重み
+MENTION_COUNT_WEIGHTS = [25, 50, 18, 7]
+SENTIMENTS = ['Positive', 'Negative', 'Neutral']
+SENTIMENT_WEIGHTS = [45, 25, 30]
+MODELS = ['gpt-4o-mini', 'gpt-4o']
+
+ACCOUNT_EXPONENT = 1.1   # 投稿数の冪乗則の指数
+TICKER_EXPONENT = 1.0    # 銘柄人気の Zipf 指数
+
+
+def _cum_weights(n: int, exponent: float) -> List[float]:
+    """順位 1..n に 1/rank^exponent の重みを付けた累積重み (random.choices の cum_weights 用)。"""
+    total = 0.0
+    cumulative = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def _copy(cursor, table: str, columns: Tuple[str, ...], buffer: io.StringIO) -> None:
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
 
-def generate(count):
-    db = SessionLocal()
-    try:
-        ensure_seed_data(db)
-        # ensure a few target accounts exist
-        usernames = [f"user_{i}" for i in range(1,21)]
-        for u in usernames:
-            if not db.query(TargetAccount).filter(TargetAccount.username==u).first():
-                db.add(TargetAccount(username=u, provider='X'))
-        db.commit()
 
-        # --- 新規: テスト用の Prompt がなければ作成し、ダミーの AnalysisResult を作成して ID を使う ---
-        prompt = db.query(Prompt).first()
-        if not prompt:
-            # Prompt テーブルの必須カラムに合わせて適宜設定
-            prompt = Prompt(name='__test_prompt__', template_text='Test prompt template')
-            db.add(prompt)
-            db.commit()
-
-        # Create a single dummy AnalysisResult to attach sentiments to (avoid NOT NULL FK issues)
-        dummy_result = AnalysisResult(
-            prompt_id=prompt.id,
-            raw_json_response='{"test": true}',
-            extracted_summary='dummy'
+def _reserve_ids(cursor, table: str, count: int) -> int:
+    """
+    table の id シーケンスから count 個の連番を確保し、先頭の id を返す (行同士の参照を COPY 前に決めるため)。
+    確保の間に他の接続が採番すると衝突しうるので、アプリを止めたローカル環境で使う。
+    """
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+    sequence = cursor.fetchone()[0]
+    cursor.execute("SELECT nextval(%s)", (sequence,))
+    first = cursor.fetchone()[0]
+    if count > 1:
+        cursor.execute("SELECT setval(%s, %s)", (sequence, first + count - 1))
+    return first
+
+
+def ensure_tickers(cursor, rng: random.Random) -> List[str]:
+    """使う銘柄を人気順 (Zipf の順位) に並べて返す。stock_ticker_map が少なければ SAMPLE_TICKERS を登録する。"""
+    cursor.execute("SELECT count(*) FROM stock_ticker_map")
+    if cursor.fetchone()[0] < len(SAMPLE_TICKERS):
+        cursor.executemany(
+            "INSERT INTO stock_ticker_map (ticker, company_name, gics_sector, gics_sub_industry) "
+            "VALUES (%s, %s, %s, %s) ON CONFLICT (ticker) DO NOTHING",
+            SAMPLE_TICKERS,
         )
-        db.add(dummy_result)
-        db.commit()
-        dummy_result_id = dummy_result.id
-
-        # start inserting
-        now = datetime.now(timezone.utc)
-        added = 0
-        for i in range(count):
-            u = random.choice(usernames)
-            posted_at = now - timedelta(seconds=random.randint(0, 60*60*24*30))
-            post = CollectedPost(
-                username=u,
-                post_id='test_' + ''.join(random.choices(string.ascii_lowercase+string.digits, k=10)),
-                original_text=random_text(),
-                source_url='https://example.com',
-                posted_at=posted_at,
-                like_count=random.randint(0,500),
-                retweet_count=random.randint(0,300),
-                created_at=datetime.now(timezone.utc)
-            )
-            db.add(post)
-            db.flush()  # get id
-
-            # add 0-3 ticker sentiments for this post, linking to dummy_result_id
-            for _ in range(random.randint(0,3)):
-                t = random.choice(SAMPLE_TICKERS)
-                ts = TickerSentiment(
-                    analysis_result_id = dummy_result_id,
-                    collected_post_id = post.id,
-                    ticker = t,
-                    sentiment = random.choice(['Positive','Negative','Neutral']),
-                    reasoning = 'auto generated'
-                )
-                db.add(ts)
-            if i % 100 == 0:
-                db.commit()
-            added += 1
+    cursor.execute("SELECT ticker FROM stock_ticker_map ORDER BY ticker")
+    tickers = [row[0] for row in cursor.fetchall()]
+    rng.shuffle(tickers)
+    return tickers
+
+
+def ensure_accounts(cursor, prefix: str, count: int, rng: random.Random) -> List[Tuple[int, str]]:
+    """監視対象アカウント <prefix>_user_1..count を作成し、活動量の多い順に (id, username) を返す。"""
+    rows = [(f"{prefix}_user_{i}", 'Threads' if rng.random() < 0.2 else 'X') for i in range(1, count + 1)]
+    cursor.executemany(
+        "INSERT INTO target_accounts (username, provider, is_active, added_at) "
+        "VALUES (%s, %s, true, now()) ON CONFLICT (username) DO NOTHING",
+        rows,
+    )
+    cursor.execute("SELECT id, username FROM target_accounts WHERE username LIKE %s", (f"{prefix}\\_user\\_%",))
+    ids = dict((username, account_id) for account_id, username in cursor.fetchall())
+    return [(ids[username], username) for username, _ in rows]
+
+
+def ensure_prompt(cursor, name: str = '__test_prompt__') -> int:
+    cursor.execute("SELECT id FROM prompts WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    cursor.execute(
+        "INSERT INTO prompts (name, template_text, is_default, created_at, updated_at) "
+        "VALUES (%s, 'Test prompt template {texts} {ticker_context}', false, now(), now()) RETURNING id",
+        (name,)
+    )
+    return cursor.fetchone()[0]
+
+
+class DataGenerator:
+    """乱数の状態と分布をまとめたもの。chunk() を呼ぶたびに次の投稿群の行を作る。"""
+
+    def __init__(self, rng: random.Random, accounts: List[Tuple[int, str]], tickers: List[str],
+                 end: datetime, days: int, analyzed_ratio: float, posts_per_result: int):
+        self.rng = rng
+        self.accounts = accounts
+        self.tickers = tickers
+        self.end = end
+        self.days = days
+        self.analyzed_ratio = analyzed_ratio
+        self.posts_per_result = posts_per_result
+        self.account_cum = _cum_weights(len(accounts), ACCOUNT_EXPONENT)
+        self.ticker_cum = _cum_weights(len(tickers), TICKER_EXPONENT)
+        # 活動量の多い (順位の高い) アカウントほどいいねが多い: log-normal の mu を順位で下げる
+        self.like_mu = [4.5 - 3.0 * rank / max(1, len(accounts) - 1) for rank in range(len(accounts))]
+        self.mentions: Dict[Tuple[int, str], int] = {}
+        self.now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def _posted_at(self) -> datetime:
+        day = self.end - timedelta(days=self.rng.randrange(self.days))
+        jst_hour = self.rng.choices(range(24), weights=JST_HOURLY_WEIGHTS)[0]
+        utc_hour = (jst_hour - JST_OFFSET_HOURS) % 24
+        posted_at = day.replace(hour=utc_hour, minute=self.rng.randrange(60), second=self.rng.randrange(60))
+        # --end-date が今日のとき、まだ来ていない時刻は前日にずらす
+        return posted_at - timedelta(days=1) if posted_at > self.now else posted_at
+
+    def _text(self, tickers: List[str]) -> str:
+        words = self.rng.choices(WORDS, k=self.rng.randint(6, 24))
+        for ticker in tickers:
+            words.insert(self.rng.randrange(len(words) + 1), f"${ticker}")
+        return ' '.join(words)
+
+    def plan_runs(self, count: int) -> List[Tuple[int, int, bool]]:
+        """count 件の投稿を (アカウントの順位, 件数, 分析済みか) の連続した塊に分ける。"""
+        runs, remaining = [], count
+        while remaining > 0:
+            rank = self.rng.choices(range(len(self.accounts)), cum_weights=self.account_cum)[0]
+            size = min(remaining, self.rng.randint(1, 2 * self.posts_per_result))
+            runs.append((rank, size, self.rng.random() < self.analyzed_ratio))
+            remaining -= size
+        return runs
+
+    def chunk(self, runs, first_post_id: int, first_result_id: int, prompt_id: int, prefix: str, serial: int):
+        """runs の行を CSV バッファ (posts, results, links, sentiments) に書いて返す。serial は post_id の通し番号の開始値。"""
+        buffers = [io.StringIO() for _ in range(4)]
+        posts, results, links, sentiments = (csv.writer(b) for b in buffers)
+        post_id, result_id = first_post_id, first_result_id
+
+        for rank, size, analyzed in runs:
+            account_id, username = self.accounts[rank]
+            latest = None
+            run_posts = []
+            for _ in range(size):
+                k = self.rng.choices(range(len(MENTION_COUNT_WEIGHTS)), weights=MENTION_COUNT_WEIGHTS)[0]
+                mentioned = list(dict.fromkeys(self.rng.choices(self.tickers, cum_weights=self.ticker_cum, k=k)))
+                posted_at = self._posted_at()
+                likes = int(self.rng.lognormvariate(self.like_mu[rank], 1.2))
+                retweets = int(likes * self.rng.betavariate(1.2, 8))
+                body = self._text(mentioned)
+                posts.writerow((
+                    post_id, username, f"{prefix}_{serial}", body,
+                    f"https://example.com/{username}/{serial}", posted_at.isoformat(), likes, retweets,
+                    posted_at.isoformat(), compute_content_fingerprint(body, posted_at),
+                ))
+                run_posts.append((post_id, mentioned, posted_at))
+                latest = max(latest, posted_at) if latest else posted_at
+                post_id += 1
+                serial += 1
+
+            if not analyzed:
+                continue
+            input_tokens = 1800 * size
+            output_tokens = 250 * size
+            model = MODELS[0] if self.rng.random() < 0.9 else MODELS[1]
+            results.writerow((
+                result_id, prompt_id, f"generated:{prefix}", f"Generated summary for {username}",
+                (latest + timedelta(minutes=self.rng.randint(1, 90))).isoformat(), model,
+                round((input_tokens * 0.15 + output_tokens * 0.6) / 1_000_000, 6), input_tokens, output_tokens,
+            ))
+            for pid, mentioned, posted_at in run_posts:
+                links.writerow((result_id, pid))
+                for ticker in mentioned:
+                    sentiment = self.rng.choices(SENTIMENTS, weights=SENTIMENT_WEIGHTS)[0]
+                    sentiments.writerow((result_id, pid, ticker, sentiment, f"{sentiment} tone on ${ticker}",
+                                         posted_at.isoformat()))
+                    key = (account_id, ticker)
+                    self.mentions[key] = self.mentions.get(key, 0) + 1
+            result_id += 1
+
+        return buffers
+
+
+POST_COLUMNS = ('id', 'username', 'post_id', 'original_text', 'source_url', 'posted_at',
+                'like_count', 'retweet_count', 'created_at', 'content_fingerprint')
+RESULT_COLUMNS = ('id', 'prompt_id', 'raw_json_response', 'extracted_summary', 'analyzed_at', 'ai_model',
+                  'cost_usd', 'input_tokens', 'output_tokens')
+LINK_COLUMNS = ('analysis_result_id', 'collected_post_id')
+SENTIMENT_COLUMNS = ('analysis_result_id', 'collected_post_id', 'ticker', 'sentiment', 'reasoning', 'posted_at')
+
+
+def _save_weights(cursor, mentions: Dict[Tuple[int, str], int], account_ids: List[int]) -> None:
+    """言及回数を UserTickerWeight に加算し、calculate_weights.py と同じ定義で weight_ratio を更新する。"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for (account_id, ticker), count in mentions.items():
+        writer.writerow((account_id, ticker, count))
+    cursor.execute("CREATE TEMP TABLE _generated_weights (account_id int, ticker varchar(10), mentions int) ON COMMIT DROP")
+    _copy(cursor, '_generated_weights', ('account_id', 'ticker', 'mentions'), buffer)
+    cursor.execute("""
+        INSERT INTO user_ticker_weights (account_id, ticker, total_mentions, weight_ratio, last_analyzed_at)
+        SELECT account_id, ticker, mentions, 0.0, now() FROM _generated_weights
+        ON CONFLICT (account_id, ticker) DO UPDATE
+            SET total_mentions = user_ticker_weights.total_mentions + EXCLUDED.total_mentions,
+                last_analyzed_at = EXCLUDED.last_analyzed_at
+    """)
+    cursor.execute("""
+        UPDATE user_ticker_weights w
+        SET weight_ratio = w.total_mentions / t.total::float
+        FROM (SELECT account_id, sum(total_mentions) AS total FROM user_ticker_weights
+              WHERE account_id = ANY(%s) GROUP BY account_id) t
+        WHERE w.account_id = t.account_id AND t.total > 0
+    """, (account_ids,))
+
+
+def generate(count, accounts=200, days=365, seed=42, prefix='gen', chunk_size=50_000,
+             analyzed_ratio=0.7, posts_per_result=10, end_date=None, prompt_name='__test_prompt__'):
+    rng = random.Random(seed)
+    end = datetime.combine(end_date or datetime.now(timezone.utc).date(), datetime.min.time())
+    connection = engine.raw_connection()
+    started = time.perf_counter()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT count(*) FROM collected_posts WHERE post_id LIKE %s", (f"{prefix}\\_%",))
+        if cursor.fetchone()[0]:
+            raise SystemExit(f"Posts with prefix '{prefix}_' already exist. Use --reset or another --prefix.")
+
+        tickers = ensure_tickers(cursor, rng)
+        account_rows = ensure_accounts(cursor, prefix, accounts, rng)
+        prompt_id = ensure_prompt(cursor, prompt_name)
+        connection.commit()
+
+        generator = DataGenerator(rng, account_rows, tickers, end, days, analyzed_ratio, posts_per_result)
+        done = 0
+        while done < count:
+            runs = generator.plan_runs(min(chunk_size, count - done))
+            chunk_posts = sum(size for _, size, _ in runs)
+            chunk_results = sum(1 for _, _, analyzed in runs if analyzed)
+            first_post_id = _reserve_ids(cursor, 'collected_posts', chunk_posts)
+            first_result_id = _reserve_ids(cursor, 'analysis_results', chunk_results) if chunk_results else 0
+            posts, results, links, sentiments = generator.chunk(
+                runs, first_post_id, first_result_id, prompt_id, prefix, done + 1)
+
+            # 1チャンク = 1トランザクション。WAL の fsync を待たない (テストデータなので失っても作り直せる)
+            cursor.execute("SET LOCAL synchronous_commit = off")
+            _copy(cursor, 'collected_posts', POST_COLUMNS, posts)
+            _copy(cursor, 'analysis_results', RESULT_COLUMNS, results)
+            _copy(cursor, 'analysis_posts_link', LINK_COLUMNS, links)
+            _copy(cursor, 'ticker_sentiment', SENTIMENT_COLUMNS, sentiments)
+            connection.commit()
+
+            done += chunk_posts
+            elapsed = time.perf_counter() - started
+            print(f"{done}/{count} posts ({done / elapsed:,.0f} posts/s)")
+
+        _save_weights(cursor, generator.mentions, [account_id for account_id, _ in account_rows])
+        connection.commit()
+
+        connection.autocommit = True
+        for table in ('collected_posts', 'analysis_results', 'analysis_posts_link', 'ticker_sentiment', 'user_ticker_weights'):
+            cursor.execute(f"ANALYZE {table}")
+        print(f"Inserted {count} posts for {accounts} accounts in {time.perf_counter() - started:.1f}s.")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def reset(prefix='gen'):
+    """--prefix で生成した行を削除する (参照される側が後になる順)。"""
+    db = SessionLocal()
+    try:
+        conn = db.connection()
+        params = {"posts": f"{prefix}\\_%", "accounts": f"{prefix}\\_user\\_%", "marker": f"generated:{prefix}"}
+        for sql in (
+            "DELETE FROM ticker_sentiment WHERE analysis_result_id IN (SELECT id FROM analysis_results WHERE raw_json_response = :marker)",
+            "DELETE FROM analysis_posts_link WHERE analysis_result_id IN (SELECT id FROM analysis_results WHERE raw_json_response = :marker)",
+            "DELETE FROM analysis_results WHERE raw_json_response = :marker",
+            "DELETE FROM collected_posts WHERE post_id LIKE :posts",
+            "DELETE FROM user_ticker_weights WHERE account_id IN (SELECT id FROM target_accounts WHERE username LIKE :accounts)",
+            "DELETE FROM target_accounts WHERE username LIKE :accounts",
+        ):
+            conn.execute(text(sql), params)
         db.commit()
-        print(f"Inserted {added} posts with sentiments.")
+        print(f"Removed generated data with prefix '{prefix}'.")
     finally:
         db.close()
 
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(description='Generate synthetic posts, analysis results and sentiments with COPY.')
     parser.add_argument('--count', type=int, default=1000, help='number of posts to generate')
+    parser.add_argument('--accounts', type=int, default=200, help='number of <prefix>_user_N accounts')
+    parser.add_argument('--days', type=int, default=365, help='spread posted_at over this many days up to --end-date')
+    parser.add_argument('--end-date', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help='last day of the data (YYYY-MM-DD, default: today UTC). Fix it for reproducible data')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--prefix', default='gen', help='post_id / username prefix of the generated rows')
+    parser.add_argument('--chunk-size', type=int, default=50_000, help='posts per COPY transaction')
+    parser.add_argument('--analyzed-ratio', type=float, default=0.7, help='share of posts with analysis results')
+    parser.add_argument('--posts-per-result', type=int, default=10, help='average posts per analysis result')
+    parser.add_argument('--reset', action='store_true', help='delete the rows generated with --prefix and exit')
     args = parser.parse_args()
-    generate(args.count)
\ No newline at end of file
+    if args.reset:
+        reset(args.prefix)
+    else:
+        generate(args.count, accounts=args.accounts, days=args.days, seed=args.seed, prefix=args.prefix,
+                 chunk_size=args.chunk_size, analyzed_ratio=args.analyzed_ratio,
+                 posts_per_result=args.posts_per_result, end_date=args.end_date)
@@ -0,0 +1,14 @@
+# gunicorn.conf.py
+# gunicorn は起動ディレクトリのこのファイルを自動で読み込む。
+
+import os
+
+
+def child_exit(server, worker):
+    """終了した worker の Prometheus マルチプロセス用ファイルを片付ける (metrics.py)。"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,334 @@
+# index_advisor.py
+"""
+Index advisor for the app's hot-path queries.
+
+Each catalogue entry calls the real code path (utils_feed.query_post_page,
+the worker's latest-post lookup, utils_history, ...) and captures the SQL it
+sends. The SELECT statements are then re-run under
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) in a transaction that is rolled back.
+
+The advisor flags:
+- Seq Scans that examine at least SEQ_SCAN_MIN_ROWS rows (filtered rows
+  included, times loops);
+- Sorts of at least SORT_MIN_ROWS rows, and any sort that spills to disk.
+
+For each finding it proposes a composite index: equality filter columns
+first, then range columns, then the sort keys. An index that an existing
+one already covers (same leading columns) is not proposed. Partitions are
+reported under their parent table.
+
+    python index_advisor.py                 # all queries
+    python index_advisor.py --only feed_ticker_sentiment --verbose
+    python index_advisor.py --no-analyze    # planner estimates only (plain EXPLAIN)
+    python index_advisor.py --json benchmarks/results/index-advisor.json
+
+Run it against a DB with production-like volume (benchmarks/seed.py or
+generate_test_data.py). On a near-empty table the planner rightly prefers
+a Seq Scan. The indexes it proposed for this app are in alembic
+000008_indexes.
+"""
+
+import argparse
+import json
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, engine, CollectedPost
+from query_profiler import statement_shape
+from utils_feed import query_post_page
+from utils_heatmap import query_heatmap
+from utils_history import query_history_page, load_history_details
+
+SEQ_SCAN_MIN_ROWS = 1000
+SORT_MIN_ROWS = 1000
+
+_COLUMN_OP_RE = re.compile(r"\(?(?:\w+\.)?(\w+)\)?(?:::[\w ]+(?:\[\])?)?\s*(= ANY|>=|<=|<>|=|>|<|~~\*?)")
+_SORT_KEY_RE = re.compile(r"^\(?(?:\w+\.)?(\w+)\)?(?:\s+(?:DESC|ASC|NULLS FIRST|NULLS LAST))*$")
+
+
+# ============================================================
+# Catalogue
+# ============================================================
+
+def _sample_params(db: Session) -> Dict:
+    """カタログのクエリに渡す値 (よく使われるアカウント・銘柄、最新の投稿・分析結果)。"""
+    row = db.execute(text("""
+        SELECT (SELECT username FROM target_accounts WHERE is_active ORDER BY id LIMIT 1),
+               (SELECT ticker FROM ticker_sentiment_daily GROUP BY ticker ORDER BY sum(total) DESC LIMIT 1),
+               (SELECT max(id) FROM collected_posts),
+               (SELECT max(id) FROM analysis_results)
+    """)).one()
+    ticker = row[1] or "AAPL"
+    sector = db.execute(text("SELECT gics_sector FROM stock_ticker_map WHERE ticker = :t"), {"t": ticker}).scalar()
+    return {"username": row[0] or "", "ticker": ticker, "sector": sector or "Information Technology",
+            "post_id": row[2] or 0, "result_id": row[3] or 0}
+
+
+def _worker_latest_post(db: Session, p: Dict):
+    # worker.py の run_worker と同じクエリ
+    return db.query(CollectedPost).filter(CollectedPost.username == p["username"]).order_by(CollectedPost.id.desc()).first()
+
+
+def _post_analyses(db: Session, p: Dict):
+    post = db.get(CollectedPost, p["post_id"])
+    return post.analyses if post else []
+
+
+# 名前 -> (説明, 呼び出し)
+CATALOGUE: Dict[str, Tuple[str, Callable[[Session, Dict], object]]] = {
+    "feed_latest": ("/api/filter-posts, no filters, id DESC", lambda db, p: query_post_page(db, {})),
+    "feed_account": ("/api/filter-posts, one account",
+                     lambda db, p: query_post_page(db, {"accounts": [p["username"]]})),
+    "feed_ticker_sentiment": ("/api/filter-posts, ticker + sentiment",
+                              lambda db, p: query_post_page(db, {"ticker": [p["ticker"]], "sentiment": "Positive"})),
+    "feed_sector": ("/api/filter-posts, sector", lambda db, p: query_post_page(db, {"sector": [p["sector"]]})),
+    "feed_period_likes": ("/api/filter-posts, last 30 days sorted by likes",
+                          lambda db, p: query_post_page(db, {"period_days": 30, "sort": "like_count"})),
+    "worker_latest_post": ("worker: latest post of an account", _worker_latest_post),
+    "post_analyses": ("CollectedPost.analyses (analysis_posts_link by collected_post_id)", _post_analyses),
+    "history_page": ("/history first page", lambda db, p: query_history_page(db)),
+    "history_details": ("/history details of the latest analysis",
+                        lambda db, p: load_history_details(db, p["result_id"])),
+    "heatmap": ("/api/heatmap, 30 days", lambda db, p: query_heatmap(db, 30)),
+}
+
+
+def capture_statements(db: Session, fn: Callable[[Session, Dict], object], params: Dict) -> List[Tuple[str, object]]:
+    """fn が発行した SELECT 文を (SQL, パラメータ) で返す。同じ形の文は1回だけ。"""
+    captured, seen = [], set()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        shape = statement_shape(statement)
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")) and shape not in seen:
+            seen.add(shape)
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        fn(db, params)
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+    return captured
+
+
+# ============================================================
+# Plan analysis
+# ============================================================
+
+def explain(db: Session, statement: str, parameters, analyze: bool = True) -> Dict:
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    plan = db.connection().exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def _walk(node: Dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _rows(node: Dict, analyze: bool) -> float:
+    """ノードが読んだ行数 (フィルタで落ちた行も含め、ループ回数を掛ける)。"""
+    if not analyze:
+        return node.get("Plan Rows", 0)
+    loops = node.get("Actual Loops", 1) or 1
+    return (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+
+
+def filter_columns(condition: Optional[str]) -> Tuple[List[str], List[str]]:
+    """Filter 式から (等値条件の列, 範囲条件の列) を取り出す。"""
+    equality, ranges = [], []
+    for column, op in _COLUMN_OP_RE.findall(condition or ""):
+        if op == "<>" or column in equality or column in ranges:
+            continue
+        (equality if op in ("=", "= ANY") else ranges).append(column)
+    return equality, ranges
+
+
+def _sort_columns(keys: List[str]) -> Optional[List[str]]:
+    """Sort Key が単純な列だけなら列名のリスト (式を含むなら None)。"""
+    columns = []
+    for key in keys:
+        match = _SORT_KEY_RE.match(key.strip())
+        if not match:
+            return None
+        columns.append(match.group(1))
+    return columns
+
+
+def _scan_below(node: Dict) -> Optional[Dict]:
+    for child in _walk(node):
+        if child is not node and child.get("Relation Name"):
+            return child
+    return None
+
+
+def analyze_plan(plan: Dict, parents: Dict[str, str], analyze: bool = True) -> List[Dict]:
+    """プランの Seq Scan / Sort を指摘し、それぞれに提案するインデックス (table, columns) を付ける。"""
+    findings = []
+    for node in _walk(plan["Plan"]):
+        kind = node.get("Node Type")
+        if kind == "Seq Scan":
+            rows = _rows(node, analyze)
+            if rows < SEQ_SCAN_MIN_ROWS:
+                continue
+            table = parents.get(node["Relation Name"], node["Relation Name"])
+            equality, ranges = filter_columns(node.get("Filter"))
+            findings.append({
+                "kind": "seq_scan", "table": table, "rows": int(rows), "filter": node.get("Filter"),
+                "index": (table, equality + ranges) if equality or ranges else None,
+            })
+        elif kind == "Sort":
+            rows = node.get("Actual Rows", node.get("Plan Rows", 0)) * (node.get("Actual Loops", 1) or 1)
+            on_disk = node.get("Sort Space Type") == "Disk"
+            if rows < SORT_MIN_ROWS and not on_disk:
+                continue
+            scan = _scan_below(node)
+            sort_columns = _sort_columns(node.get("Sort Key", []))
+            index = None
+            if scan and sort_columns:
+                table = parents.get(scan["Relation Name"], scan["Relation Name"])
+                equality, _ = filter_columns(scan.get("Filter") or scan.get("Index Cond"))
+                index = (table, equality + [c for c in sort_columns if c not in equality])
+            findings.append({
+                "kind": "sort", "rows": int(rows), "sort_key": node.get("Sort Key"),
+                "method": node.get("Sort Method"), "on_disk": on_disk, "index": index,
+            })
+    return findings
+
+
+# ============================================================
+# Catalogue of the DB
+# ============================================================
+
+def partition_parents(db: Session) -> Dict[str, str]:
+    """パーティション名 -> 親テーブル名。"""
+    return dict(db.execute(text("""
+        SELECT c.relname, p.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relkind = 'p'
+    """)).all())
+
+
+def existing_indexes(db: Session) -> Dict[str, List[List[str]]]:
+    """テーブル名 -> 各インデックスの列名リスト (式インデックスの式部分は含まない)。"""
+    rows = db.execute(text("""
+        SELECT t.relname, i.relname, array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index x
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace AND n.nspname = current_schema()
+        CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        GROUP BY 1, 2
+    """)).all()
+    indexes: Dict[str, List[List[str]]] = {}
+    for table, _, columns in rows:
+        indexes.setdefault(table, []).append(list(columns))
+    return indexes
+
+
+def is_covered(columns: List[str], indexes: List[List[str]]) -> bool:
+    return any(existing[:len(columns)] == columns for existing in indexes)
+
+
+def index_ddl(table: str, columns: List[str]) -> str:
+    return f"CREATE INDEX CONCURRENTLY ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+
+
+# ============================================================
+# Run
+# ============================================================
+
+def run(only: Optional[List[str]] = None, analyze: bool = True) -> Dict:
+    db = SessionLocal()
+    try:
+        params = _sample_params(db)
+        parents = partition_parents(db)
+        indexes = existing_indexes(db)
+        partitioned = set(parents.values())
+        report = {"params": params, "queries": [], "proposals": []}
+        proposals: Dict[Tuple[str, Tuple[str, ...]], List[str]] = {}
+
+        for name, (description, fn) in CATALOGUE.items():
+            if only and name not in only:
+                continue
+            for statement, parameters in capture_statements(db, fn, params):
+                plan = explain(db, statement, parameters, analyze=analyze)
+                top = plan["Plan"]
+                findings = analyze_plan(plan, parents, analyze=analyze)
+                for finding in findings:
+                    if finding["index"] and not is_covered(finding["index"][1], indexes.get(finding["index"][0], [])):
+                        key = (finding["index"][0], tuple(finding["index"][1]))
+                        proposals.setdefault(key, []).append(name)
+                report["queries"].append({
+                    "name": name,
+                    "description": description,
+                    "sql": statement_shape(statement),
+                    "execution_ms": plan.get("Execution Time"),
+                    "shared_hit": top.get("Shared Hit Blocks"),
+                    "shared_read": top.get("Shared Read Blocks"),
+                    "findings": findings,
+                    "plan": plan,
+                })
+
+        for (table, columns), used_by in proposals.items():
+            report["proposals"].append({
+                "table": table,
+                "columns": list(columns),
+                "ddl": index_ddl(table, list(columns)),
+                "partitioned": table in partitioned,
+                "queries": sorted(set(used_by)),
+            })
+        return report
+    finally:
+        db.rollback()
+        db.close()
+
+
+def print_report(report: Dict, verbose: bool = False) -> None:
+    for query in report["queries"]:
+        timing = f"{query['execution_ms']:.2f} ms" if query["execution_ms"] is not None else "-"
+        buffers = f"hit={query['shared_hit']} read={query['shared_read']}" if query["shared_hit"] is not None else ""
+        status = "OK" if not query["findings"] else f"{len(query['findings'])} finding(s)"
+        print(f"{query['name']:<24} {timing:>12} {buffers:<24} {status}")
+        if verbose:
+            print(f"    {query['sql'][:200]}")
+        for finding in query["findings"]:
+            if finding["kind"] == "seq_scan":
+                print(f"    Seq Scan on {finding['table']} ({finding['rows']} rows)  filter: {finding['filter']}")
+            else:
+                disk = " on disk" if finding["on_disk"] else ""
+                print(f"    Sort{disk} ({finding['rows']} rows, {finding['method']})  key: {finding['sort_key']}")
+
+    print("\nProposed indexes:" if report["proposals"] else "\nNo index proposals.")
+    for proposal in report["proposals"]:
+        note = "  -- partitioned: build per partition and ATTACH (see alembic 000008_indexes)" if proposal["partitioned"] else ""
+        print(f"  {proposal['ddl']};{note}")
+        print(f"      for: {', '.join(proposal['queries'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN the hot-path queries and propose indexes.")
+    parser.add_argument("--only", action="append", choices=sorted(CATALOGUE), help="Run only these queries")
+    parser.add_argument("--no-analyze", action="store_true", help="Plain EXPLAIN (planner estimates instead of actual rows)")
+    parser.add_argument("--verbose", action="store_true", help="Print the SQL of each query")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report (with plans) as JSON")
+    parser.add_argument("--list", action="store_true", help="List the catalogue")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (description, _) in CATALOGUE.items():
+            print(f"{name:<24} {description}")
+    else:
+        result = run(args.only, analyze=not args.no_analyze)
+        print_report(result, verbose=args.verbose)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2, default=str)
@@ -0,0 +1,207 @@
+# metrics.py
+"""
+Prometheus metrics for the web app, the worker and the OpenAI calls.
+
+Web processes expose /metrics (init_metrics). Under gunicorn, set
+PROMETHEUS_MULTIPROC_DIR to an empty, writable directory before the workers
+start (startup.sh does this). prometheus_client then keeps the values in
+per-process files, and /metrics aggregates every worker. gunicorn.conf.py
+removes the files of exited workers.
+
+The one-shot worker cannot be scraped. export_worker_metrics() writes its
+registry at the end of a run to WORKER_METRICS_TEXTFILE, for the
+node_exporter textfile collector, or pushes it to PROMETHEUS_PUSHGATEWAY_URL.
+
+/metrics is closed by default: it answers a request carrying
+`Authorization: Bearer <METRICS_AUTH_TOKEN>` or a logged-in admin session.
+METRICS_PUBLIC=1 opens it to anonymous scrapes (e.g. behind a private
+network). Only token or public scrapes skip the rate limit. If
+prometheus_client is not installed, all helpers are no-ops and /metrics
+answers 503.
+"""
+
+import hmac
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess
+except ImportError:  # optional
+    prometheus_client = None
+
+METRICS_ENABLED = prometheus_client is not None
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+METRICS_AUTH_TOKEN = os.environ.get("METRICS_AUTH_TOKEN")
+METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "0") == "1"
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+_OPENAI_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+if METRICS_ENABLED:
+    HTTP_REQUEST_DURATION = Histogram(
+        "http_request_duration_seconds", "Flask request latency",
+        ["endpoint", "method", "status"], buckets=_LATENCY_BUCKETS)
+    DB_QUERY_DURATION = Histogram(
+        "db_query_duration_seconds", "SQL statement execution time (count = number of queries)",
+        ["operation"], buckets=_DB_BUCKETS)
+    OPENAI_REQUEST_DURATION = Histogram(
+        "openai_request_duration_seconds", "OpenAI chat completion latency",
+        ["model", "outcome"], buckets=_OPENAI_BUCKETS)
+    OPENAI_TOKENS = Counter("openai_tokens", "OpenAI tokens used", ["model", "kind"])
+    OPENAI_COST = Counter("openai_cost_usd", "Estimated OpenAI cost (USD)", ["model"])
+    WORKER_POSTS_FETCHED = Counter("worker_posts_fetched", "Posts fetched by the worker", ["provider"])
+    WORKER_POSTS_SAVED = Counter("worker_posts_saved", "Posts saved by the worker", ["provider"])
+    WORKER_STAGE_DURATION = Histogram(
+        "worker_stage_duration_seconds", "Time spent per worker stage",
+        ["stage"], buckets=_OPENAI_BUCKETS)
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def instrument_engine(engine) -> None:
+    """engine の全 SQL 文の件数と実行時間を db_query_duration_seconds に記録する。"""
+    if not METRICS_ENABLED or getattr(engine, "_metrics_instrumented", False):
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if starts:
+            DB_QUERY_DURATION.labels(_operation(statement)).observe(time.perf_counter() - starts.pop())
+
+    engine._metrics_instrumented = True
+
+
+@contextmanager
+def observe_openai_call(model: str):
+    """
+    OpenAI 呼び出しの所要時間を記録する。ブロック内で record(usage, cost) を呼ぶとトークン数とコストも記録する。
+
+        with observe_openai_call(model) as record:
+            response = client.chat.completions.create(...)
+            record(response.usage.model_dump(), cost)
+    """
+    started = time.perf_counter()
+    outcome = "error"
+
+    def _record(usage: dict, cost_usd: float) -> None:
+        if not METRICS_ENABLED:
+            return
+        OPENAI_TOKENS.labels(model, "prompt").inc(usage.get("prompt_tokens", 0) or 0)
+        OPENAI_TOKENS.labels(model, "completion").inc(usage.get("completion_tokens", 0) or 0)
+        OPENAI_COST.labels(model).inc(cost_usd or 0)
+
+    try:
+        yield _record
+        outcome = "success"
+    finally:
+        if METRICS_ENABLED:
+            OPENAI_REQUEST_DURATION.labels(model, outcome).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """worker の処理段階 (fetch / analysis / save / weights) の所要時間を記録する。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if METRICS_ENABLED:
+            WORKER_STAGE_DURATION.labels(stage).observe(time.perf_counter() - started)
+
+
+def count_posts_fetched(provider: str, count: int) -> None:
+    if METRICS_ENABLED and count:
+        WORKER_POSTS_FETCHED.labels(provider).inc(count)
+
+
+def count_post_saved(provider: str) -> None:
+    if METRICS_ENABLED:
+        WORKER_POSTS_SAVED.labels(provider).inc()
+
+
+def export_worker_metrics() -> None:
+    """worker の実行終了時に呼ぶ。テキストファイルへの書き出しか Pushgateway への送信 (設定がなければ何もしない)。"""
+    if not METRICS_ENABLED:
+        return
+    textfile = os.environ.get("WORKER_METRICS_TEXTFILE")
+    pushgateway = os.environ.get("PROMETHEUS_PUSHGATEWAY_URL")
+    try:
+        if textfile:
+            prometheus_client.write_to_textfile(textfile, prometheus_client.REGISTRY)
+        if pushgateway:
+            prometheus_client.push_to_gateway(pushgateway, job="worker", registry=prometheus_client.REGISTRY)
+    except Exception as e:
+        print(f"Failed to export worker metrics: {e}")
+
+
+def _is_scrape() -> bool:
+    """トークン付き (または METRICS_PUBLIC) のスクレイプか。レート制限の除外にも使う。"""
+    if METRICS_PUBLIC:
+        return True
+    if not METRICS_AUTH_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_AUTH_TOKEN}")
+
+
+def _is_admin_session() -> bool:
+    from flask_login import current_user
+    if not getattr(current_user, "is_authenticated", False):
+        return False
+    # 管理者でなければ 403 (管理画面と同じ判定)
+    from app.admin_worker import require_admin_or_abort
+    require_admin_or_abort()
+    return True
+
+
+def _metrics_response():
+    from flask import Response
+    if not (_is_scrape() or _is_admin_session()):
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    if not METRICS_ENABLED:
+        return Response("prometheus_client is not installed\n", status=503, mimetype="text/plain")
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop("_metrics_started", None)
+    if started is not None and request.endpoint != "metrics":
+        HTTP_REQUEST_DURATION.labels(
+            request.endpoint or "unmatched", request.method, str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+def init_metrics(app, engine=None, limiter=None):
+    """リクエストのレイテンシ計測と /metrics を登録する (engine を渡すと SQL も計測)。"""
+    if METRICS_ENABLED:
+        app.before_request(_start_timer)
+        app.after_request(_observe_request)
+        if engine is not None:
+            instrument_engine(engine)
+    app.add_url_rule("/metrics", "metrics", _metrics_response)
+    if limiter is not None:
+        # トークン付きのスクレイプ (15秒間隔など) だけ既定のレート制限から外す。匿名のリクエストは制限する
+        limiter.request_filter(lambda: request.endpoint == "metrics" and _is_scrape())
@@ -1,10 +1,13 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, Float, UniqueConstraint
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy import create_engine, Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Table, Float, UniqueConstraint, Computed, Index, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, deferred
 from datetime import datetime, timezone
 from flask_login import UserMixin
 
+from db_pool import engine_options_from_env
+
 load_dotenv()
 
 DB_USER = os.environ.get("DB_USER")
@@ -19,7 +22,7 @@ if not all([DB_USER, DB_PASSWORD, DB_NAME]):
 
 DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options_from_env())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -67,21 +70,32 @@ class Prompt(Base):
     template_text = Column(Text, nullable=False)
     is_default = Column(Boolean, default=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # /api/get-prompts の ETag に使う (alembic 000005_prompt)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
 # --- テーブル: （連結テーブル）分析と投稿の多対多関連 ---
 # Baseを継承しないSQLAlchemy Coreスタイルのテーブル定義
+# collected_post_id の DB 側の外部キー制約は 000007_partitions で外した (パーティション表の主キーが (id, posted_at) のため)。
+# ForeignKey はリレーションシップの結合条件のために残している。孤立行は utils_partitions.check_consistency で確かめる
 analysis_posts_link = Table('analysis_posts_link', Base.metadata,
     Column('analysis_result_id', Integer, ForeignKey('analysis_results.id'), primary_key=True),
-    Column('collected_post_id', Integer, ForeignKey('collected_posts.id'), primary_key=True)
+    Column('collected_post_id', Integer, ForeignKey('collected_posts.id'), primary_key=True),
+    # 投稿 -> 分析結果の逆引き用 (主キーは analysis_result_id が先頭, alembic 000008_indexes)
+    Index('ix_analysis_posts_link_collected_post_id', 'collected_post_id', 'analysis_result_id'),
 )
 
 # --- テーブル: 収集したポスト ---
 class CollectedPost(Base):
-    """Workerが収集した生のポスト情報を保存するテーブル"""
+    """
+    Workerが収集した生のポスト情報を保存するテーブル。
+    DB 側は posted_at の月単位のレンジパーティション (alembic 000007_partitions, utils_partitions)。
+    主キー・一意制約は posted_at を含む (id, posted_at) 等になるが、ORM からは id だけで識別する。
+    """
     __tablename__ = "collected_posts"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     username = Column(String, ForeignKey('target_accounts.username'), index=True, nullable=False)
-    post_id = Column(String, unique=True, index=True, nullable=False)
+    # 表の一意制約は (post_id, posted_at)。post_id 単体の一意性は post_keys が持つ
+    post_id = Column(String, index=True, nullable=False)
     original_text = Column(Text, nullable=False)
     source_url = Column(String, nullable=False)
     posted_at = Column(DateTime, nullable=False)
@@ -91,6 +105,11 @@ class CollectedPost(Base):
     ai_summary = Column(Text, nullable=True) 
     # リンク先の要約を保存する新しい列
     link_summary = Column(Text, nullable=True) 
+    # 正規化本文 + 時間バケットのハッシュ (utils_parser.compute_content_fingerprint)
+    # 相対時刻から生成した post_id が変わっても、同じ投稿の再インポートを防ぐ
+    content_fingerprint = Column(String(64), nullable=True, index=True)
+    # 本文の文字バイグラム tsvector (DB 側の生成列, alembic 000002_search)。検索条件専用なので通常は読み込まない
+    search_vector = deferred(Column(TSVECTOR, Computed("post_search_tsvector(original_text)", persisted=True)))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     analyses = relationship(
@@ -106,6 +125,35 @@ class CollectedPost(Base):
         back_populates="posts"
     )
 
+    __table_args__ = (
+        UniqueConstraint('post_id', 'posted_at', name='collected_posts_post_id_key'),
+        UniqueConstraint('username', 'content_fingerprint', 'posted_at', name='_username_fingerprint_uc'),
+    )
+
+# フィードの並び順 (utils_feed.SORT_KEYS) ごとのキーセット用複合インデックス: (並び替えキー, id)
+Index('ix_collected_posts_posted_at_id', CollectedPost.posted_at, CollectedPost.id)
+Index('ix_collected_posts_like_count_id', func.coalesce(CollectedPost.like_count, 0), CollectedPost.id)
+Index('ix_collected_posts_retweet_count_id', func.coalesce(CollectedPost.retweet_count, 0), CollectedPost.id)
+# アカウントの最新投稿 (worker) / アカウント絞り込み + id 降順 (alembic 000008_indexes)
+Index('ix_collected_posts_username_id', CollectedPost.username, CollectedPost.id)
+
+
+class PostKey(Base):
+    """
+    collected_posts の全体で一意なキー (post_id / (username, content_fingerprint))。
+    パーティション表の一意制約は posted_at を含むので、重複防止はこの表で行う (alembic 000007_partitions)。
+    collected_posts のトリガーが INSERT / UPDATE / DELETE に合わせて保つ。重複する投稿の INSERT は黙って捨てられる。
+    archive_posts.py でアーカイブした投稿のキーは archived にして残す (再収集・再分析しない。alembic 000009_archive)。
+    """
+    __tablename__ = "post_keys"
+
+    post_id = Column(String, primary_key=True)
+    username = Column(String, nullable=False)
+    content_fingerprint = Column(String(64), nullable=True)
+    archived = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (UniqueConstraint('username', 'content_fingerprint', name='post_keys_username_fingerprint_uc'),)
+
 # --- テーブル: アプリケーション設定保存用 ---
 class Setting(Base):
     """アプリケーション全体の設定を保存するテーブル (キーと値のペア)"""
@@ -168,6 +216,9 @@ class AnalysisResult(Base):
         order_by="TickerSentiment.collected_post_id" # (★) groupby のためにソート順を追加
     )
 
+    # /history のキーセットページング用 (utils_history.query_history_page)
+    __table_args__ = (Index('ix_analysis_results_analyzed_at_id', 'analyzed_at', 'id'),)
+
 class StockTickerMap(Base):
     """S&P500などの銘柄と企業名、エイリアス（愛称）の変換表"""
     __tablename__ = "stock_ticker_map"
@@ -181,25 +232,65 @@ class StockTickerMap(Base):
 
 
 class TickerSentiment(Base):
-    """投稿内の各銘柄に対するセンチメント分析結果"""
+    """
+    投稿内の各銘柄に対するセンチメント分析結果。
+    DB 側は posted_at (投稿の posted_at の写し) の月単位のレンジパーティションで、投稿と同じ月に入る
+    (主キーは (id, posted_at)、(collected_post_id, posted_at) -> collected_posts (id, posted_at) の
+    DEFERRABLE INITIALLY DEFERRED な外部キー, alembic 000007_partitions)。
+    """
     __tablename__ = "ticker_sentiment"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     
     # どのバッチ分析に属しているか
     analysis_result_id = Column(Integer, ForeignKey('analysis_results.id'), nullable=False, index=True)
-    # どの投稿に対する分析か
+    # どの投稿に対する分析か (DB 側の外部キーは posted_at との複合)
     collected_post_id = Column(Integer, ForeignKey('collected_posts.id'), nullable=False, index=True)
     # どの銘柄か (ティッカーで統一)
     ticker = Column(String(10), ForeignKey('stock_ticker_map.ticker'), nullable=False, index=True)
     
     sentiment = Column(String(10), nullable=False) # "Positive", "Negative", "Neutral"
     reasoning = Column(Text, nullable=True) # AIによる判断根拠
+    # パーティションキー。対象投稿の posted_at と同じ値を入れる
+    posted_at = Column(DateTime, nullable=False)
     
     # (親) このセンチメント結果が属するバッチ分析
     analysis_result = relationship("AnalysisResult", back_populates="sentiments")
     collected_post = relationship("CollectedPost", back_populates="ticker_sentiments")
 
+    # /api/filter-posts の銘柄 / センチメントの EXISTS 用 (alembic 000008_indexes)
+    __table_args__ = (Index('ix_ticker_sentiment_ticker_sentiment_post', 'ticker', 'sentiment', 'collected_post_id'),)
+
+class TickerSentimentDaily(Base):
+    """
+    (投稿日, 銘柄) ごとのセンチメント件数 (/api/heatmap 用の集計表)。
+    ticker_sentiment のトリガーが差分を加算して維持する (alembic 000006_heatmap)。アプリからは読むだけ。
+    """
+    __tablename__ = "ticker_sentiment_daily"
+
+    day = Column(Date, primary_key=True)  # collected_posts.posted_at の UTC 日付
+    ticker = Column(String(10), primary_key=True)
+    positive = Column(Integer, nullable=False, default=0)
+    negative = Column(Integer, nullable=False, default=0)
+    neutral = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class TickerSentimentDailyArchived(Base):
+    """
+    ticker_sentiment_daily のうち、archive_posts.py で Parquet に移したセンチメントの件数 (alembic 000009_archive)。
+    ticker_sentiment_daily はこれを含んだ合計。作り直し (utils_heatmap.rebuild_heatmap_aggregates) で使う。
+    """
+    __tablename__ = "ticker_sentiment_daily_archived"
+
+    day = Column(Date, primary_key=True)
+    ticker = Column(String(10), primary_key=True)
+    positive = Column(Integer, nullable=False, default=0)
+    negative = Column(Integer, nullable=False, default=0)
+    neutral = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+
+
 class UserTickerWeight(Base):
     """
     監視対象アカウント (TargetAccount) と銘柄 (StockTickerMap) の
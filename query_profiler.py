@@ -0,0 +1,188 @@
+# query_profiler.py
+"""
+Per-request / per-stage SQL profiler with N+1 detection.
+
+SQLAlchemy engine events record every statement executed while a profile is
+active (profile_queries). A profile keeps the query count, the total DB time
+and the count per statement shape, meaning the SQL with literals, bind
+parameters and IN lists collapsed. A shape executed N_PLUS_ONE_THRESHOLD
+times or more in one profile is reported as a likely N+1, e.g. a lazy
+relationship loaded once per row.
+
+Web (init_query_profiler): each request is profiled when the app runs in
+debug mode or QUERY_PROFILER=1.
+- Debug mode adds an `X-Query-Profile` header plus `Server-Timing`, which
+  browser devtools show.
+- Outside debug mode, requests with N+1 suspects or at least
+  QUERY_PROFILER_LOG_MIN queries are logged to the "query_profiler" logger.
+
+Worker: worker.py wraps its DB stages in profile_queries(..., log=True).
+
+Tests / scripts:
+
+    with assert_query_budget(5):
+        client.post("/api/filter-posts", json={...})
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, g
+
+logger = logging.getLogger("query_profiler")
+
+QUERY_PROFILER_ENABLED = os.environ.get("QUERY_PROFILER", "0").lower() in ("1", "true", "yes")
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("QUERY_PROFILER_N_PLUS_ONE", "5"))
+# 本番でこの件数以上のクエリを発行したリクエストはログに出す
+LOG_MIN_QUERIES = int(os.environ.get("QUERY_PROFILER_LOG_MIN", "30"))
+
+_active_profiles: ContextVar[Tuple["QueryProfile", ...]] = ContextVar("query_profiles", default=())
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|\$\d+|\?|:\w+")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """リテラル・バインド変数・IN リストを ? に畳んだ SQL (同じ形のクエリを同一視するため)。"""
+    shape = _LITERAL_RE.sub("?", statement)
+    shape = _PARAM_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("(?)", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+class QueryProfile:
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.total_time = 0.0
+        self.shape_counts: Counter = Counter()
+        self.shape_times: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        shape = statement_shape(statement)
+        self.count += 1
+        self.total_time += elapsed
+        self.shape_counts[shape] += 1
+        self.shape_times[shape] += elapsed
+
+    def n_plus_one_suspects(self, threshold: int = None) -> List[Tuple[str, int]]:
+        """threshold 回以上繰り返された形の [(shape, 回数), ...] (多い順)。"""
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(shape, n) for shape, n in self.shape_counts.most_common() if n >= threshold]
+
+    def summary(self) -> Dict:
+        return {
+            "label": self.label,
+            "queries": self.count,
+            "db_time_ms": round(self.total_time * 1000, 2),
+            "distinct_statements": len(self.shape_counts),
+            "n_plus_one": [{"count": n, "db_time_ms": round(self.shape_times[shape] * 1000, 2), "statement": shape[:300]}
+                           for shape, n in self.n_plus_one_suspects()],
+        }
+
+    def header_value(self) -> str:
+        return (f"count={self.count}; time_ms={self.total_time * 1000:.1f}; "
+                f"distinct={len(self.shape_counts)}; n_plus_one={len(self.n_plus_one_suspects())}")
+
+    def log(self, force: bool = False) -> None:
+        suspects = self.n_plus_one_suspects()
+        if suspects or force or self.count >= LOG_MIN_QUERIES:
+            level = logging.WARNING if suspects else logging.INFO
+            logger.log(level, "%s: %d queries, %.1f ms DB%s", self.label, self.count, self.total_time * 1000,
+                       "".join(f"\n  N+1? x{n}: {shape[:300]}" for shape, n in suspects))
+
+
+@contextmanager
+def profile_queries(label: str = "", log: bool = False):
+    """ブロック内の SQL を記録する QueryProfile を返す (入れ子にすると外側にも記録される)。"""
+    profile = QueryProfile(label)
+    token = _active_profiles.set(_active_profiles.get() + (profile,))
+    try:
+        yield profile
+    finally:
+        _active_profiles.reset(token)
+        if log:
+            profile.log()
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, label: str = "", allow_n_plus_one: bool = False):
+    """テスト用: ブロック内のクエリ数が max_queries を超えるか、N+1 の疑いがあれば AssertionError。"""
+    with profile_queries(label) as profile:
+        yield profile
+    problems = []
+    if profile.count > max_queries:
+        problems.append(f"{profile.count} queries (budget {max_queries})")
+    if not allow_n_plus_one and profile.n_plus_one_suspects():
+        problems.append(f"N+1 suspects: {profile.n_plus_one_suspects()}")
+    if problems:
+        raise AssertionError(f"{label or 'query budget'}: " + "; ".join(problems))
+
+
+def instrument_engine(engine) -> None:
+    """engine に計測用のイベントを登録する (何度呼んでも1回だけ)。"""
+    if getattr(engine, "_query_profiler_instrumented", False):
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _active_profiles.get():
+            conn.info.setdefault("query_profiler_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profiles = _active_profiles.get()
+        starts = conn.info.get("query_profiler_start")
+        if not profiles or not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        for profile in profiles:
+            profile.record(statement, elapsed)
+
+    engine._query_profiler_instrumented = True
+
+
+def _start_request_profile():
+    from flask import request
+    # debug は app.run(debug=True) で後から有効になるので、リクエストごとに判定する
+    if not (current_app.debug or QUERY_PROFILER_ENABLED):
+        return
+    profile = QueryProfile(f"{request.method} {request.path}")
+    g._query_profile = profile
+    g._query_profile_token = _active_profiles.set(_active_profiles.get() + (profile,))
+
+
+def _finish_request_profile(response):
+    profile: Optional[QueryProfile] = g.get("_query_profile")
+    if profile is None:
+        return response
+    if current_app.debug:
+        response.headers["X-Query-Profile"] = profile.header_value()
+        response.headers.add("Server-Timing", f'db;dur={profile.total_time * 1000:.1f};desc="{profile.count} queries"')
+    profile.log()
+    return response
+
+
+def _reset_request_profile(exc=None):
+    # 例外で after_request が呼ばれなくても、スレッドに計測中の状態を残さない
+    g.pop("_query_profile", None)
+    token = g.pop("_query_profile_token", None)
+    if token is not None:
+        _active_profiles.reset(token)
+
+
+def init_query_profiler(app, engine) -> None:
+    """debug モードか QUERY_PROFILER=1 のとき、リクエストごとの SQL を記録する。"""
+    instrument_engine(engine)
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.teardown_request(_reset_request_profile)
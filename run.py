@@ -2,25 +2,28 @@ import os
 import json
 import requests
 from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, get_flashed_messages, current_app
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import joinedload, selectinload, subqueryload
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload, subqueryload
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from dateutil.parser import parse
-import io
 from dotenv import load_dotenv
 
 # --- モデル定義とDB接続を models から持ってくる ---
 from models import (
-    SessionLocal, CollectedPost, Setting, Prompt, AnalysisResult, User,
-    TickerSentiment, StockTickerMap, TargetAccount, UserTickerWeight
+    engine, CollectedPost, Setting, Prompt, AnalysisResult, User,
+    TargetAccount, UserTickerWeight
 )
-from datetime import datetime, timezone
 
-from utils_parser import parse_threads_data_from_lines
+from utils_feed import query_post_page, query_feed_version
+from utils_history import query_history_page, load_history_details
+from utils_heatmap import query_heatmap
+from utils_suggest import suggest as suggest_candidates, warm_suggest_index
+from utils_import import start_threads_import, start_jsonl_import, get_import_status
 from utils_db import (
-    get_current_provider, get_or_create_credit_setting, get_current_prompt,
+    get_current_provider, get_or_create_credit_setting,
+    get_current_prompt_record, get_credit_balance, get_available_accounts, get_sector_tree,
+    start_reference_cache_listener, invalidate_reference_cache, get_user_record, user_cache_key,
     run_batch_analysis, AVAILABLE_MODELS, client_openai, DEFAULT_PROMPT_KEY
 )
 
@@ -29,6 +32,10 @@ from flask_wtf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from app.security import init_security
+from app.db_session import get_db, init_db_session
+from metrics import init_metrics
+from query_profiler import init_query_profiler
+from app.http_cache import init_http_cache, json_with_etag, make_etag, etag_matches, not_modified
 
 # Admin blueprint import (admin_worker is implemented to avoid app-context work at import time)
 from app.admin_worker import admin_bp as admin_worker_bp
@@ -67,6 +74,15 @@ login_manager.login_view = 'login'
 login_manager.login_message = "このページにアクセスするにはログインが必要です。"
 login_manager.login_message_category = "info"
 
+# リクエスト単位の DB セッション (get_db) をリクエスト終了時に閉じる
+init_db_session(app)
+# JSON API のレスポンス圧縮 (ETag / 304 は各ビューで json_with_etag を使う)
+init_http_cache(app)
+# リクエストのレイテンシ・SQL の件数と時間を計測し、/metrics で公開する
+init_metrics(app, engine=engine, limiter=limiter)
+# debug モード / QUERY_PROFILER=1 でリクエストごとの SQL 件数と N+1 の疑いを記録する
+init_query_profiler(app, engine)
+
 # register admin blueprint
 app.register_blueprint(admin_worker_bp)
 
@@ -90,14 +106,18 @@ app.secret_key = os.environ.get('FLASK_SECRET_KEY')
 if not app.secret_key:
     raise ValueError("FLASK_SECRET_KEY が .env ファイルに設定されていません。")
 
+# 参照データキャッシュの他プロセス向け無効化通知を受け取る (REFERENCE_CACHE_NOTIFY=1 のときのみ)
+start_reference_cache_listener()
+warm_suggest_index()
+
 # ユーザーローダー関数: ユーザーIDを元にユーザーオブジェクトを返す
 @login_manager.user_loader
 def load_user(user_id):
-    db = SessionLocal()
+    # 毎リクエストの users 参照を避けるため、キャッシュした UserRecord を返す
     try:
-        return db.query(User).get(int(user_id))
-    finally:
-        db.close()
+        return get_user_record(get_db(), int(user_id))
+    except ValueError:
+        return None
 
 def set_password(password):
     """ パスワードを受け取り、ハッシュ値を生成して返す """
@@ -112,183 +132,130 @@ def check_password(hashed_password, password):
 @app.route('/')
 @login_required
 def index():
-    db = SessionLocal()
-    try:
-        posts = db.query(CollectedPost).order_by(CollectedPost.id.desc()).limit(50).all()
-        current_provider = get_current_provider(db)
-        credit_setting = get_or_create_credit_setting(db)
-        current_credit = float(credit_setting.value)
-
-        account_names_tuples = db.query(CollectedPost.username).distinct().order_by(CollectedPost.username).all()
-        available_accounts = [name[0] for name in account_names_tuples]
-
-        results = db.query(StockTickerMap.gics_sector, StockTickerMap.gics_sub_industry).distinct().all()
-
-        sector_tree = {}
-        for sector, sub_sector in results:
-            if sector is None or sub_sector is None:
-                continue
-            if sector not in sector_tree:
-                sector_tree[sector] = set()
-            sector_tree[sector].add(sub_sector)
-
-        available_sector_tree = []
-        for sector_name in sorted(sector_tree.keys()):
-            available_sector_tree.append({
-                "name": sector_name,
-                "sub_sectors": sorted(list(sector_tree[sector_name]))
-            })
-
-        return render_template(
-            "index.html",
-            posts=posts,
-            current_provider=current_provider,
-            current_credit=current_credit,
-            available_models=AVAILABLE_MODELS,
-            available_accounts=available_accounts,
-            available_sector_tree=available_sector_tree
-        )
-    finally:
-        db.close()
+    db = get_db()
+    posts = db.query(CollectedPost).options(
+        selectinload(CollectedPost.ticker_sentiments)
+    ).order_by(CollectedPost.id.desc()).limit(50).all()
+    # 設定・アカウント一覧・セクターはプロセス内キャッシュ (utils_db) から
+    current_provider = get_current_provider(db)
+    current_credit = get_credit_balance(db)
+    available_accounts = get_available_accounts(db)
+    available_sector_tree = get_sector_tree(db)
+
+    return render_template(
+        "index.html",
+        posts=posts,
+        current_provider=current_provider,
+        current_credit=current_credit,
+        available_models=AVAILABLE_MODELS,
+        available_accounts=available_accounts,
+        available_sector_tree=available_sector_tree
+    )
 
 @app.route('/manage', methods=['GET', 'POST'])
 @login_required
 def manage():
-    db = SessionLocal()
-    try:
-        if request.method == 'POST':
-            action = request.form.get('action')
-
-            if action == 'save_provider' :
-                provider = request.form.get('api_provider')
-                if provider in ['X', 'Threads']:
-                    setting = db.query(Setting).filter(Setting.key == 'api_provider').first()
-                    if setting:
-                        setting.value = provider
-                    else:
-                        new_setting = Setting(key='api_provider', value=provider)
-                        db.add(new_setting)
-                    db.commit()
-
-            elif action == 'save_prompt':
-                prompt_text = request.form.get('prompt_text')
-                if prompt_text:
-                    prompt = db.query(Prompt).filter(Prompt.name == DEFAULT_PROMPT_KEY).first()
-                    if prompt:
-                        prompt.template_text = prompt_text
-                        db.commit()
-
-            elif action == 'set_default_prompt':
-                selected_prompt_name = request.form.get('selected_prompt')
-                if selected_prompt_name:
-                    setting = db.query(Setting).filter(Setting.key == 'default_prompt_name').first()
-                    if setting:
-                        setting.value = selected_prompt_name
-                    else:
-                        new_setting = Setting(key='default_prompt_name', value=selected_prompt_name)
-                        db.add(new_setting)
+    db = get_db()
+    if request.method == 'POST':
+        action = request.form.get('action')
+
+        if action == 'save_provider' :
+            provider = request.form.get('api_provider')
+            if provider in ['X', 'Threads']:
+                setting = db.query(Setting).filter(Setting.key == 'api_provider').first()
+                if setting:
+                    setting.value = provider
+                else:
+                    new_setting = Setting(key='api_provider', value=provider)
+                    db.add(new_setting)
+                db.commit()
+
+        elif action == 'save_prompt':
+            prompt_text = request.form.get('prompt_text')
+            if prompt_text:
+                prompt = db.query(Prompt).filter(Prompt.name == DEFAULT_PROMPT_KEY).first()
+                if prompt:
+                    prompt.template_text = prompt_text
                     db.commit()
-                    flash(f"プロンプト '{selected_prompt_name}' をデフォルトに設定しました。", 'success')
 
-            elif action == 'save_credit':
-                new_credit_str = request.form.get('credit_amount')
-                try:
-                    new_credit = round(float(new_credit_str), 6)
-                    setting = get_or_create_credit_setting(db)
-                    setting.value = str(new_credit)
-                    db.commit()
-                except (ValueError, TypeError):
-                    print(f"Invalid credit amount: {new_credit_str}")
-
-            elif action == 'import_jsonl':
-                if 'jsonl_file' not in request.files:
-                    flash('ファイルがリクエストに含まれていません。', 'error')
-                    return redirect(url_for('manage'))
-
-                file = request.files['jsonl_file']
-
-                if file.filename == '':
-                    flash('ファイルが選択されていません。', 'error')
-                    return redirect(url_for('manage'))
-
-                if file and file.filename.endswith('.txt'):
-                    try:
-                        stream = io.StringIO(file.stream.read().decode("UTF-8"), newline=None)
-                        lines = [line.strip() for line in stream.readlines()]
-
-                        if not lines:
-                             flash('ファイルが空です。', 'error')
-                             return redirect(url_for('manage'))
-
-                        existing_ids_tuples = db.query(CollectedPost.post_id).all()
-                        existing_ids_set = {pid[0] for pid in existing_ids_tuples}
-                        print(f"DBに {len(existing_ids_set)} 件の既存IDを検出。")
-
-                        parsed_posts_data, new_count = parse_threads_data_from_lines(lines, existing_ids_set)
-
-                        added_to_db_count = 0
-                        skipped_in_db_count = 0
-
-                        if not parsed_posts_data:
-                            flash('解析できる新規投稿が見つかりませんでした。ファイル内容を確認してください。', 'warning')
-                            return redirect(url_for('manage'))
-
-                        for post_data in parsed_posts_data:
-                            try:
-                                posted_at_dt = parse(post_data['posted_at'])
-
-                                new_post = CollectedPost(
-                                    username=post_data['username'],
-                                    post_id=post_data['post_id'],
-                                    original_text=post_data['original_text'],
-                                    source_url=post_data.get('source_url', ''),
-                                    posted_at=posted_at_dt,
-                                    like_count=int(post_data.get('like_count', 0)),
-                                    retweet_count=int(post_data.get('retweet_count', 0)),
-                                    created_at=datetime.now(timezone.utc)
-                                )
-                                db.add(new_post)
-                                db.flush()
-                                added_to_db_count += 1
-
-                            except IntegrityError:
-                                db.rollback()
-                                print(f"DBスキップ (IntegrityError): {post_data.get('post_id')}")
-                                skipped_in_db_count += 1
-                            except Exception as e:
-                                db.rollback()
-                                print(f"DB挿入エラー: {e} (データ: {post_data})")
-                                skipped_in_db_count += 1
+        elif action == 'set_default_prompt':
+            selected_prompt_name = request.form.get('selected_prompt')
+            if selected_prompt_name:
+                setting = db.query(Setting).filter(Setting.key == 'default_prompt_name').first()
+                if setting:
+                    setting.value = selected_prompt_name
+                else:
+                    new_setting = Setting(key='default_prompt_name', value=selected_prompt_name)
+                    db.add(new_setting)
+                db.commit()
+                flash(f"プロンプト '{selected_prompt_name}' をデフォルトに設定しました。", 'success')
 
-                        db.commit()
+        elif action == 'save_credit':
+            new_credit_str = request.form.get('credit_amount')
+            try:
+                new_credit = round(float(new_credit_str), 6)
+                setting = get_or_create_credit_setting(db)
+                setting.value = str(new_credit)
+                db.commit()
+            except (ValueError, TypeError):
+                print(f"Invalid credit amount: {new_credit_str}")
 
-                        total_skipped = (new_count - added_to_db_count) + skipped_in_db_count
-                        flash(f'インポート完了: {added_to_db_count} 件の新規投稿を追加, {total_skipped} 件をスキップしました。', 'success')
+        elif action == 'import_jsonl':
+            if 'jsonl_file' not in request.files:
+                flash('ファイルがリクエストに含まれていません。', 'error')
+                return redirect(url_for('manage'))
 
-                    except Exception as e:
-                        db.rollback()
-                        print(f"ファイル処理中にエラーが発生しました: {e}")
-                        flash(f'ファイル処理エラー: {e}', 'error')
-                else:
-                    flash('無効なファイル形式です。.txt ファイルをアップロードしてください。', 'error')
+            file = request.files['jsonl_file']
 
-            return redirect(url_for('manage'))
+            if file.filename == '':
+                flash('ファイルが選択されていません。', 'error')
+                return redirect(url_for('manage'))
 
-        current_provider = get_current_provider(db)
-        current_prompt = get_current_prompt(db)
-        prompts = db.query(Prompt).order_by(Prompt.name).all()
-        current_credit = float(get_or_create_credit_setting(db).value)
-
-        return render_template(
-            "manage.html",
-            current_provider=current_provider,
-            default_prompt=current_prompt.template_text,
-            current_credit=current_credit,
-            prompts=prompts,
-            current_prompt_name=current_prompt.name
-        )
-    finally:
-        db.close()
+            if file and file.filename.endswith('.txt'):
+                try:
+                    # アップロードはディスクにスプールし、解析と挿入はバックグラウンドで実行
+                    job_id = start_threads_import(file)
+                    flash(f'インポートを開始しました (ジョブID: {job_id})。進捗はこのページに表示されます。', 'success')
+                    return redirect(url_for('manage', import_job=job_id))
+                except Exception as e:
+                    print(f"ファイル処理中にエラーが発生しました: {e}")
+                    flash(f'ファイル処理エラー: {e}', 'error')
+            elif file and file.filename.endswith('.jsonl'):
+                try:
+                    # 構造化 JSONL は COPY + マージのローダーでバックグラウンド取り込み
+                    job_id = start_jsonl_import(file)
+                    flash(f'JSONL インポートを開始しました (ジョブID: {job_id})。進捗はこのページに表示されます。', 'success')
+                    return redirect(url_for('manage', import_job=job_id))
+                except Exception as e:
+                    print(f"ファイル処理中にエラーが発生しました: {e}")
+                    flash(f'ファイル処理エラー: {e}', 'error')
+            else:
+                flash('無効なファイル形式です。.txt または .jsonl ファイルをアップロードしてください。', 'error')
+
+        return redirect(url_for('manage'))
+
+    current_provider = get_current_provider(db)
+    current_prompt = get_current_prompt_record(db)
+    prompts = db.query(Prompt).order_by(Prompt.name).all()
+    current_credit = get_credit_balance(db)
+
+    return render_template(
+        "manage.html",
+        current_provider=current_provider,
+        default_prompt=current_prompt.template_text,
+        current_credit=current_credit,
+        prompts=prompts,
+        current_prompt_name=current_prompt.name,
+        import_job_id=request.args.get('import_job')
+    )
+
+@app.route('/api/import-status/<job_id>', methods=['GET'])
+@login_required
+def import_status(job_id):
+    status = get_import_status(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "インポートジョブが見つかりません。"}), 404
+    return jsonify({"status": "success", "job": status})
 
 @app.route('/analyze/<int:post_id>', methods=['POST'])
 @login_required
@@ -296,13 +263,13 @@ def analyze_post(post_id):
     if not client_openai:
         return jsonify({"status": "error", "message": "OpenAI API Key not configured."}), 400
 
-    db = SessionLocal()
+    db = get_db()
     try:
         post = db.query(CollectedPost).filter(CollectedPost.id == post_id).first()
         if not post:
             return jsonify({"status": "error", "message": "Post not found."}), 404
 
-        current_prompt = get_current_prompt(db)
+        current_prompt = get_current_prompt_record(db)
         full_prompt = current_prompt.template_text.replace("{text}", post.original_text)
 
         response = client_openai.chat.completions.create(
@@ -331,8 +298,6 @@ def analyze_post(post_id):
     except Exception as e:
         db.rollback()
         return jsonify({"status": "error", "message": f"AI analysis failed: {str(e)}"}), 500
-    finally:
-        db.close()
 
 @app.route('/api/analyze-batch', methods=['POST'])
 @login_required
@@ -362,118 +327,46 @@ def analyze_batch():
 @app.route('/api/filter-posts', methods=['POST'])
 @login_required
 def filter_posts():
-    db = SessionLocal()
+    db = get_db()
     try:
-        data = request.get_json()
-        keyword = data.get('keyword')
-        accounts = data.get('accounts', [])
-        likes = data.get('likes')
-        rts = data.get('rts')
-
-        limit = int(data.get('limit', 50))
-        cursor = data.get('cursor')
-
-        ticker_list = data.get('ticker')
-        sentiment = data.get('sentiment')
-        sectors = data.get('sector')
-        sub_sectors = data.get('sub_sector')
-
-        query = db.query(CollectedPost)
-
-        if keyword:
-            query = query.filter(CollectedPost.original_text.ilike(f"%%{keyword}%%"))
-        if accounts:
-            query = query.filter(CollectedPost.username.in_(accounts))
-
-        if ticker_list or sentiment:
-            query = query.join(TickerSentiment, CollectedPost.id == TickerSentiment.collected_post_id)
-            if ticker_list:
-                query = query.filter(TickerSentiment.ticker.in_(ticker_list))
-            if sentiment:
-                query = query.filter(TickerSentiment.sentiment == sentiment)
-
-        if sectors or sub_sectors:
-            if not (ticker_list or sentiment):
-                 query = query.join(TickerSentiment, CollectedPost.id == TickerSentiment.collected_post_id)
-            query = query.join(StockTickerMap, TickerSentiment.ticker == StockTickerMap.ticker)
-            filters = []
-            if sectors:
-                filters.append(StockTickerMap.gics_sector.in_(sectors))
-            if sub_sectors:
-                filters.append(StockTickerMap.gics_sub_industry.in_(sub_sectors))
-            if filters:
-                from sqlalchemy import or_
-                query = query.filter(or_(*filters))
-
-        if likes is not None:
-            try:
-                likes_int = int(likes)
-                if likes_int > 0:
-                    query = query.filter(CollectedPost.like_count >= likes_int)
-            except ValueError:
-                pass
-        if rts is not None:
-            try:
-                rts_int = int(rts)
-                if rts_int > 0:
-                    query = query.filter(CollectedPost.retweet_count >= rts_int)
-            except ValueError:
-                pass
-
-        query = query.order_by(CollectedPost.id.desc())
-
-        if cursor:
-            try:
-                last_id = int(cursor)
-                query = query.filter(CollectedPost.id < last_id)
-            except ValueError:
-                pass
-
-        filtered_posts = query.limit(limit).all()
-
-        results_list = []
-        for post in filtered_posts:
-            ticker_list_for_post = []
-            for ts in getattr(post, "ticker_sentiments", []):
-                ticker_list_for_post.append({
-                    "ticker": ts.ticker,
-                    "sentiment": ts.sentiment
-                })
-
-            results_list.append({
-                "id": post.id,
-                "username": post.username,
-                "posted_at_iso": post.posted_at.isoformat() if post.posted_at else None,
-                "original_text": post.original_text,
-                "source_url": post.source_url,
-                "like_count": post.like_count,
-                "retweet_count": post.retweet_count,
-                "link_summary": post.link_summary,
-                "ticker_sentiments": ticker_list_for_post
-            })
-
-        next_cursor = None
-        if filtered_posts:
-            next_cursor = filtered_posts[-1].id
-
-        return jsonify({
+        data = request.get_json() or {}
+        # ページを読む前に、条件 (カーソル含む) と絞り込み結果のバージョン (件数・最大 id・最新のセンチメント id)
+        # で変更の有無を判定する。同じ条件の再読み込みなら 304 でページのクエリも本文も省く
+        etag = make_etag("posts", json.dumps(data, sort_keys=True, default=str), *query_feed_version(db, data))
+        if etag_matches(etag):
+            return not_modified(etag)
+
+        # 2クエリ: 投稿ページ (列射影 + EXISTS 絞り込み) と、そのページのセンチメント一括取得
+        results_list, next_cursor = query_post_page(db, data)
+        return json_with_etag({
             "status": "success",
             "count": len(results_list),
             "posts": results_list,
             "next_cursor": next_cursor
-        })
+        }, etag)
     except Exception as e:
         db.rollback()
         error_msg = f"絞り込み処理中にエラーが発生しました: {str(e)}"
         print(error_msg)
         return jsonify({"status": "error", "message": error_msg}), 500
-    finally:
-        db.close()
+
+@app.route('/api/heatmap', methods=['GET'])
+@login_required
+def heatmap():
+    db = get_db()
+    try:
+        # 集計表 (ticker_sentiment_daily) のみを読む。days は 1〜365 (既定 1 = 今日)
+        return json_with_etag({"status": "success", **query_heatmap(db, request.args.get('days'))})
+    except Exception as e:
+        db.rollback()
+        error_msg = f"ヒートマップの集計中にエラーが発生しました: {str(e)}"
+        print(error_msg)
+        return jsonify({"status": "error", "message": error_msg}), 500
 
 @app.route('/api/suggest', methods=['POST'])
 @login_required
 def suggest():
-    db = SessionLocal()
+    db = get_db()
     try:
         data = request.get_json()
         query = data.get('q', '').strip()
@@ -482,45 +375,26 @@ def suggest():
         if not query:
             return jsonify([])
 
-        results_list = []
-
-        if search_type == 'ticker':
-            query_filter = (
-                StockTickerMap.ticker.ilike(f"%%{query}%%") |
-                StockTickerMap.company_name.ilike(f"%%{query}%%")
-            )
-            results = db.query(StockTickerMap).filter(query_filter).limit(10).all()
-            for r in results:
-                results_list.append({
-                    "value": r.ticker,
-                    "label": f"{r.ticker} ({r.company_name})"
-                })
-
-        elif search_type == 'sector':
-            query_filter = StockTickerMap.gics_sector.ilike(f"%%{query}%%")
-            results = db.query(StockTickerMap.gics_sector).filter(query_filter).distinct().limit(10).all()
-            for r in results:
-                if r[0]:
-                    results_list.append({
-                        "value": r[0],
-                        "label": r[0]
-                    })
-
-        return jsonify(results_list)
+        # プロセス内の索引 (utils_suggest) で応答する。DB は索引の初回構築時のみ
+        return jsonify(suggest_candidates(db, query, search_type))
 
     except Exception as e:
         db.rollback()
         error_msg = f"サジェスト検索中にエラーが発生しました: {str(e)}"
         print(error_msg)
         return jsonify({"status": "error", "message": error_msg}), 500
-    finally:
-        db.close()
 
 @app.route('/api/get-prompts', methods=['GET'])
 @login_required
 def get_prompts():
-    db = SessionLocal()
+    db = get_db()
     try:
+        # 本文 (template_text) を読む前に、件数・最大 id・最大 updated_at で変更の有無を判定する
+        version = db.query(func.count(Prompt.id), func.max(Prompt.id), func.max(Prompt.updated_at)).one()
+        etag = make_etag("prompts", *version)
+        if etag_matches(etag):
+            return not_modified(etag)
+
         prompts = db.query(Prompt).order_by(Prompt.name).all()
         results_list = []
         for p in prompts:
@@ -532,26 +406,26 @@ def get_prompts():
             })
 
         if not results_list:
-            default_prompt = get_current_prompt(db)
+            default_prompt = get_current_prompt_record(db)
             results_list.append({
                 "id": default_prompt.id,
                 "name": default_prompt.name,
                 "template_text": default_prompt.template_text,
                 "is_default": default_prompt.is_default
             })
+            # 既定プロンプトをここで作成した場合は次回のバージョンが変わるので本文のハッシュにする
+            etag = None
 
-        return jsonify(results_list)
+        return json_with_etag(results_list, etag)
     except Exception as e:
         error_msg = f"プロンプトの読み込み中にエラーが発生しました: {str(e)}"
         print(error_msg)
         return jsonify({"status": "error", "message": error_msg}), 500
-    finally:
-        db.close()
 
 @app.route('/api/save-prompt', methods=['POST'])
 @login_required
 def save_prompt():
-    db = SessionLocal()
+    db = get_db()
     try:
         data = request.get_json()
         prompt_id = data.get('promptId')
@@ -615,13 +489,11 @@ def save_prompt():
         error_msg = f"プロンプト保存中にエラーが発生しました: {str(e)}"
         print(error_msg)
         return jsonify({"status": "error", "message": error_msg}), 500
-    finally:
-        db.close()
 
 @app.route('/api/delete-prompt', methods=['POST'])
 @login_required
 def delete_prompt():
-    db = SessionLocal()
+    db = get_db()
     try:
         data = request.get_json()
         prompt_id = data.get('promptId')
@@ -650,28 +522,36 @@ def delete_prompt():
         error_msg = f"プロンプト削除中にエラーが発生しました: {str(e)}"
         print(error_msg)
         return jsonify({"status": "error", "message": error_msg}), 500
-    finally:
-        db.close()
 
 @app.route('/history')
 @login_required
 def history():
-    db = SessionLocal()
+    db = get_db()
     try:
-        results = db.query(AnalysisResult).options(
-            joinedload(AnalysisResult.prompt),
-            joinedload(AnalysisResult.posts),
-            joinedload(AnalysisResult.sentiments).joinedload(TickerSentiment.collected_post)
-        ).order_by(AnalysisResult.analyzed_at.desc()).all()
+        # サマリー列のみをキーセットで1ページ分。投稿・根拠は展開時に /api/history/<id> から取得する
+        results, next_cursor = query_history_page(db, request.args.get('cursor'))
 
-        return render_template("history.html", results=results)
+        return render_template("history.html", results=results, next_cursor=next_cursor,
+                               is_first_page=not request.args.get('cursor'))
 
     except Exception as e:
         print(f"履歴ページの読み込みエラー: {e}")
         flash(f"履歴の読み込みに失敗しました: {e}", "error")
         return redirect(url_for('index'))
-    finally:
-        db.close()
+
+@app.route('/api/history/<int:result_id>', methods=['GET'])
+@login_required
+def history_details(result_id):
+    db = get_db()
+    try:
+        details = load_history_details(db, result_id)
+        if details is None:
+            return jsonify({"status": "error", "message": "分析結果が見つかりません。"}), 404
+        return jsonify({"status": "success", "result": details})
+    except Exception as e:
+        error_msg = f"履歴詳細の取得中にエラーが発生しました: {str(e)}"
+        print(error_msg)
+        return jsonify({"status": "error", "message": error_msg}), 500
 
 # --- Login / Logout routes ---
 @app.route('/login', methods=['GET', 'POST'], endpoint='login')
@@ -686,9 +566,8 @@ def login():
         password = request.form.get('password')
         remember = bool(request.form.get('remember'))
 
-        db = SessionLocal()
+        db = get_db()
         user = db.query(User).filter_by(username=username).first()
-        db.close()
 
         if user and check_password(user.password_hash, password):
             login_user(user, remember=remember)
@@ -705,6 +584,7 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    invalidate_reference_cache(user_cache_key(current_user.id), broadcast=True)
     logout_user()
     flash('ログアウトしました。', 'info')
     return redirect(url_for('login'))
@@ -712,7 +592,7 @@ def logout():
 @app.route('/accounts', methods=['GET', 'POST'])
 @login_required
 def accounts():
-    db = SessionLocal()
+    db = get_db()
     try:
         if request.method == 'POST':
             action = request.form.get('action')
@@ -769,8 +649,6 @@ def accounts():
         print(f"アカウント管理ページでエラー: {e}")
         flash(f"処理中にエラーが発生しました: {e}", "error")
         return redirect(url_for('index'))
-    finally:
-        db.close()
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5001)
\ No newline at end of file
@@ -8,7 +8,13 @@
 echo "--- Running Alembic Migrations ---"
 alembic upgrade head
 
-# 2. Gunicorn によるアプリケーションの起動
+# 2. Prometheus メトリクス (metrics.py) の gunicorn worker 間での集計用ディレクトリ
+#    前回起動時の値が残らないよう毎回空にする
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# 3. Gunicorn によるアプリケーションの起動
 echo "--- Starting Gunicorn ---"
 # Gunicorn をワーカー数 3 で起動。app.py の app 変数を参照。
 exec gunicorn --workers 3 app:app
\ No newline at end of file
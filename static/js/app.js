@@ -35,6 +35,9 @@ document.addEventListener('DOMContentLoaded', () => {
             runBtn: document.getElementById('filter-run-btn'),
             resetBtn: document.getElementById('filter-reset-btn'),
             sentimentSelect: document.getElementById('filter-sentiment'),
+            matchModeSelect: document.getElementById('filter-match-mode'),
+            sortSelect: document.getElementById('filter-sort'),
+            periodSelect: document.getElementById('filter-period'),
         },
         
         // アカウント (UI Controls)
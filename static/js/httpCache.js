@@ -0,0 +1,45 @@
+// --- ETag 付きの fetch (app/http_cache.py と対で使う) ---
+// 直近のレスポンス本文を ETag とともに保持し、次回は If-None-Match を送る。
+// 304 が返れば保持している本文で 200 のレスポンスを組み立てて返すので、呼び出し側は fetch と同じように扱える。
+// (POST はブラウザの HTTP キャッシュに載らないため、/api/filter-posts の再読み込みにはこれが必要)
+
+const MAX_ENTRIES = 50;
+const cache = new Map(); // key -> { etag, body, contentType }
+
+function cacheKey(url, options) {
+    return `${options.method || 'GET'} ${url} ${typeof options.body === 'string' ? options.body : ''}`;
+}
+
+/**
+ * fetch と同じ引数・戻り値。条件付きリクエストで同じ内容の再送を避ける。
+ * @param {string} url
+ * @param {object} [options]
+ * @returns {Promise<Response>}
+ */
+export async function fetchWithETag(url, options = {}) {
+    const key = cacheKey(url, options);
+    const cached = cache.get(key);
+    const headers = new Headers(options.headers || {});
+    if (cached) headers.set('If-None-Match', cached.etag);
+
+    const response = await fetch(url, { ...options, headers });
+
+    if (response.status === 304 && cached) {
+        // 最近使ったものを末尾へ (古いものから捨てる)
+        cache.delete(key);
+        cache.set(key, cached);
+        return new Response(cached.body, {
+            status: 200,
+            headers: { 'Content-Type': cached.contentType, 'ETag': cached.etag }
+        });
+    }
+
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        const body = await response.clone().text();
+        cache.delete(key);
+        cache.set(key, { etag, body, contentType: response.headers.get('Content-Type') || 'application/json' });
+        if (cache.size > MAX_ENTRIES) cache.delete(cache.keys().next().value);
+    }
+    return response;
+}
@@ -6,6 +6,8 @@
 // - Infinite scroll (keyset pagination) using /api/filter-posts (limit + cursor)
 // NOTE: Keep helper functions (escapeHtml, processPostTextDOM) here.
 
+import { fetchWithETag } from './httpCache.js';
+
 /////////////////////
 // Module-scope constants / state
 /////////////////////
@@ -121,6 +123,8 @@ function renderPostList(posts, container, st) {
             } catch (e) { console.warn('Invalid date format:', post.posted_at_iso); }
         }
         const linkIcon = post.link_summary ? '<span class="text-yellow-500">🔗</span>' : '';
+        // snippet_html はサーバー側でエスケープ済み (一致箇所のみ <mark>)
+        const snippetHtml = post.snippet_html ? `<div class="post-snippet mt-1 text-xs text-gray-400">${post.snippet_html}</div>` : '';
         let tickerTagsHtml = '';
         if (post.ticker_sentiments && post.ticker_sentiments.length > 0) {
             post.ticker_sentiments.forEach(ts => {
@@ -156,6 +160,7 @@ function renderPostList(posts, container, st) {
                      data-original-text="${escapeHtml(post.original_text || '')}">
                 </div>
             </div>
+            ${snippetHtml}
 
             <div class="mt-2 flex flex-wrap gap-2 items-center">
                 ${tickerTagsHtml}
@@ -179,6 +184,8 @@ function appendPostList(posts) {
     posts.forEach((post) => {
         const formattedDate = post.posted_at_iso ? (new Date(post.posted_at_iso)).toISOString().slice(0,16).replace('T',' ') : 'N/A';
         const linkIcon = post.link_summary ? '<span class="text-yellow-500">🔗</span>' : '';
+        // snippet_html はサーバー側でエスケープ済み (一致箇所のみ <mark>)
+        const snippetHtml = post.snippet_html ? `<div class="post-snippet mt-1 text-xs text-gray-400">${post.snippet_html}</div>` : '';
         let tickerTagsHtml = '';
         if (post.ticker_sentiments && post.ticker_sentiments.length > 0) {
             post.ticker_sentiments.forEach(ts => {
@@ -213,6 +220,7 @@ function appendPostList(posts) {
                      data-original-text="${escapeHtml(post.original_text || '')}">
                 </div>
             </div>
+            ${snippetHtml}
             <div class="mt-2 flex flex-wrap gap-2 items-center">
                 ${tickerTagsHtml}
             </div>
@@ -253,19 +261,22 @@ async function loadMorePosts() {
         const tickerTags = document.querySelectorAll('#ticker-tags-container .ticker-tag');
         const ticker_list = Array.from(tickerTags).map(tag => tag.dataset.value);
         const sentiment = elements.filter.sentimentSelect.value;
+        const match_mode = elements.filter.matchModeSelect?.value || 'substring';
+        const sort = elements.filter.sortSelect?.value || 'id';
+        const period_days = elements.filter.periodSelect?.value ? parseInt(elements.filter.periodSelect.value, 10) : null;
         const selectedSectors = Array.from(document.querySelectorAll('.sector-parent-cb:checked')).map(cb => cb.value);
         const selectedSubSectors = Array.from(document.querySelectorAll('.sector-child-cb:checked')).map(cb => cb.value);
         const selectedAccountCheckboxes = document.querySelectorAll('.account-filter-checkbox:checked');
         const accounts = Array.from(selectedAccountCheckboxes).map(cb => cb.value);
 
-        const response = await fetch('/api/filter-posts', {
+        const response = await fetchWithETag('/api/filter-posts', {
             method: 'POST',
             headers: { 
                 'Content-Type': 'application/json',
                 'X-CSRFToken': window.CSRF_TOKEN || ''
             },
             body: JSON.stringify({
-                keyword, accounts, likes, rts,
+                keyword, match_mode, sort, period_days, accounts, likes, rts,
                 ticker: ticker_list,
                 sector: selectedSectors,
                 sub_sector: selectedSubSectors,
@@ -425,6 +436,9 @@ export function initPostHandler(el, st) {
 
     // 5) select やチェックボックスの click/change で即座に debounced 発火（念のため再登録）
     elements.filter.sentimentSelect?.addEventListener('change', triggerFilterDebounced);
+    elements.filter.matchModeSelect?.addEventListener('change', triggerFilterDebounced);
+    elements.filter.sortSelect?.addEventListener('change', triggerFilterDebounced);
+    elements.filter.periodSelect?.addEventListener('change', triggerFilterDebounced);
     document.querySelectorAll('.account-filter-checkbox').forEach(cb => {
         // ensure not double-registered if already attached - you can check console log for duplicates
         cb.removeEventListener?.('change', triggerFilterDebounced); // safe no-op if not present
@@ -445,6 +459,9 @@ export function initPostHandler(el, st) {
         const tickerTags = document.querySelectorAll('#ticker-tags-container .ticker-tag');
         const ticker_list = Array.from(tickerTags).map(tag => tag.dataset.value);
         const sentiment = elements.filter.sentimentSelect.value;
+        const match_mode = elements.filter.matchModeSelect?.value || 'substring';
+        const sort = elements.filter.sortSelect?.value || 'id';
+        const period_days = elements.filter.periodSelect?.value ? parseInt(elements.filter.periodSelect.value, 10) : null;
         const selectedSectors = Array.from(document.querySelectorAll('.sector-parent-cb:checked')).map(cb => cb.value);
         const selectedSubSectors = Array.from(document.querySelectorAll('.sector-child-cb:checked')).map(cb => cb.value);
         const selectedAccountCheckboxes = document.querySelectorAll('.account-filter-checkbox:checked');
@@ -464,14 +481,14 @@ export function initPostHandler(el, st) {
         elements.post.listContainer.innerHTML = '<p class="text-gray-400 text-center p-4">データを検索しています...</p>';
 
         try {
-            const response = await fetch('/api/filter-posts', {
+            const response = await fetchWithETag('/api/filter-posts', {
                 method: 'POST',
                 headers: { 
                     'Content-Type': 'application/json',
                     'X-CSRFToken': window.CSRF_TOKEN || ''
                 },
                 body: JSON.stringify({
-                    keyword, accounts, likes, rts,
+                    keyword, match_mode, sort, period_days, accounts, likes, rts,
                     ticker: ticker_list,
                     sector: selectedSectors,
                     sub_sector: selectedSubSectors,
@@ -1,3 +1,5 @@
+import { fetchWithETag } from './httpCache.js';
+
 // --- メインの初期化関数 (app.js から呼ばれる) ---
 // (★) グローバルスコープで elements と state を保持 (コールバック関数で使うため)
 let elements;
@@ -41,7 +43,7 @@ export function initPromptHandler(el, st) {
  */
 async function loadPromptsIntoDropdown() {
     try {
-        const response = await fetch('/api/get-prompts');
+        const response = await fetchWithETag('/api/get-prompts');
         if (!response.ok) throw new Error('APIからプロンプトを取得できませんでした。');
         
         const prompts = await response.json();
@@ -0,0 +1,116 @@
+"""
+Fixtures for the DB-backed tests (query budgets).
+
+The DB-backed tests need a PostgreSQL database migrated to head (alembic
+upgrade head), configured through the usual DB_USER / DB_PASSWORD / DB_NAME /
+DB_HOST / DB_PORT settings (.env is read as in models.py). When the server
+cannot be reached, they are skipped. Without any DB settings, placeholders
+pointing at a closed local port are used so that models.py (and the modules
+that import it) can still be imported by the pure-Python tests.
+
+Each test gets a session bound to a connection whose outer transaction is
+rolled back afterwards, so the sample rows never persist (session.commit()
+inside the code under test only releases a savepoint).
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+TEST_ACCOUNT = "query_budget_test"
+TEST_TICKERS = (
+    ("QBTA", "Query Budget Alpha Inc.", "Information Technology", "Application Software"),
+    ("QBTB", "Query Budget Beta Corp.", "Financials", "Diversified Banks"),
+)
+TEST_POSTS = 12
+
+try:
+    import models  # noqa: F401
+except ValueError:
+    # DB の接続情報が無い環境 (models.py が ValueError を出す)。接続しない限り使われないダミーを入れる
+    for name, value in (("DB_USER", "test"), ("DB_PASSWORD", "test"), ("DB_NAME", "test")):
+        os.environ.setdefault(name, value)
+    os.environ["DB_HOST"], os.environ["DB_PORT"] = "127.0.0.1", "1"
+    import models  # noqa: F401
+
+
+@pytest.fixture(scope="session")
+def engine():
+    import models
+    from sqlalchemy.exc import OperationalError
+    # utils_search の接続時の設定 (fuzzy の閾値) を接続より先に登録しておく
+    import utils_search  # noqa: F401
+    from query_profiler import instrument_engine
+
+    try:
+        with models.engine.connect():
+            pass
+    except OperationalError as e:
+        pytest.skip(f"database is not reachable: {e}")
+    instrument_engine(models.engine)
+    return models.engine
+
+
+@pytest.fixture
+def db(engine):
+    from sqlalchemy.orm import Session
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def sample_data(db):
+    """1アカウント・数件の投稿・1回分の分析結果とセンチメント。作った id を返す。"""
+    from models import (
+        AnalysisResult, CollectedPost, Prompt, StockTickerMap, TargetAccount, TickerSentiment,
+    )
+
+    for ticker, company, sector, sub_sector in TEST_TICKERS:
+        db.merge(StockTickerMap(ticker=ticker, company_name=company, gics_sector=sector,
+                                gics_sub_industry=sub_sector))
+    account = TargetAccount(username=TEST_ACCOUNT, provider="X")
+    prompt = Prompt(name="query_budget_test_prompt", template_text="{posts_text}")
+    db.add_all([account, prompt])
+    db.flush()
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    posts = []
+    for i in range(TEST_POSTS):
+        posts.append(CollectedPost(
+            username=TEST_ACCOUNT,
+            post_id=f"query-budget-{i}",
+            original_text=f"決算 速報 {TEST_TICKERS[i % 2][0]} guidance raised number {i}",
+            source_url=f"https://example.com/{TEST_ACCOUNT}/{i}",
+            posted_at=now - timedelta(hours=i),
+            like_count=i * 3,
+            retweet_count=i,
+            content_fingerprint=f"query-budget-{i}",
+        ))
+    db.add_all(posts)
+    db.flush()
+
+    result = AnalysisResult(prompt_id=prompt.id, raw_json_response="{}", extracted_summary="budget",
+                            analyzed_at=now, ai_model="gpt-4o-mini", cost_usd=0.0001,
+                            input_tokens=100, output_tokens=20, posts=posts)
+    db.add(result)
+    db.flush()
+    db.add_all([
+        TickerSentiment(analysis_result_id=result.id, collected_post_id=post.id, posted_at=post.posted_at,
+                        ticker=TEST_TICKERS[i % 2][0], sentiment="Positive" if i % 3 else "Negative",
+                        reasoning="budget")
+        for i, post in enumerate(posts)
+    ])
+    db.flush()
+    return {"account": TEST_ACCOUNT, "result_id": result.id, "post_ids": [post.id for post in posts]}
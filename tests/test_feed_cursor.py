@@ -0,0 +1,73 @@
+"""
+utils_feed cursors: opaque url-safe tokens for the keyset / offset pagination
+of /api/filter-posts. Legacy numeric cursors (the last post id) are still
+accepted; malformed or tampered tokens fall back to the first page.
+"""
+
+import base64
+import json
+
+import pytest
+
+from utils_feed import DEFAULT_SORT, decode_cursor, encode_cursor, query_post_page
+
+
+def raw_token(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+@pytest.mark.parametrize("payload", [
+    {"s": "id", "i": 42},
+    {"s": "posted_at", "i": 7, "k": "2024-05-01T12:34:56"},
+    {"s": "like_count", "i": 3, "k": 1200},
+    {"o": 150},
+])
+def test_round_trip(payload):
+    token = encode_cursor(payload)
+    assert "=" not in token
+    assert all(ch.isalnum() or ch in "-_" for ch in token)
+    assert decode_cursor(token) == payload
+
+
+def test_legacy_numeric_cursor():
+    assert decode_cursor("123") == {"s": DEFAULT_SORT, "i": 123}
+    assert decode_cursor(123) == {"s": DEFAULT_SORT, "i": 123}
+
+
+@pytest.mark.parametrize("token", [None, ""])
+def test_missing_cursor_is_first_page(token):
+    assert decode_cursor(token) is None
+
+
+@pytest.mark.parametrize("token", [
+    "not a cursor!",
+    "%%%",
+    "x",
+    encode_cursor({"s": "id", "i": 1})[:-3] + "???",
+    raw_token(b"\xff\xfe garbage"),
+    raw_token(b'{"s": "id", "i": '),
+    ["list"],
+    {"s": "id"},
+    12.5,
+])
+def test_malformed_cursor_is_rejected(token):
+    assert decode_cursor(token) is None
+
+
+@pytest.mark.parametrize("payload", [[1, 2], "id", 42, None])
+def test_non_object_payload_is_rejected(payload):
+    assert decode_cursor(raw_token(json.dumps(payload).encode("utf-8"))) is None
+
+
+@pytest.mark.parametrize("cursor", [
+    {"s": "posted_at", "i": "x", "k": "2024-05-01T00:00:00"},
+    {"s": "posted_at", "i": 1, "k": "yesterday"},
+    {"s": "like_count", "i": 1},
+    {"s": "like_count", "i": 1, "k": None},
+    {"s": "id", "i": "DROP TABLE"},
+])
+def test_tampered_cursor_returns_first_page(db, sample_data, cursor):
+    data = {"accounts": [sample_data["account"]], "sort": cursor["s"], "limit": 5}
+    first_page, _ = query_post_page(db, data)
+    page, _ = query_post_page(db, dict(data, cursor=encode_cursor(cursor)))
+    assert [post["id"] for post in page] == [post["id"] for post in first_page]
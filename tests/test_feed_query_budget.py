@@ -0,0 +1,68 @@
+"""
+/api/filter-posts (utils_feed.query_post_page) issues two queries per page:
+the page of posts and the ticker sentiments of the page. Every match_mode
+and sort has to stay within that budget. The ETag version checked before the
+page (utils_feed.query_feed_version) is one more query.
+"""
+
+import pytest
+
+from query_profiler import assert_query_budget
+from datetime import datetime, timezone
+
+from models import CollectedPost
+from utils_feed import SORT_KEYS, query_feed_version, query_post_page
+from utils_search import MATCH_MODES
+
+PAGE_BUDGET = 2
+VERSION_BUDGET = 1
+
+
+@pytest.mark.parametrize("sort", sorted(SORT_KEYS))
+def test_sorted_page_budget(db, sample_data, sort):
+    data = {"accounts": [sample_data["account"]], "sort": sort, "limit": 5}
+    with assert_query_budget(PAGE_BUDGET, f"sort={sort}"):
+        posts, next_cursor = query_post_page(db, data)
+    assert len(posts) == 5
+    assert next_cursor
+
+    with assert_query_budget(PAGE_BUDGET, f"sort={sort} (next page)"):
+        query_post_page(db, dict(data, cursor=next_cursor))
+
+
+@pytest.mark.parametrize("match_mode", MATCH_MODES)
+def test_keyword_page_budget(db, sample_data, match_mode):
+    data = {"accounts": [sample_data["account"]], "keyword": "guidance raised", "match_mode": match_mode, "limit": 5}
+    with assert_query_budget(PAGE_BUDGET, f"match_mode={match_mode}"):
+        posts, next_cursor = query_post_page(db, data)
+    assert posts
+    assert all("snippet_html" in post for post in posts)
+
+    if next_cursor:
+        with assert_query_budget(PAGE_BUDGET, f"match_mode={match_mode} (next page)"):
+            query_post_page(db, dict(data, cursor=next_cursor))
+
+
+@pytest.mark.parametrize("match_mode", MATCH_MODES)
+def test_filtered_keyword_page_budget(db, sample_data, match_mode):
+    data = {
+        "accounts": [sample_data["account"]], "ticker": ["QBTA"], "sentiment": "Positive",
+        "sector": ["Information Technology"],
+        "keyword": "決算", "match_mode": match_mode, "limit": 5,
+    }
+    with assert_query_budget(PAGE_BUDGET, f"filters + match_mode={match_mode}"):
+        query_post_page(db, data)
+
+
+@pytest.mark.parametrize("match_mode", MATCH_MODES)
+def test_feed_version_budget_and_change(db, sample_data, match_mode):
+    data = {"accounts": [sample_data["account"]], "keyword": "guidance raised", "match_mode": match_mode}
+    with assert_query_budget(VERSION_BUDGET, f"version match_mode={match_mode}"):
+        version = query_feed_version(db, data)
+    assert query_feed_version(db, data) == version
+
+    db.add(CollectedPost(username=sample_data["account"], post_id="query-budget-new",
+                         original_text="決算 速報 QBTA guidance raised again", source_url="https://example.com/new",
+                         posted_at=datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0), content_fingerprint="query-budget-new"))
+    db.flush()
+    assert query_feed_version(db, data) != version
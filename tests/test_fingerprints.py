@@ -0,0 +1,65 @@
+"""
+utils_parser content fingerprints: SHA-256 of the normalized text plus the
+coarse time bucket. Duplicates are matched within ±1 bucket through
+candidate_fingerprints, so a post crossing a bucket boundary still matches.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from utils_parser import (
+    FINGERPRINT_BUCKET_HOURS, candidate_fingerprints, compute_content_fingerprint,
+    normalize_post_text, time_bucket,
+)
+
+BUCKET = timedelta(hours=FINGERPRINT_BUCKET_HOURS)
+# 時間バケットの境界 (バケット 10000 の先頭)
+BOUNDARY = datetime.fromtimestamp(10000 * FINGERPRINT_BUCKET_HOURS * 3600, tz=timezone.utc)
+TEXT = "決算速報 $AAPL guidance raised"
+
+
+def matches(existing_at, new_at, existing_text=TEXT, new_text=TEXT):
+    """既存投稿のフィンガープリントが新しい投稿の候補 (前後1バケット) に含まれるか。"""
+    return compute_content_fingerprint(existing_text, existing_at) in candidate_fingerprints(new_text, new_at)
+
+
+def test_time_bucket_boundary():
+    assert time_bucket(BOUNDARY, FINGERPRINT_BUCKET_HOURS) == 10000
+    assert time_bucket(BOUNDARY - timedelta(seconds=1), FINGERPRINT_BUCKET_HOURS) == 9999
+    # naive と ISO 文字列は UTC として扱う
+    assert time_bucket(BOUNDARY.replace(tzinfo=None), FINGERPRINT_BUCKET_HOURS) == 10000
+    assert time_bucket(BOUNDARY.isoformat().replace("+00:00", "Z"), FINGERPRINT_BUCKET_HOURS) == 10000
+    jst = timezone(timedelta(hours=9))
+    assert time_bucket(BOUNDARY.astimezone(jst), FINGERPRINT_BUCKET_HOURS) == 10000
+
+
+def test_fingerprint_is_stable_within_a_bucket():
+    assert compute_content_fingerprint(TEXT, BOUNDARY) == compute_content_fingerprint(TEXT, BOUNDARY + BUCKET - timedelta(seconds=1))
+    assert compute_content_fingerprint(TEXT, BOUNDARY) != compute_content_fingerprint(TEXT, BOUNDARY + BUCKET)
+
+
+def test_candidates_are_previous_same_and_next_bucket():
+    prev_fp, fp, next_fp = candidate_fingerprints(TEXT, BOUNDARY)
+    assert fp == compute_content_fingerprint(TEXT, BOUNDARY)
+    assert prev_fp == compute_content_fingerprint(TEXT, BOUNDARY - BUCKET)
+    assert next_fp == compute_content_fingerprint(TEXT, BOUNDARY + BUCKET)
+
+
+def test_posts_across_a_bucket_boundary_match():
+    before, after = BOUNDARY - timedelta(seconds=1), BOUNDARY + timedelta(seconds=1)
+    assert compute_content_fingerprint(TEXT, before) != compute_content_fingerprint(TEXT, after)
+    assert matches(before, after)
+    assert matches(after, before)
+
+
+def test_neighbouring_bucket_matches_two_buckets_away_does_not():
+    assert matches(BOUNDARY, BOUNDARY + BUCKET)
+    assert matches(BOUNDARY, BOUNDARY - BUCKET)
+    assert matches(BOUNDARY, BOUNDARY + 2 * BUCKET - timedelta(seconds=1))
+    assert not matches(BOUNDARY, BOUNDARY + 2 * BUCKET)
+    assert not matches(BOUNDARY, BOUNDARY - 2 * BUCKET)
+
+
+def test_normalization():
+    assert normalize_post_text("  Guidance\u200b  RAISED\n$ＡＡＰＬ ") == "guidance raised $aapl"
+    assert matches(BOUNDARY, BOUNDARY, "Guidance raised $AAPL", "guidance　raised  $ＡＡＰＬ")
+    assert not matches(BOUNDARY, BOUNDARY, "Guidance raised $AAPL", "Guidance lowered $AAPL")
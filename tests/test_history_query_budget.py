@@ -0,0 +1,31 @@
+"""
+/history (utils_history.query_history_page) is one query per page: the post
+and sentiment counts are scalar subqueries, not a query per result.
+/api/history/<id> (load_history_details) is the header, the linked posts and
+the sentiments, whatever the number of posts.
+"""
+
+from query_profiler import assert_query_budget
+from utils_history import load_history_details, query_history_page
+
+
+def test_history_page_budget(db, sample_data):
+    with assert_query_budget(1, "history page"):
+        results, next_cursor = query_history_page(db, limit=1)
+    assert len(results) == 1
+    assert next_cursor
+
+    with assert_query_budget(1, "history next page"):
+        query_history_page(db, next_cursor, limit=1)
+
+
+def test_history_details_budget(db, sample_data):
+    with assert_query_budget(3, "history details"):
+        details = load_history_details(db, sample_data["result_id"])
+    assert len(details["posts"]) == len(sample_data["post_ids"])
+    assert len(details["sentiments"]) == len(sample_data["post_ids"])
+
+
+def test_history_details_missing_budget(db):
+    with assert_query_budget(1, "history details (missing)"):
+        assert load_history_details(db, -1) is None
@@ -0,0 +1,71 @@
+"""
+utils_import Bloom pre-check: PostIdBloomFilter never reports a false
+negative, and find_new_post_ids(use_bloom=True) only sends the "maybe
+present" ids to the database anti-join (filter_new_post_ids).
+"""
+
+import utils_import
+from utils_import import PostIdBloomFilter, find_new_post_ids
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = PostIdBloomFilter(expected_items=1000)
+    ids = [f"post{i:06d}" for i in range(1000)]
+    for post_id in ids:
+        bloom.add(post_id)
+    assert all(post_id in bloom for post_id in ids)
+
+
+def test_bloom_false_positive_rate_is_near_the_target():
+    bloom = PostIdBloomFilter(expected_items=2000, false_positive_rate=0.01)
+    for i in range(2000):
+        bloom.add(f"present{i}")
+    false_positives = sum(f"absent{i}" in bloom for i in range(10000))
+    assert false_positives < 300  # 目標 1% (= 100 件) に対して十分な余裕
+
+
+def test_bloom_rejects_non_string_members():
+    bloom = PostIdBloomFilter(expected_items=10)
+    bloom.add("123")
+    assert "123" in bloom
+    assert 123 not in bloom
+    assert None not in bloom
+
+
+def test_find_new_post_ids_only_checks_maybe_present_ids(monkeypatch):
+    bloom = PostIdBloomFilter(expected_items=100)
+    for post_id in ("old1", "old2"):
+        bloom.add(post_id)
+    checked = []
+
+    def fake_filter(db, ids):
+        ids = set(ids)
+        checked.append(ids)
+        return ids - {"old1", "old2"}
+
+    monkeypatch.setattr(utils_import, "get_post_id_bloom", lambda db: bloom)
+    monkeypatch.setattr(utils_import, "filter_new_post_ids", fake_filter)
+
+    candidates = ["old1", "old2"] + [f"new{i}" for i in range(50)]
+    assert find_new_post_ids(None, candidates, use_bloom=True) == {f"new{i}" for i in range(50)}
+    assert len(checked) == 1
+    assert {"old1", "old2"} <= checked[0]
+    assert checked[0] == {pid for pid in candidates if pid in bloom}
+
+
+def _bloom_not_expected(db):
+    raise AssertionError("use_bloom=False must not build the Bloom filter")
+
+
+def test_find_new_post_ids_without_bloom_checks_every_id(monkeypatch):
+    checked = []
+
+    def fake_filter(db, ids):
+        checked.append(set(ids))
+        return set(ids) - {"old1"}
+
+    monkeypatch.setattr(utils_import, "get_post_id_bloom", _bloom_not_expected)
+    monkeypatch.setattr(utils_import, "filter_new_post_ids", fake_filter)
+
+    assert find_new_post_ids(None, ["old1", "new1", "new1"], use_bloom=False) == {"new1"}
+    assert checked == [{"old1", "new1"}]
@@ -0,0 +1,107 @@
+"""
+JSONL bulk loader (utils_import.load_jsonl_file): record validation and the
+de-duplication of the staging table before the merge.
+
+jsonl_record_to_row runs without a database. _drop_staged_duplicates is
+PostgreSQL SQL (window functions over the temporary staging table), so that
+part uses the `db` fixture and is skipped when the server is not reachable.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils_import import (
+    JsonlRecordError, _STAGING_COLUMNS, _STAGING_TABLE_DDL, _copy_rows, _drop_staged_duplicates,
+    jsonl_record_to_row,
+)
+from utils_parser import FINGERPRINT_BUCKET_HOURS, compute_content_fingerprint, time_bucket
+
+BUCKET = timedelta(hours=FINGERPRINT_BUCKET_HOURS)
+# 時間バケットの先頭 (バケット 10000)
+BUCKET_START = datetime.fromtimestamp(10000 * FINGERPRINT_BUCKET_HOURS * 3600, tz=timezone.utc)
+
+
+def record(post_id, text, posted_at, username="jsonl_user", **extra):
+    return dict({"id": post_id, "user": username, "text": text, "created_at": posted_at.isoformat()}, **extra)
+
+
+def as_dict(row):
+    return dict(zip(_STAGING_COLUMNS, row))
+
+
+def test_record_to_row_fields():
+    posted_at_jst = (BUCKET_START + timedelta(hours=1)).astimezone(timezone(timedelta(hours=9)))
+    row = as_dict(jsonl_record_to_row(record("1", "Guidance  RAISED", posted_at_jst, likes="3")))
+    assert row["username"] == "jsonl_user"
+    assert row["post_id"] == "1"
+    assert row["posted_at"] == "2024-10-04 01:00:00"  # UTC の naive に変換
+    assert row["like_count"] == 3
+    assert row["retweet_count"] == 0
+    assert row["bucket"] == 10000
+    assert row["content_fingerprint"] == compute_content_fingerprint("Guidance  RAISED", BUCKET_START)
+    assert [row["fp_prev"], row["fp_next"]] == [
+        compute_content_fingerprint("Guidance  RAISED", BUCKET_START, -1),
+        compute_content_fingerprint("Guidance  RAISED", BUCKET_START, 1),
+    ]
+
+
+def test_record_to_row_text_key_ignores_case_and_spacing():
+    first = as_dict(jsonl_record_to_row(record("1", "Guidance raised", BUCKET_START)))
+    second = as_dict(jsonl_record_to_row(record("2", " guidance　RAISED ", BUCKET_START + BUCKET)))
+    assert first["text_key"] == second["text_key"]
+    assert second["bucket"] == first["bucket"] + 1
+    # 隣のバケットの投稿は互いの fp_prev / fp_next と一致する
+    assert first["fp_next"] == second["content_fingerprint"]
+    assert second["fp_prev"] == first["content_fingerprint"]
+
+
+def test_record_to_row_uses_default_username_and_epoch_seconds():
+    row = as_dict(jsonl_record_to_row({"post_id": 5, "body": "x", "timestamp": BUCKET_START.timestamp()}, "fallback"))
+    assert row["username"] == "fallback"
+    assert row["post_id"] == "5"
+    assert row["bucket"] == time_bucket(BUCKET_START, FINGERPRINT_BUCKET_HOURS)
+
+
+@pytest.mark.parametrize("bad", [
+    [],
+    {"user": "u", "text": "x", "created_at": "2024-01-01"},
+    {"id": "1", "text": "x", "created_at": "2024-01-01"},
+    {"id": "1", "user": "u", "created_at": "2024-01-01"},
+    {"id": "1", "user": "u", "text": "x"},
+    {"id": "1", "user": "u", "text": "x", "created_at": "not a date"},
+    {"id": "1", "user": "u", "text": "x", "created_at": "2024-01-01", "likes": "many"},
+])
+def test_invalid_records_are_rejected(bad):
+    with pytest.raises(JsonlRecordError):
+        jsonl_record_to_row(bad)
+
+
+def test_drop_staged_duplicates(db):
+    rows = [
+        record("a1", "same post", BUCKET_START),
+        record("a1", "same id, other text", BUCKET_START),                    # post_id の重複
+        record("a2", "Same  Post", BUCKET_START + timedelta(hours=5)),          # 同じバケット・同じ本文
+        record("a3", "same post", BUCKET_START, username="other_user"),        # 別アカウントは残す
+        record("b1", "repost", BUCKET_START),
+        record("b2", "repost", BUCKET_START + BUCKET),                         # 前のバケットの b1 と重複
+        record("b3", "repost", BUCKET_START + 2 * BUCKET),                     # b1 から2バケット: 残す
+        record("b4", "repost", BUCKET_START + 3 * BUCKET),                     # b3 と重複
+        record("c1", "far apart", BUCKET_START),
+        record("c2", "far apart", BUCKET_START + 2 * BUCKET),                  # 間が空いているので残す
+    ]
+    cursor = db.connection().connection.cursor()
+    cursor.execute(_STAGING_TABLE_DDL)
+    _copy_rows(cursor, [jsonl_record_to_row(r) for r in rows])
+
+    _drop_staged_duplicates(cursor)
+
+    cursor.execute("SELECT username, post_id, original_text FROM collected_posts_staging ORDER BY seq")
+    assert cursor.fetchall() == [
+        ("jsonl_user", "a1", "same post"),
+        ("other_user", "a3", "same post"),
+        ("jsonl_user", "b1", "repost"),
+        ("jsonl_user", "b3", "repost"),
+        ("jsonl_user", "c1", "far apart"),
+        ("jsonl_user", "c2", "far apart"),
+    ]
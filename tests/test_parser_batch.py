@@ -0,0 +1,66 @@
+"""
+utils_parser.run_batch: parses several Threads exports in a process pool and
+writes one JSONL stream, de-duplicating posts across files against one shared
+ID space. Runs without a database (no --insert).
+"""
+
+import json
+
+from utils_parser import expand_input_paths, run_batch
+
+
+def write_export(path, username, posts):
+    lines = [username, "プロフィール", ""]
+    for day, body in posts:
+        lines += [day, body, ""]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_cross_file_duplicates_are_written_once(tmp_path):
+    exports = tmp_path / "exports"
+    (exports / "sub").mkdir(parents=True)
+    write_export(exports / "a.txt", "alice_01", [("2024/05/01", "shared body text"), ("2024/05/02", "only in a")])
+    write_export(exports / "sub" / "b.txt", "alice_01", [("2024/05/01", "shared body text"), ("2024/05/03", "only in b")])
+    write_export(exports / "c.txt", "alice_01", [("2024/05/04", "dup in c"), ("2024/05/04", "dup in c")])
+    output = tmp_path / "posts.jsonl"
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+
+    summary = run_batch([str(exports)], output_path=str(output), workers=2, spool_dir=str(spool_dir))
+
+    posts = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert sorted(p["original_text"] for p in posts) == ["dup in c", "only in a", "only in b", "shared body text"]
+    assert len({p["post_id"] for p in posts}) == len(posts)
+    assert summary["files"] == 3
+    assert summary["posts_written"] == 4
+    assert summary["cross_file_duplicates"] == 1
+    assert summary["in_file_duplicates"] == 1
+    assert sum(worker["files"] for worker in summary["per_worker"].values()) == 3
+    # ワーカーのスプールファイルは残らない
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_known_ids_are_skipped(tmp_path):
+    export = tmp_path / "a.txt"
+    write_export(export, "alice_01", [("2024/05/01", "first body text"), ("2024/05/02", "second body text")])
+    output = tmp_path / "posts.jsonl"
+
+    run_batch([str(export)], output_path=str(output), workers=1)
+    first_id = json.loads(output.read_text(encoding="utf-8").splitlines()[0])["post_id"]
+
+    seen = {first_id}
+    summary = run_batch([str(export)], output_path=str(output), workers=1, seen_ids=seen)
+    posts = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [p["original_text"] for p in posts] == ["second body text"]
+    assert summary["cross_file_duplicates"] == 1
+    assert len(seen) == 2
+
+
+def test_expand_input_paths(tmp_path):
+    (tmp_path / "d").mkdir()
+    for name in ("d/x.txt", "d/y.log", "z.txt"):
+        (tmp_path / name).write_text("", encoding="utf-8")
+    assert expand_input_paths([str(tmp_path / "d"), str(tmp_path / "*.txt"), str(tmp_path / "z.txt")]) == [
+        str(tmp_path / "d" / "x.txt"), str(tmp_path / "z.txt"),
+    ]
+    assert run_batch([str(tmp_path / "missing*.txt")])["files"] == 0
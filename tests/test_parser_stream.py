@@ -0,0 +1,114 @@
+"""
+utils_parser.parse_threads_data_from_lines: a generator over post blocks that
+reads its input lazily, skips post_ids known to the pluggable membership
+checker, and reports progress through ParseStats.
+"""
+
+import types
+
+from utils_parser import ParseStats, USERNAME_SCAN_LINES, parse_threads_data_from_lines
+
+USERNAME = "alice_01"
+
+
+def threads_lines(posts):
+    """Threads のプロフィールを貼り付けたときの行 (ユーザー名 → 日付 → 本文 ...)。"""
+    lines = [USERNAME, "プロフィール", ""]
+    for day, body in posts:
+        lines += [day, body, "1 / 2", ""]
+    return lines
+
+
+class CountingLines:
+    """読まれた行数を数えるイテレータ。"""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self.consumed = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._lines)
+        self.consumed += 1
+        return line
+
+
+class RecordingChecker:
+    """set 以外の membership checker (__contains__ と add だけを持つ)。"""
+
+    def __init__(self, known=()):
+        self.known = set(known)
+        self.added = []
+
+    def __contains__(self, post_id):
+        return post_id in self.known
+
+    def add(self, post_id):
+        self.known.add(post_id)
+        self.added.append(post_id)
+
+
+def test_returns_a_generator_that_reads_lazily():
+    posts = [(f"2024/05/{day:02d}", f"決算 メモ number {day}") for day in range(1, 29)]
+    lines = CountingLines(threads_lines(posts))
+
+    parsed = parse_threads_data_from_lines(lines)
+    assert isinstance(parsed, types.GeneratorType)
+    assert lines.consumed == 0
+
+    first = next(parsed)
+    assert first["username"] == USERNAME
+    assert first["original_text"] == "決算 メモ number 1"
+    # ユーザー名の判定に読む先頭と、次の投稿の区切りまでしか読んでいない
+    assert lines.consumed <= USERNAME_SCAN_LINES + 4
+    assert len(list(parsed)) == len(posts) - 1
+
+
+def test_yields_post_dicts():
+    post = next(parse_threads_data_from_lines(threads_lines([("2024/05/01", "Guidance raised $AAPL")])))
+    assert post["posted_at"] == "2024-04-30T15:00:00Z"  # JST の日付を UTC に
+    assert post["original_text"] == "Guidance raised $AAPL"
+    assert len(post["post_id"]) == 10
+    assert len(post["content_fingerprint"]) == 64
+    assert {"source_url", "like_count", "retweet_count"} <= post.keys()
+
+
+def test_duplicates_inside_the_input_are_skipped_and_counted():
+    stats = ParseStats()
+    lines = threads_lines([("2024/05/01", "same body text"), ("2024/05/01", "same body text"),
+                           ("2024/05/02", "other body text"), ("2024/05/03", "   ")])
+    posts = list(parse_threads_data_from_lines(lines, stats=stats))
+
+    assert [p["original_text"] for p in posts] == ["same body text", "other body text"]
+    assert stats.username == USERNAME
+    assert stats.posts_parsed == 2
+    assert stats.duplicates_skipped == 1
+    assert stats.empty_skipped == 1
+    assert stats.lines_parsed == len(lines)
+
+
+def test_pluggable_checker_skips_known_ids_and_records_new_ones():
+    lines = threads_lines([("2024/05/01", "first body text"), ("2024/05/02", "second body text")])
+    known_id = next(parse_threads_data_from_lines(lines))["post_id"]
+
+    checker = RecordingChecker(known=[known_id])
+    stats = ParseStats()
+    posts = list(parse_threads_data_from_lines(lines, seen_ids=checker, stats=stats))
+
+    assert [p["original_text"] for p in posts] == ["second body text"]
+    assert checker.added == [posts[0]["post_id"]]
+    assert stats.duplicates_skipped == 1
+
+
+def test_seen_ids_are_shared_across_calls():
+    seen = set()
+    lines = threads_lines([("2024/05/01", "first body text")])
+    assert len(list(parse_threads_data_from_lines(lines, seen_ids=seen))) == 1
+    assert list(parse_threads_data_from_lines(lines, seen_ids=seen)) == []
+
+
+def test_empty_input_and_missing_username_yield_nothing():
+    assert list(parse_threads_data_from_lines([])) == []
+    assert list(parse_threads_data_from_lines(["2024/05/01", "本文だけ"])) == []
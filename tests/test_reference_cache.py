@@ -0,0 +1,90 @@
+"""
+utils_db.TTLCache (the per-process reference data cache): expiry, invalidation,
+and that a value loaded while its key was invalidated is not kept.
+"""
+
+from utils_db import TTLCache
+
+
+class CountingLoader:
+    def __init__(self, *values, on_load=None):
+        self.values = list(values)
+        self.calls = 0
+        self.on_load = on_load
+
+    def __call__(self):
+        self.calls += 1
+        if self.on_load:
+            self.on_load()
+        return self.values[min(self.calls, len(self.values)) - 1]
+
+
+def test_value_is_cached_until_ttl():
+    cache = TTLCache(ttl=60)
+    loader = CountingLoader("a", "b")
+    assert cache.get_or_load("k", loader) == "a"
+    assert cache.get_or_load("k", loader) == "a"
+    assert loader.calls == 1
+
+
+def test_expired_value_is_reloaded():
+    cache = TTLCache(ttl=60)
+    loader = CountingLoader("a", "b")
+    assert cache.get_or_load("k", loader, ttl=0) == "a"
+    assert cache.get_or_load("k", loader, ttl=0) == "b"
+    assert loader.calls == 2
+
+
+def test_invalidate_key_only_drops_that_key():
+    cache = TTLCache(ttl=60)
+    first, second = CountingLoader("a1", "a2"), CountingLoader("b1", "b2")
+    cache.get_or_load("a", first)
+    cache.get_or_load("b", second)
+
+    cache.invalidate("a")
+    assert cache.get_or_load("a", first) == "a2"
+    assert cache.get_or_load("b", second) == "b1"
+
+
+def test_invalidate_all():
+    cache = TTLCache(ttl=60)
+    first, second = CountingLoader("a1", "a2"), CountingLoader("b1", "b2")
+    cache.get_or_load("a", first)
+    cache.get_or_load("b", second)
+
+    cache.invalidate()
+    assert cache.get_or_load("a", first) == "a2"
+    cache.invalidate("*")
+    assert cache.get_or_load("b", second) == "b2"
+
+
+def test_value_loaded_during_invalidation_is_not_stored():
+    # コミット (after_commit の invalidate) が読み込み中に起きた場合
+    cache = TTLCache(ttl=60)
+    loader = CountingLoader("stale", "fresh")
+    loader.on_load = lambda: cache.invalidate("k") if loader.calls == 1 else None
+
+    assert cache.get_or_load("k", loader) == "stale"
+    assert cache.get_or_load("k", loader) == "fresh"
+    assert cache.get_or_load("k", loader) == "fresh"
+    assert loader.calls == 2
+
+
+def test_value_loaded_during_invalidate_all_is_not_stored():
+    cache = TTLCache(ttl=60)
+    loader = CountingLoader("stale", "fresh")
+    loader.on_load = lambda: cache.invalidate() if loader.calls == 1 else None
+
+    assert cache.get_or_load("k", loader) == "stale"
+    assert cache.get_or_load("k", loader) == "fresh"
+    assert loader.calls == 2
+
+
+def test_invalidating_another_key_during_load_keeps_the_value():
+    cache = TTLCache(ttl=60)
+    loader = CountingLoader("a", "b")
+    loader.on_load = lambda: cache.invalidate("other")
+
+    cache.get_or_load("k", loader)
+    assert cache.get_or_load("k", loader) == "a"
+    assert loader.calls == 1
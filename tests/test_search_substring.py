@@ -0,0 +1,30 @@
+"""
+substring mode must find every ILIKE match, including matches past the
+positions the bigram tsvector can hold (16383) and keywords whose bigrams
+repeat more than 256 times in the post.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from models import CollectedPost
+from utils_feed import query_post_page
+
+
+@pytest.mark.parametrize("body, keyword", [
+    ("あ" * 20000 + "決算速報", "決算速報"),
+    ("abab " * 400 + "ababzz", "ababzz"),
+])
+def test_substring_finds_matches_in_long_posts(db, sample_data, body, keyword):
+    post = CollectedPost(
+        username=sample_data["account"], post_id=f"substring-{keyword}", original_text=body,
+        source_url="https://example.com/substring", posted_at=datetime.now(timezone.utc).replace(tzinfo=None),
+        content_fingerprint=f"substring-{keyword}",
+    )
+    db.add(post)
+    db.flush()
+
+    posts, _ = query_post_page(db, {"accounts": [sample_data["account"]], "keyword": keyword,
+                                    "match_mode": "substring"})
+    assert post.id in [row["id"] for row in posts]
@@ -0,0 +1,100 @@
+"""
+utils_suggest.SuggestIndex ranking: exact ticker > ticker prefix > company
+name prefix > company word prefix > fuzzy (trigram similarity). Built from
+plain (ticker, company_name, gics_sector) rows, no database.
+"""
+
+import pytest
+
+from utils_suggest import (
+    MAX_TRIE_DEPTH, RANK_EXACT_TICKER, RANK_FUZZY, RANK_NAME_PREFIX, RANK_TICKER_PREFIX, RANK_WORD_PREFIX,
+    SuggestIndex, normalize_query, trigrams,
+)
+
+ROWS = [
+    ("AAPL", "Apple Inc.", "Information Technology"),
+    ("AA", "Alcoa Corporation", "Materials"),
+    ("AAL", "American Airlines Group Inc.", "Industrials"),
+    ("APD", "Air Products and Chemicals, Inc.", "Materials"),
+    ("MSFT", "Microsoft Corporation", "Information Technology"),
+    ("BRK.B", "Berkshire Hathaway Inc.", "Financials"),
+    ("JPM", "JPMorgan Chase & Co.", "Financials"),
+    ("NVDA", "NVIDIA Corporation", "Information Technology"),
+    ("LONG", "Internationalization Holdings Incorporated", None),
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SuggestIndex(ROWS)
+
+
+def ranked(index, query, limit=10):
+    return [(rank, entry.ticker) for rank, entry in index.search(query, limit)]
+
+
+def test_normalize_and_trigrams():
+    assert normalize_query("  Berkshire Hathaway Inc. ") == "berkshire hathaway inc"
+    assert normalize_query("ＢＲＫ．Ｂ") == "brk b"
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_exact_ticker_comes_first_then_ticker_prefixes(index):
+    results = ranked(index, "aa")
+    assert results[0] == (RANK_EXACT_TICKER, "AA")
+    # 短いティッカー・アルファベット順
+    assert results[1:3] == [(RANK_TICKER_PREFIX, "AAL"), (RANK_TICKER_PREFIX, "AAPL")]
+
+
+def test_ticker_prefix_before_company_name_prefix(index):
+    results = ranked(index, "a")
+    ranks = [rank for rank, _ in results]
+    assert ranks == sorted(ranks)
+    assert (RANK_TICKER_PREFIX, "APD") in results
+    assert all(ticker.startswith("A") for _, ticker in results)
+
+
+def test_company_name_prefix(index):
+    assert ranked(index, "micro")[0] == (RANK_NAME_PREFIX, "MSFT")
+    assert ranked(index, "Berkshire Hath")[0] == (RANK_NAME_PREFIX, "BRK.B")
+
+
+def test_company_word_prefix(index):
+    assert ranked(index, "hathaway") == [(RANK_WORD_PREFIX, "BRK.B")]
+    assert (RANK_WORD_PREFIX, "JPM") in ranked(index, "chase")
+
+
+def test_punctuated_ticker(index):
+    assert ranked(index, "brk.b")[0] == (RANK_EXACT_TICKER, "BRK.B")
+    assert ranked(index, "BRK B")[0] == (RANK_EXACT_TICKER, "BRK.B")
+
+
+def test_fuzzy_match_for_typos(index):
+    results = ranked(index, "microsfot")
+    assert results and results[0] == (RANK_FUZZY, "MSFT")
+    # 短いクエリはあいまい検索しない
+    assert ranked(index, "xyz") == []
+
+
+def test_prefix_longer_than_trie_depth(index):
+    query = "internationalization hold"
+    assert len(query) > MAX_TRIE_DEPTH
+    assert ranked(index, query)[0] == (RANK_NAME_PREFIX, "LONG")
+    # 上限の深さまでは同じでも、その先が違えばプレフィックス一致ではない
+    assert (RANK_NAME_PREFIX, "LONG") not in ranked(index, "internationalisation")
+
+
+def test_limit_and_no_duplicates(index):
+    results = ranked(index, "a", limit=3)
+    assert len(results) == 3
+    tickers = [ticker for _, ticker in ranked(index, "a")]
+    assert len(tickers) == len(set(tickers))
+    assert ranked(index, "") == []
+    assert ranked(index, "...") == []
+
+
+def test_sector_search(index):
+    # 前方一致が先、部分一致が後
+    assert index.search_sectors("mat") == ["Materials", "Information Technology"]
+    assert index.search_sectors("tech") == ["Information Technology"]
+    assert index.search_sectors("") == []
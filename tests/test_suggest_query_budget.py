@@ -0,0 +1,29 @@
+"""
+/api/suggest (utils_suggest.suggest) answers from the in-process index: one
+query when the index is (re)built, none afterwards.
+"""
+
+import pytest
+
+from query_profiler import assert_query_budget
+from utils_db import invalidate_reference_cache
+from utils_suggest import suggest
+
+
+@pytest.mark.parametrize("search_type, query, expected", [
+    ("ticker", "qbt", "QBTA"),
+    ("ticker", "query budget beta", "QBTB"),
+    ("sector", "financ", "Financials"),
+])
+def test_suggest_budget(db, sample_data, search_type, query, expected):
+    invalidate_reference_cache("ticker_index")
+    try:
+        with assert_query_budget(1, f"suggest {search_type} (index build)"):
+            first = suggest(db, query, search_type)
+        with assert_query_budget(0, f"suggest {search_type} (cached)"):
+            second = suggest(db, query, search_type)
+    finally:
+        # サンプル行はロールバックされるので、それを含む索引を残さない
+        invalidate_reference_cache("ticker_index")
+    assert expected in [candidate["value"] for candidate in first]
+    assert first == second
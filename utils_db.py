@@ -1,18 +1,28 @@
 import os
 import json
+import select
+import threading
+import time
 import openai
-from models import SessionLocal, CollectedPost, Setting, Prompt, AnalysisResult
-from typing import Dict, List, Optional
+from dataclasses import dataclass
+from itertools import chain
+from models import SessionLocal, CollectedPost, Setting, Prompt, AnalysisResult, engine
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event, text
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from models import (
     SessionLocal, CollectedPost, Setting, Prompt, AnalysisResult, 
-    TargetAccount, StockTickerMap, TickerSentiment, UserTickerWeight
+    TargetAccount, StockTickerMap, TickerSentiment, UserTickerWeight, User
 )
+from flask_login import UserMixin
+from metrics import observe_openai_call
 
 # --- 設定値と初期化 ---
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-client_openai = openai.OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+# OpenAI 互換の別エンドポイント (負荷試験用のスタブ benchmarks/stub_openai.py など)。未設定なら本物の API
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+client_openai = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL) if OPENAI_API_KEY else None
 DEFAULT_PROMPT_KEY = "default_summary"
 
 # 選択可能なOpenAIモデル
@@ -39,9 +49,11 @@ def calculate_cost(model_name: str, usage: dict) -> float:
     
     return round(total_cost, 8)
 
+CREDIT_SETTING_KEY = 'openai_total_credit'
+
 def update_credit_balance(db: Session, cost_usd: float) -> float:
     """残高から消費コストを差し引き、DBを更新する (コミットは呼び出し元)"""
-    setting = db.query(Setting).filter(Setting.key == 'openai_total_credit').first()
+    setting = db.query(Setting).filter(Setting.key == CREDIT_SETTING_KEY).first()
     if not setting:
         return 0.0
 
@@ -56,7 +68,7 @@ def update_credit_balance(db: Session, cost_usd: float) -> float:
 
 def get_or_create_credit_setting(db: Session, initial_value='20.000000') -> Setting:
     """DBからOpenAIクレジット設定を取得。なければ初期値で作成し、そのSettingオブジェクトを返す。"""
-    key = 'openai_total_credit'
+    key = CREDIT_SETTING_KEY
     setting = db.query(Setting).filter(Setting.key == key).first()
     
     if not setting:
@@ -66,11 +78,333 @@ def get_or_create_credit_setting(db: Session, initial_value='20.000000') -> Sett
         return new_setting
     return setting
 
+# --- 参照データのキャッシュ (設定・現在のプロンプト・セクター・アカウント一覧) ---
+# ほとんど変わらないのに毎リクエスト問い合わせていた値をプロセス内に TTL 付きで保持する。
+# クレジット残高 (CREDIT_SETTING_KEY) は頻繁に変わるので対象外。
+# ORM 経由の書き込みはセッションイベントでコミット時に自動で無効化される。
+# REFERENCE_CACHE_NOTIFY=1 なら Postgres の NOTIFY で他プロセス (gunicorn worker) にも伝える。
+REFERENCE_CACHE_TTL = float(os.environ.get("REFERENCE_CACHE_TTL_SECONDS", "300"))
+REFERENCE_CACHE_NOTIFY = os.environ.get("REFERENCE_CACHE_NOTIFY", "0").lower() in ("1", "true", "yes")
+REFERENCE_CACHE_CHANNEL = "reference_cache"
+# ログインユーザー (user_loader) のキャッシュ期間
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL_SECONDS", "300"))
+_INVALIDATE_ALL = "*"
+
+
+class TTLCache:
+    """
+    スレッドセーフな単純な TTL キャッシュ。値は呼び出し側で変更しないこと。
+    キーごとの世代番号を invalidate() で進め、読み込み中に無効化されたキーの値は保存しない
+    (無効化前に読んだ古い値が TTL の間残らないように)。
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0  # 全件無効化の回数
+        self._lock = threading.Lock()
+
+    def _generation(self, key: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(key, 0)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+            generation = self._generation(key)
+        # ローダーはロックの外で実行する (同時に2回読まれても結果は同じ)
+        value = loader()
+        with self._lock:
+            if self._generation(key) == generation:
+                self._entries[key] = (now + (self.ttl if ttl is None else ttl), value)
+        return value
+
+    def invalidate(self, *keys: str) -> None:
+        with self._lock:
+            if not keys or _INVALIDATE_ALL in keys:
+                self._entries.clear()
+                self._generations.clear()
+                self._epoch += 1
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+                    self._generations[key] = self._generations.get(key, 0) + 1
+
+
+_reference_cache = TTLCache(REFERENCE_CACHE_TTL)
+
+
+def get_cached(key: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+    """
+    参照データキャッシュから key の値を返す (無い / 期限切れなら loader() で読み込む)。
+    書き込みで無効化したいキーは _REFERENCE_MODEL_KEYS に登録すること。
+    """
+    return _reference_cache.get_or_load(key, loader, ttl=ttl)
+
+
+# モデル -> 書き込まれたときに無効化するキャッシュキー
+_REFERENCE_MODEL_KEYS = {
+    Setting: ("settings", "current_prompt"),
+    Prompt: ("current_prompt",),
+    StockTickerMap: ("sector_tree", "ticker_index", "ticker_sectors"),  # ticker_index: utils_suggest, ticker_sectors: utils_heatmap
+    TargetAccount: ("accounts",),
+}
+
+
+def _notify(connection, keys: Iterable[str]) -> None:
+    for key in keys:
+        connection.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": REFERENCE_CACHE_CHANNEL, "payload": key}
+        )
+
+
+def invalidate_reference_cache(*keys: str, broadcast: bool = False) -> None:
+    """
+    キャッシュを無効化する (keys 省略時は全件)。
+    broadcast=True なら NOTIFY で他プロセスにも伝える (セッション外の書き込み用)。
+    """
+    _reference_cache.invalidate(*keys)
+    if broadcast and REFERENCE_CACHE_NOTIFY:
+        with engine.begin() as conn:
+            _notify(conn, keys or (_INVALIDATE_ALL,))
+
+
+def mark_reference_data_changed(db: Session, *keys: str) -> None:
+    """
+    Core / 生 SQL で参照データを書き換えたときに呼ぶ。db のコミット時に無効化される。
+    NOTIFY は同じトランザクション内で送るので、ロールバックされれば届かない。
+    """
+    pending = db.info.setdefault("reference_cache_keys", set())
+    new_keys = set(keys) - pending
+    pending.update(new_keys)
+    if new_keys and REFERENCE_CACHE_NOTIFY:
+        _notify(db.connection(), sorted(new_keys))
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_reference_changes(session, flush_context):
+    keys = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Setting) and obj.key == CREDIT_SETTING_KEY:
+            continue  # 残高はキャッシュしていない (分析のたびに全 worker へ通知しない)
+        keys.update(_REFERENCE_MODEL_KEYS.get(type(obj), ()))
+        if isinstance(obj, User) and obj.id is not None:
+            keys.add(user_cache_key(obj.id))
+    if keys:
+        mark_reference_data_changed(session, *keys)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_after_commit(session):
+    keys = session.info.pop("reference_cache_keys", None)
+    if keys:
+        _reference_cache.invalidate(*keys)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("reference_cache_keys", None)
+
+
+_listener_pid: Optional[int] = None
+LISTEN_POLL_SECONDS = 5.0
+
+
+def _listen_for_invalidations() -> None:
+    """LISTEN reference_cache を受け続け、届いたキーを無効化する (接続が切れたら再接続)。"""
+    backoff = 1.0
+    while True:
+        pooled = None
+        try:
+            pooled = engine.raw_connection()
+            pooled.detach()  # プールの枠を占有しない専用接続にする
+            conn = pooled.dbapi_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {REFERENCE_CACHE_CHANNEL}")
+            # 接続していなかった間の通知は失われているかもしれないので全件無効化
+            _reference_cache.invalidate()
+            backoff = 1.0
+            while True:
+                if select.select([conn], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                keys = []
+                while conn.notifies:
+                    keys.append(conn.notifies.pop(0).payload)
+                if keys:
+                    _reference_cache.invalidate(*keys)
+        except Exception as e:
+            print(f"Reference cache listener error (reconnecting in {backoff:.0f}s): {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+        finally:
+            if pooled is not None:
+                try:
+                    pooled.close()
+                except Exception:
+                    pass
+
+
+def start_reference_cache_listener() -> bool:
+    """REFERENCE_CACHE_NOTIFY が有効なら、このプロセスで LISTEN スレッドを1本起動する。"""
+    global _listener_pid
+    if not REFERENCE_CACHE_NOTIFY or _listener_pid == os.getpid():
+        return False
+    _listener_pid = os.getpid()
+    threading.Thread(target=_listen_for_invalidations, name="reference-cache-listener", daemon=True).start()
+    return True
+
+
+@dataclass(frozen=True)
+class PromptRecord:
+    """キャッシュ用のプロンプト (セッションに紐づかない読み取り専用の値)"""
+    id: int
+    name: str
+    template_text: str
+    is_default: bool
+
+
+@dataclass(frozen=True)
+class UserRecord(UserMixin):
+    """
+    Flask-Login の current_user 用のユーザー (セッションに紐づかない読み取り専用の値)。
+    パスワードハッシュは持たない。ログイン判定は User モデルで行う。
+    """
+    id: int
+    username: str
+
+
+def user_cache_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def get_user_record(db: Session, user_id: int) -> Optional[UserRecord]:
+    """
+    user_loader 用。ユーザーごとに USER_CACHE_TTL 秒キャッシュする (存在しない ID は None)。
+    User の書き込み (パスワード変更・削除など) のコミット時と logout で無効化される。
+    """
+    def _load():
+        row = db.query(User.id, User.username).filter(User.id == user_id).first()
+        return UserRecord(row.id, row.username) if row else None
+    return _reference_cache.get_or_load(user_cache_key(user_id), _load, ttl=USER_CACHE_TTL)
+
+
+def _load_settings(db: Session) -> Dict[str, str]:
+    # クレジット残高は分析のたびに (worker プロセスからも) 更新されるのでキャッシュしない
+    return {
+        key: value for key, value in db.query(Setting.key, Setting.value).filter(Setting.key != CREDIT_SETTING_KEY).all()
+    }
+
+
+def get_setting_value(db: Session, key: str, default: Optional[str] = None) -> Optional[str]:
+    """設定値を返す (settings テーブル全体を1クエリでキャッシュ)。"""
+    return _reference_cache.get_or_load("settings", lambda: _load_settings(db)).get(key, default)
+
+
+def get_credit_balance(db: Session) -> float:
+    """
+    表示用のクレジット残高。設定が無ければ初期値で作成する。
+    別プロセスの分析でも減るので、キャッシュせず毎回 DB から読む (主キー1行)。
+    """
+    value = db.query(Setting.value).filter(Setting.key == CREDIT_SETTING_KEY).scalar()
+    if value is None:
+        value = get_or_create_credit_setting(db).value
+    return float(value)
+
+
+def get_current_prompt_record(db: Session) -> PromptRecord:
+    """get_current_prompt のキャッシュ版 (読み取り専用の PromptRecord を返す)。"""
+    def _load():
+        prompt = get_current_prompt(db)
+        return PromptRecord(prompt.id, prompt.name, prompt.template_text, bool(prompt.is_default))
+    return _reference_cache.get_or_load("current_prompt", _load)
+
+
+def get_available_accounts(db: Session) -> List[str]:
+    """絞り込み用のアカウント一覧 (target_accounts から。collected_posts の全件走査はしない)。"""
+    return _reference_cache.get_or_load(
+        "accounts",
+        lambda: [row[0] for row in db.query(TargetAccount.username).order_by(TargetAccount.username).all()]
+    )
+
+
+def _load_sector_tree(db: Session) -> List[Dict]:
+    results = db.query(StockTickerMap.gics_sector, StockTickerMap.gics_sub_industry).distinct().all()
+
+    sector_tree: Dict[str, Set[str]] = {}
+    for sector, sub_sector in results:
+        if sector is None or sub_sector is None:
+            continue
+        sector_tree.setdefault(sector, set()).add(sub_sector)
+
+    return [
+        {"name": sector_name, "sub_sectors": sorted(sector_tree[sector_name])}
+        for sector_name in sorted(sector_tree)
+    ]
+
+
+def get_sector_tree(db: Session) -> List[Dict]:
+    """セクター / サブインダストリーの2階層リスト [{"name": ..., "sub_sectors": [...]}, ...]"""
+    return _reference_cache.get_or_load("sector_tree", lambda: _load_sector_tree(db))
+
 # --- DB操作ヘルパー関数 ---
 def get_current_provider(db: Session) -> str:
-    """DBから現在のAPIプロバイダー設定を取得する"""
-    setting = db.query(Setting).filter(Setting.key == 'api_provider').first()
-    return setting.value if setting else 'X'
+    """現在のAPIプロバイダー設定を返す (参照データキャッシュ経由)"""
+    return get_setting_value(db, 'api_provider', 'X')
+
+def filter_new_post_ids(db: Session, candidate_ids: Iterable[str]) -> Set[str]:
+    """候補の post_id のうち、collected_posts にまだ存在しないものだけを返す。
+    候補を unnest で配列展開し、DB 側のアンチジョイン (NOT EXISTS) で判定するため、
+    既存IDの全件を Python 側に読み込む必要がない。
+    照会先は post_keys (パーティションごとに索引を引かずに済む)。
+    """
+    ids = list(set(candidate_ids))
+    if not ids:
+        return set()
+    rows = db.execute(
+        text(
+            "SELECT c.post_id FROM unnest(CAST(:ids AS text[])) AS c(post_id) "
+            "WHERE NOT EXISTS (SELECT 1 FROM post_keys p WHERE p.post_id = c.post_id)"
+        ),
+        {"ids": ids}
+    )
+    return {row[0] for row in rows}
+
+def find_existing_fingerprints(db: Session, pairs: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+    """(username, content_fingerprint) の候補のうち、collected_posts に既に存在する組を返す。
+    filter_new_post_ids と同じく unnest で候補を展開して DB 側で判定する。
+    """
+    pairs = list(set(pairs))
+    if not pairs:
+        return set()
+    rows = db.execute(
+        text(
+            "SELECT c.username, c.fp FROM unnest(CAST(:usernames AS text[]), CAST(:fps AS text[])) AS c(username, fp) "
+            "WHERE EXISTS (SELECT 1 FROM post_keys p "
+            "WHERE p.username = c.username AND p.content_fingerprint = c.fp)"
+        ),
+        {"usernames": [u for u, _ in pairs], "fps": [f for _, f in pairs]}
+    )
+    return {(row[0], row[1]) for row in rows}
+
+def claim_post_key(db: Session, post_id: str, username: str, content_fingerprint: Optional[str]) -> bool:
+    """投稿のキーを post_keys に登録する。既に同じ post_id / (username, content_fingerprint) があれば False。
+    重複する投稿の INSERT はトリガーで黙って捨てられ、ORM の flush では ID が返らないので、
+    1件ずつ ORM で保存する worker は先にこれで確かめる。キーはトランザクションのロールバックで消える。
+    """
+    row = db.execute(
+        text(
+            "INSERT INTO post_keys (post_id, username, content_fingerprint) VALUES (:post_id, :username, :fp) "
+            "ON CONFLICT DO NOTHING RETURNING post_id"
+        ),
+        {"post_id": post_id, "username": username, "fp": content_fingerprint}
+    ).first()
+    return row is not None
 
 def get_current_prompt(db: Session) -> Prompt:
     """DB から現在選択されているプロンプトを返す。
@@ -189,17 +523,19 @@ def _run_analysis_logic(
             full_prompt = prompt_text.replace("{texts}", combined_texts)
             full_prompt = full_prompt.replace("{ticker_context}", ticker_context)
 
-            # (b) AI呼び出し (1件ごと)
-            response = client_openai.chat.completions.create(
-                model=selected_model,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a data extraction engine designed to output JSON."},
-                    {"role": "user", "content": full_prompt}
-                ]
-            )
-            ai_result_str = response.choices[0].message.content
-            usage_data = response.usage.model_dump()
+            # (b) AI呼び出し (1件ごと)。レイテンシ・トークン・コストをモデル別にメトリクスへ記録
+            with observe_openai_call(selected_model) as record_usage:
+                response = client_openai.chat.completions.create(
+                    model=selected_model,
+                    response_format={"type": "json_object"},
+                    messages=[
+                        {"role": "system", "content": "You are a data extraction engine designed to output JSON."},
+                        {"role": "user", "content": full_prompt}
+                    ]
+                )
+                ai_result_str = response.choices[0].message.content
+                usage_data = response.usage.model_dump()
+                record_usage(usage_data, calculate_cost(selected_model, usage_data))
             
             # (c) トークンとコストを集計
             total_input_tokens += usage_data.get("prompt_tokens", 0)
@@ -226,6 +562,7 @@ def _run_analysis_logic(
                     new_log = TickerSentiment(
                         analysis_result_id = new_result.id, # 親ID
                         collected_post_id = post.id,
+                        posted_at = post.posted_at, # パーティションキー (投稿と同じ月に入る)
                         ticker = ticker,
                         sentiment = sentiment_data.get("sentiment"),
                         reasoning = sentiment_data.get("reason", "")
@@ -0,0 +1,271 @@
+# utils_feed.py
+"""
+Query helpers for the post feed (/api/filter-posts).
+
+A feed page costs exactly two queries:
+  1. the page itself, projected to the columns the UI needs, with every
+     TickerSentiment / StockTickerMap filter expressed as an EXISTS semi-join
+     (so a post matching several sentiments is returned once and `limit`
+     counts posts, not join rows);
+  2. the ticker sentiments of the posts on that page, in one IN query.
+
+The keyword filter is delegated to utils_search (match_mode). Ranked modes are
+ordered by relevance and paged by offset. Otherwise the page is ordered by one
+of SORT_KEYS and paged by a `(sort key, id)` keyset, so deep pages cost the
+same as the first one (alembic 000003_feed_sort). Cursors are opaque tokens
+(encode_cursor / decode_cursor).
+
+query_feed_version is the one-query content version used for the ETag of
+/api/filter-posts: the row count and max id of the filtered posts (posts are
+not updated after insert, and sentiments are only deleted with their posts)
+and the latest ticker_sentiment id (new analyses). A matching If-None-Match is
+answered before the page query runs.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import exists, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from models import CollectedPost, TickerSentiment, StockTickerMap
+from utils_search import build_snippet, effective_match_mode, keyword_condition
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+# 並び順 -> 並び替えキー (いずれも降順 + id 降順)。models の複合インデックスと同じ式にすること
+SORT_KEYS = {
+    'id': CollectedPost.id,
+    'posted_at': CollectedPost.posted_at,
+    'like_count': func.coalesce(CollectedPost.like_count, 0),
+    'retweet_count': func.coalesce(CollectedPost.retweet_count, 0),
+}
+DEFAULT_SORT = 'id'
+
+# 一覧表示に必要な列だけを取得する (ORM オブジェクトは生成しない)
+POST_LIST_COLUMNS = (
+    CollectedPost.id,
+    CollectedPost.username,
+    CollectedPost.posted_at,
+    CollectedPost.original_text,
+    CollectedPost.source_url,
+    CollectedPost.like_count,
+    CollectedPost.retweet_count,
+    CollectedPost.link_summary,
+)
+
+
+def _positive_int(value) -> Optional[int]:
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def encode_cursor(payload: Dict) -> str:
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(token) -> Optional[Dict]:
+    """
+    encode_cursor で作ったトークンを復元する。
+    旧形式の数値カーソル (最後の投稿ID) も受け付ける。壊れたトークンは None (= 先頭ページ)。
+    """
+    if token is None or token == '':
+        return None
+    if isinstance(token, int) or (isinstance(token, str) and token.isdigit()):
+        return {"s": DEFAULT_SORT, "i": int(token)}
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def _cursor_key(sort: str, value):
+    if sort == 'posted_at':
+        return datetime.fromisoformat(value)
+    return int(value)
+
+
+def build_post_filters(data: Dict) -> List:
+    """
+    リクエストの絞り込み条件 (キーワード以外) を CollectedPost に対する WHERE 条件のリストに変換する。
+    キーワードは match_mode によって並び順も変わるので query_post_page で扱う。
+    """
+    conditions = []
+
+    accounts = data.get('accounts') or []
+    if accounts:
+        conditions.append(CollectedPost.username.in_(accounts))
+
+    # --- 銘柄 / センチメント / セクター: 同じ TickerSentiment 行に対する条件を1つの EXISTS にまとめる ---
+    ticker_list = data.get('ticker')
+    sentiment = data.get('sentiment')
+    sectors = data.get('sector')
+    sub_sectors = data.get('sub_sector')
+
+    sentiment_conditions = []
+    if ticker_list:
+        sentiment_conditions.append(TickerSentiment.ticker.in_(ticker_list))
+    if sentiment:
+        sentiment_conditions.append(TickerSentiment.sentiment == sentiment)
+
+    sector_filters = []
+    if sectors:
+        sector_filters.append(StockTickerMap.gics_sector.in_(sectors))
+    if sub_sectors:
+        sector_filters.append(StockTickerMap.gics_sub_industry.in_(sub_sectors))
+
+    if sentiment_conditions or sector_filters:
+        semi_join = select(TickerSentiment.id).where(
+            TickerSentiment.collected_post_id == CollectedPost.id,
+            *sentiment_conditions
+        )
+        if sector_filters:
+            semi_join = semi_join.join(
+                StockTickerMap, TickerSentiment.ticker == StockTickerMap.ticker
+            ).where(or_(*sector_filters))
+        conditions.append(exists(semi_join))
+
+    likes = _positive_int(data.get('likes'))
+    if likes:
+        conditions.append(CollectedPost.like_count >= likes)
+    rts = _positive_int(data.get('rts'))
+    if rts:
+        conditions.append(CollectedPost.retweet_count >= rts)
+
+    # 期間 (直近 n 日の投稿)。posted_at は UTC の naive datetime で保存されている
+    period_days = _positive_int(data.get('period_days'))
+    if period_days:
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=period_days)
+        conditions.append(CollectedPost.posted_at >= since)
+
+    return conditions
+
+
+def page_limit(data: Dict) -> int:
+    try:
+        limit = int(data.get('limit', DEFAULT_PAGE_LIMIT))
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE_LIMIT
+    return max(1, min(limit, MAX_PAGE_LIMIT))
+
+
+def load_ticker_sentiments(db: Session, post_ids: List[int]) -> Dict[int, List[Dict]]:
+    """ページ内の投稿のセンチメントを1クエリで取得し、投稿IDごとにまとめる。"""
+    sentiments_by_post: Dict[int, List[Dict]] = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return sentiments_by_post
+    rows = db.query(
+        TickerSentiment.collected_post_id, TickerSentiment.ticker, TickerSentiment.sentiment
+    ).filter(
+        TickerSentiment.collected_post_id.in_(post_ids)
+    ).order_by(TickerSentiment.collected_post_id, TickerSentiment.id).all()
+    for post_id, ticker, sentiment in rows:
+        sentiments_by_post[post_id].append({"ticker": ticker, "sentiment": sentiment})
+    return sentiments_by_post
+
+
+def serialize_post_row(row, ticker_sentiments: List[Dict]) -> Dict:
+    post = {
+        "id": row.id,
+        "username": row.username,
+        "posted_at_iso": row.posted_at.isoformat() if row.posted_at else None,
+        "original_text": row.original_text,
+        "source_url": row.source_url,
+        "like_count": row.like_count,
+        "retweet_count": row.retweet_count,
+        "link_summary": row.link_summary,
+        "ticker_sentiments": ticker_sentiments,
+    }
+    if 'score' in row._fields:
+        post["score"] = float(row.score) if row.score is not None else None
+    return post
+
+
+def _feed_conditions(data: Dict):
+    """キーワードを含む WHERE 条件。(キーワード, match_mode, 条件のリスト, スコア式 or None) を返す。"""
+    keyword = (data.get('keyword') or '').strip()
+    match_mode = effective_match_mode(keyword, data.get('match_mode')) if keyword else None
+    conditions = build_post_filters(data)
+    score = None
+    if keyword:
+        keyword_conditions, score = keyword_condition(keyword, match_mode)
+        conditions.extend(keyword_conditions)
+    return keyword, match_mode, conditions, score
+
+
+def query_feed_version(db: Session, data: Dict) -> Tuple:
+    """
+    絞り込み結果の内容のバージョン (件数, 最大 id, 最新のセンチメント id) を1クエリで返す。
+    投稿の追加・削除・期間外への移動と、分析によるセンチメントの追加で変わる。
+    """
+    _, _, conditions, _ = _feed_conditions(data)
+    latest_sentiment = select(func.max(TickerSentiment.id)).scalar_subquery()
+    return tuple(db.query(func.count(), func.max(CollectedPost.id), latest_sentiment).filter(*conditions).one())
+
+
+def query_post_page(db: Session, data: Dict) -> Tuple[List[Dict], Optional[str]]:
+    """
+    絞り込み条件とカーソルから1ページ分の投稿を返す。
+
+    並び順は data['sort'] (SORT_KEYS のいずれか、既定は id = 収集順) の降順。
+    ランク付きのキーワード検索 (fulltext / fuzzy) の場合は関連度順になり、sort は無視される。
+    キーワード指定時は各投稿に snippet_html (一致箇所を <mark> で囲んだ抜粋) を付ける。
+
+    Returns:
+        (シリアライズ済み投稿リスト, next_cursor トークン or None)
+    """
+    keyword, match_mode, conditions, score = _feed_conditions(data)
+
+    limit = page_limit(data)
+    cursor = decode_cursor(data.get('cursor'))
+
+    if score is not None:
+        query = db.query(*POST_LIST_COLUMNS, score.label('score')).filter(*conditions)
+        offset = _positive_int(cursor.get('o')) if cursor else None
+        offset = offset or 0
+        rows = query.order_by(score.desc(), CollectedPost.id.desc()).offset(offset).limit(limit).all()
+        next_cursor = encode_cursor({"o": offset + len(rows)}) if len(rows) == limit else None
+    else:
+        sort = data.get('sort') if data.get('sort') in SORT_KEYS else DEFAULT_SORT
+        sort_key = SORT_KEYS[sort]
+        query = db.query(*POST_LIST_COLUMNS, sort_key.label('sort_key')).filter(*conditions)
+
+        # 別の並び順で発行されたカーソルは無視して先頭から返す
+        if cursor and cursor.get('s', DEFAULT_SORT) == sort and cursor.get('i') is not None:
+            try:
+                last_id = int(cursor['i'])
+                if sort == DEFAULT_SORT:
+                    query = query.filter(CollectedPost.id < last_id)
+                else:
+                    last_key = _cursor_key(sort, cursor['k'])
+                    query = query.filter(tuple_(sort_key, CollectedPost.id) < tuple_(last_key, last_id))
+            except (KeyError, TypeError, ValueError):
+                pass
+
+        order_by = [CollectedPost.id.desc()] if sort == DEFAULT_SORT else [sort_key.desc(), CollectedPost.id.desc()]
+        rows = query.order_by(*order_by).limit(limit).all()
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            payload = {"s": sort, "i": last.id}
+            if sort != DEFAULT_SORT:
+                payload["k"] = last.sort_key.isoformat() if sort == 'posted_at' else last.sort_key
+            next_cursor = encode_cursor(payload)
+
+    sentiments_by_post = load_ticker_sentiments(db, [row.id for row in rows])
+    posts = []
+    for row in rows:
+        post = serialize_post_row(row, sentiments_by_post[row.id])
+        if keyword:
+            post["snippet_html"] = build_snippet(row.original_text, keyword, match_mode)
+        posts.append(post)
+    return posts, next_cursor
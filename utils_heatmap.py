@@ -0,0 +1,186 @@
+# utils_heatmap.py
+"""
+Sector / sub-industry / ticker sentiment heatmap for /api/heatmap.
+
+Reads only ticker_sentiment_daily, the (day, ticker) rollup that triggers on
+ticker_sentiment keep up to date (alembic 000006_heatmap). A window of N days
+scans at most N x (number of tickers) small rows via the primary key,
+whatever the size of ticker_sentiment. Tickers are grouped into GICS
+sector / sub-industry in Python with the StockTickerMap lookup from the
+reference cache, so the request joins nothing.
+
+net_score = (positive - negative) / total, in [-1, 1].
+
+Months moved to Parquet by archive_posts.py stay in the rollup; their counts
+are also recorded in ticker_sentiment_daily_archived (alembic 000009_archive).
+If the rollup drifts (e.g. after TRUNCATE ticker_sentiment, which fires no
+trigger), rebuild it from ticker_sentiment plus the archived counts:
+
+    python utils_heatmap.py --rebuild
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, StockTickerMap, TickerSentimentDaily
+from utils_db import get_cached
+
+DEFAULT_WINDOW_DAYS = 1
+MAX_WINDOW_DAYS = 365
+UNCLASSIFIED = "Unclassified"
+
+_COUNT_FIELDS = ("positive", "negative", "neutral", "total")
+
+
+def _ticker_sectors(db: Session) -> Dict[str, Tuple[str, str]]:
+    """ticker -> (sector, sub_industry)。StockTickerMap の書き込みで無効化される。"""
+    def _load():
+        rows = db.query(StockTickerMap.ticker, StockTickerMap.gics_sector, StockTickerMap.gics_sub_industry).all()
+        return {ticker: (sector or UNCLASSIFIED, sub or UNCLASSIFIED) for ticker, sector, sub in rows}
+    return get_cached("ticker_sectors", _load)
+
+
+def parse_window_days(value) -> int:
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_WINDOW_DAYS
+    return min(max(days, 1), MAX_WINDOW_DAYS)
+
+
+def _new_bucket(**extra) -> Dict:
+    bucket = dict(extra)
+    bucket.update({field: 0 for field in _COUNT_FIELDS})
+    return bucket
+
+
+def _add_counts(bucket: Dict, counts: Dict) -> None:
+    for field in _COUNT_FIELDS:
+        bucket[field] += counts[field]
+
+
+def _finish(bucket: Dict) -> Dict:
+    total = bucket["total"]
+    bucket["net_score"] = round((bucket["positive"] - bucket["negative"]) / total, 4) if total else 0.0
+    return bucket
+
+
+def query_heatmap(db: Session, days: int = DEFAULT_WINDOW_DAYS, today=None) -> Dict:
+    """
+    直近 days 日 (UTC, 今日を含む) のセンチメント件数と net_score を
+    セクター > サブインダストリー > 銘柄 の階層と、銘柄のフラットな一覧で返す。
+    """
+    days = parse_window_days(days)
+    today = today or datetime.now(timezone.utc).date()
+    since = today - timedelta(days=days - 1)
+
+    rows = db.query(
+        TickerSentimentDaily.ticker,
+        func.sum(TickerSentimentDaily.positive).label("positive"),
+        func.sum(TickerSentimentDaily.negative).label("negative"),
+        func.sum(TickerSentimentDaily.neutral).label("neutral"),
+        func.sum(TickerSentimentDaily.total).label("total"),
+    ).filter(
+        TickerSentimentDaily.day >= since,
+        TickerSentimentDaily.day <= today,
+    ).group_by(TickerSentimentDaily.ticker).all()
+
+    sector_of = _ticker_sectors(db)
+    totals = _new_bucket()
+    sectors: Dict[str, Dict] = {}
+    tickers: List[Dict] = []
+
+    for row in rows:
+        counts = {field: int(getattr(row, field) or 0) for field in _COUNT_FIELDS}
+        if counts["total"] <= 0:
+            continue
+        sector_name, sub_name = sector_of.get(row.ticker, (UNCLASSIFIED, UNCLASSIFIED))
+
+        sector = sectors.get(sector_name)
+        if sector is None:
+            sector = sectors[sector_name] = _new_bucket(name=sector_name, sub_industries={})
+        sub = sector["sub_industries"].get(sub_name)
+        if sub is None:
+            sub = sector["sub_industries"][sub_name] = _new_bucket(name=sub_name, tickers=[])
+
+        ticker = _finish(dict(counts, ticker=row.ticker, sector=sector_name, sub_industry=sub_name))
+        tickers.append(ticker)
+        sub["tickers"].append(row.ticker)
+        for bucket in (totals, sector, sub):
+            _add_counts(bucket, counts)
+
+    by_total = lambda item: (-item["total"], item.get("name") or item.get("ticker"))
+    sector_list = []
+    for sector in sorted(sectors.values(), key=by_total):
+        subs = sorted(sector["sub_industries"].values(), key=by_total)
+        for sub in subs:
+            _finish(sub)
+        sector["sub_industries"] = subs
+        sector_list.append(_finish(sector))
+
+    return {
+        "days": days,
+        "since": since.isoformat(),
+        "until": today.isoformat(),
+        "totals": _finish(totals),
+        "sectors": sector_list,
+        "tickers": sorted(tickers, key=by_total),
+    }
+
+
+def rebuild_heatmap_aggregates(db: Optional[Session] = None) -> int:
+    """
+    ticker_sentiment_daily を ticker_sentiment と ticker_sentiment_daily_archived (アーカイブした月) から作り直す。
+    作り直しの間は ticker_sentiment への書き込みを待たせる (SHARE ロック)。集計表の行数を返す。
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        db.execute(text("LOCK TABLE ticker_sentiment, ticker_sentiment_daily_archived IN SHARE MODE"))
+        db.execute(text("DELETE FROM ticker_sentiment_daily"))
+        db.execute(text("""
+            INSERT INTO ticker_sentiment_daily (day, ticker, positive, negative, neutral, total)
+            SELECT day, ticker, sum(positive), sum(negative), sum(neutral), sum(total)
+            FROM (
+                SELECT s.posted_at::date AS day, s.ticker,
+                       count(*) FILTER (WHERE lower(s.sentiment) = 'positive') AS positive,
+                       count(*) FILTER (WHERE lower(s.sentiment) = 'negative') AS negative,
+                       count(*) FILTER (WHERE lower(s.sentiment) = 'neutral') AS neutral,
+                       count(*) AS total
+                FROM ticker_sentiment s
+                GROUP BY 1, 2
+                UNION ALL
+                SELECT day, ticker, positive, negative, neutral, total FROM ticker_sentiment_daily_archived
+            ) counts
+            GROUP BY 1, 2
+        """))
+        count = db.query(func.count()).select_from(TickerSentimentDaily).scalar()
+        db.commit()
+        return count
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sentiment heatmap rollup maintenance.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute ticker_sentiment_daily from ticker_sentiment and the archived counts")
+    parser.add_argument("--days", type=int, default=DEFAULT_WINDOW_DAYS, help="Print the heatmap totals for this window")
+    args = parser.parse_args()
+    if args.rebuild:
+        print(f"Rebuilt ticker_sentiment_daily: {rebuild_heatmap_aggregates()} rows")
+    session = SessionLocal()
+    try:
+        heatmap = query_heatmap(session, args.days)
+        print(f"{heatmap['since']} .. {heatmap['until']}: {heatmap['totals']}")
+        for sector in heatmap["sectors"]:
+            print(f"  {sector['name']:<32} total={sector['total']:>7} net={sector['net_score']:+.3f}")
+    finally:
+        session.close()
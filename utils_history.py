@@ -0,0 +1,146 @@
+# utils_history.py
+"""
+Query helpers for the analysis history page (/history).
+
+The list query selects only summary columns of AnalysisResult (plus the prompt
+name and post / sentiment counts as correlated subqueries) and pages with an
+`(analyzed_at, id)` keyset, so a page costs the same however long the history
+grows (alembic 000004_history). Post bodies, reasoning texts and the prompt
+template are loaded per result on demand (/api/history/<id>).
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from models import AnalysisResult, CollectedPost, Prompt, TickerSentiment, analysis_posts_link
+from utils_feed import decode_cursor, encode_cursor
+
+HISTORY_PAGE_SIZE = 20
+
+
+def _keyset_condition(cursor: Dict):
+    """
+    analyzed_at DESC (NULLS FIRST), id DESC の並びで、カーソルの行より後ろの行を表す条件。
+    """
+    last_id = int(cursor['i'])
+    if cursor.get('k') is None:
+        return or_(
+            and_(AnalysisResult.analyzed_at.is_(None), AnalysisResult.id < last_id),
+            AnalysisResult.analyzed_at.isnot(None),
+        )
+    last_key = datetime.fromisoformat(cursor['k'])
+    return tuple_(AnalysisResult.analyzed_at, AnalysisResult.id) < tuple_(last_key, last_id)
+
+
+def query_history_page(db: Session, cursor_token=None, limit: int = HISTORY_PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+    """
+    分析履歴の1ページ分 (サマリー列のみ) を新しい順に返す。
+
+    Returns:
+        (サマリーのリスト, next_cursor トークン or None)
+    """
+    post_count = select(func.count()).select_from(analysis_posts_link).where(
+        analysis_posts_link.c.analysis_result_id == AnalysisResult.id
+    ).scalar_subquery()
+    sentiment_count = select(func.count(TickerSentiment.id)).where(
+        TickerSentiment.analysis_result_id == AnalysisResult.id
+    ).scalar_subquery()
+
+    query = db.query(
+        AnalysisResult.id,
+        AnalysisResult.analyzed_at,
+        AnalysisResult.ai_model,
+        AnalysisResult.cost_usd,
+        AnalysisResult.input_tokens,
+        AnalysisResult.output_tokens,
+        AnalysisResult.extracted_summary,
+        AnalysisResult.prompt_id,
+        Prompt.name.label('prompt_name'),
+        post_count.label('post_count'),
+        sentiment_count.label('sentiment_count'),
+    ).outerjoin(Prompt, Prompt.id == AnalysisResult.prompt_id)
+
+    cursor = decode_cursor(cursor_token)
+    if cursor and cursor.get('i') is not None:
+        try:
+            query = query.filter(_keyset_condition(cursor))
+        except (TypeError, ValueError):
+            pass
+
+    rows = query.order_by(AnalysisResult.analyzed_at.desc(), AnalysisResult.id.desc()).limit(limit).all()
+
+    results = [{
+        "id": row.id,
+        "analyzed_at": row.analyzed_at,
+        "ai_model": row.ai_model,
+        "cost_usd": row.cost_usd,
+        "input_tokens": row.input_tokens,
+        "output_tokens": row.output_tokens,
+        "extracted_summary": row.extracted_summary,
+        "prompt_id": row.prompt_id,
+        "prompt_name": row.prompt_name,
+        "post_count": row.post_count,
+        "sentiment_count": row.sentiment_count,
+    } for row in rows]
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor({
+            "i": last.id,
+            "k": last.analyzed_at.isoformat() if last.analyzed_at else None,
+        })
+    return results, next_cursor
+
+
+def load_history_details(db: Session, result_id: int) -> Optional[Dict]:
+    """
+    1件の分析結果の詳細 (対象投稿・銘柄別センチメント・プロンプト全文) を返す。
+    存在しなければ None。
+    """
+    header = db.query(AnalysisResult.id, Prompt.template_text).outerjoin(
+        Prompt, Prompt.id == AnalysisResult.prompt_id
+    ).filter(AnalysisResult.id == result_id).first()
+    if header is None:
+        return None
+
+    post_rows = db.query(
+        CollectedPost.id, CollectedPost.username, CollectedPost.original_text
+    ).join(
+        analysis_posts_link, analysis_posts_link.c.collected_post_id == CollectedPost.id
+    ).filter(
+        analysis_posts_link.c.analysis_result_id == result_id
+    ).order_by(CollectedPost.id).all()
+
+    sentiment_rows = db.query(
+        TickerSentiment.collected_post_id, TickerSentiment.ticker,
+        TickerSentiment.sentiment, TickerSentiment.reasoning
+    ).filter(
+        TickerSentiment.analysis_result_id == result_id
+    ).order_by(TickerSentiment.collected_post_id, TickerSentiment.id).all()
+
+    posts = {row.id: {"id": row.id, "username": row.username, "original_text": row.original_text}
+             for row in post_rows}
+    # センチメントが付いているのにリンク表に無い投稿 (古いデータ) も表示できるように補完する
+    missing_ids = {row.collected_post_id for row in sentiment_rows} - posts.keys()
+    if missing_ids:
+        for row in db.query(
+            CollectedPost.id, CollectedPost.username, CollectedPost.original_text
+        ).filter(CollectedPost.id.in_(missing_ids)):
+            posts[row.id] = {"id": row.id, "username": row.username, "original_text": row.original_text}
+
+    return {
+        "id": header.id,
+        "prompt_text": header.template_text,
+        "posts": [posts[row.id] for row in post_rows],
+        "posts_by_id": {str(post_id): post for post_id, post in posts.items()},
+        "sentiments": [{
+            "collected_post_id": row.collected_post_id,
+            "ticker": row.ticker,
+            "sentiment": row.sentiment,
+            "reasoning": row.reasoning,
+        } for row in sentiment_rows],
+    }
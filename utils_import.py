@@ -0,0 +1,681 @@
+# utils_import.py
+"""
+Background import of Threads text exports and JSONL dumps into collected_posts.
+
+Threads text flow:
+  1. The upload is spooled to disk (never decoded into memory as a whole).
+  2. A daemon thread streams the file through parse_threads_data_from_lines.
+  3. Each chunk of parsed posts is checked against collected_posts on the
+     database side (unnest + anti-join, optionally behind a Bloom filter
+     pre-check) by post_id and by content fingerprint (same account, same
+     normalized text, neighbouring time bucket), then inserted with one
+     multi-row INSERT ... ON CONFLICT DO NOTHING.
+  4. Progress is written to a small JSON status file per job, so any gunicorn
+     worker can answer /api/import-status/<job_id>.
+
+JSONL flow (load_jsonl_file):
+  records are decoded with orjson (json fallback), validated, COPY'd into a
+  temporary staging table and merged into collected_posts with one
+  INSERT ... SELECT. Duplicates against existing posts are filtered through
+  post_keys (the global post_id / fingerprint keys, see models.PostKey).
+
+CLI:
+  python utils_import.py dump.jsonl [more.jsonl ...] [--username NAME] [--provider X]
+"""
+
+import io
+import hashlib
+import os
+import re
+import csv
+import sys
+import json
+import argparse
+import math
+import time
+import uuid
+import threading
+import logging
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from dateutil.parser import parse
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, CollectedPost, PostKey, TargetAccount, engine
+from utils_db import filter_new_post_ids, find_existing_fingerprints, invalidate_reference_cache
+from utils_parser import (
+    parse_threads_data_from_lines, ParseStats, compute_content_fingerprint, candidate_fingerprints,
+    normalize_post_text, time_bucket, FINGERPRINT_BUCKET_HOURS,
+)
+
+logger = logging.getLogger("utils_import")
+
+# Spooled uploads and job status files (shared by all processes on the host)
+IMPORT_WORK_DIR = Path(os.environ.get("IMPORT_WORK_DIR", "/tmp/post_imports"))
+
+try:
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "500"))
+except ValueError:
+    IMPORT_CHUNK_SIZE = 500
+
+# Bloom filter pre-check (optional): skips the DB anti-join for IDs that are definitely new
+IMPORT_BLOOM_PRECHECK = os.environ.get("IMPORT_BLOOM_PRECHECK", "0") == "1"
+try:
+    IMPORT_BLOOM_REBUILD_SECONDS = int(os.environ.get("IMPORT_BLOOM_REBUILD_SECONDS", "3600"))
+except ValueError:
+    IMPORT_BLOOM_REBUILD_SECONDS = 3600
+
+try:
+    JSONL_COPY_BATCH_SIZE = int(os.environ.get("JSONL_COPY_BATCH_SIZE", "50000"))
+except ValueError:
+    JSONL_COPY_BATCH_SIZE = 50000
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson はオプション (なければ標準 json)
+    _json_loads = json.loads
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ============================================================
+# Bloom filter pre-check for existing post_ids
+# ============================================================
+
+class PostIdBloomFilter:
+    """
+    Compact probabilistic set of existing post_ids.
+
+    ``post_id in bloom`` can return false positives but never false negatives,
+    so it is only used to *skip* the database check for IDs that are certainly new;
+    "maybe present" IDs still go through filter_new_post_ids.
+    """
+
+    def __init__(self, expected_items: int, false_positive_rate: float = 0.01):
+        expected_items = max(expected_items, 1)
+        self.num_bits = max(8, int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / expected_items * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.built_at = time.monotonic()
+
+    def _positions(self, post_id: str):
+        digest = hashlib.blake2b(post_id.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, post_id: str) -> None:
+        for pos in self._positions(post_id):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, post_id: object) -> bool:
+        if not isinstance(post_id, str):
+            return False
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(post_id))
+
+
+_bloom_lock = threading.Lock()
+_bloom: Optional[PostIdBloomFilter] = None
+
+
+def _build_post_id_bloom(db: Session) -> PostIdBloomFilter:
+    # 行数はカタログの推定値で十分 (count(*) の全件走査を避ける)。
+    # collected_posts はパーティション表で親に行数の統計がないので、同じ行数の post_keys を見る
+    estimate = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'post_keys'")
+    ).scalar() or 0
+    bloom = PostIdBloomFilter(expected_items=max(int(estimate * 1.2), 100_000))
+    for (post_id,) in db.query(PostKey.post_id).yield_per(10_000):
+        bloom.add(post_id)
+    logger.info("Rebuilt post_id Bloom filter (%d bits, %d hashes).", bloom.num_bits, bloom.num_hashes)
+    return bloom
+
+
+def get_post_id_bloom(db: Session) -> PostIdBloomFilter:
+    """プロセス内の Bloom フィルタを返す。IMPORT_BLOOM_REBUILD_SECONDS ごとに再構築する。"""
+    global _bloom
+    with _bloom_lock:
+        if _bloom is None or time.monotonic() - _bloom.built_at > IMPORT_BLOOM_REBUILD_SECONDS:
+            _bloom = _build_post_id_bloom(db)
+        return _bloom
+
+
+def find_new_post_ids(db: Session, candidate_ids: Iterable[str], use_bloom: bool = IMPORT_BLOOM_PRECHECK) -> Set[str]:
+    """
+    候補IDのうち DB に存在しないものを返す。
+    use_bloom=True の場合、Bloom フィルタで「確実に新規」と判定できたIDは DB 照会を省略する。
+    """
+    candidates = set(candidate_ids)
+    if not use_bloom:
+        return filter_new_post_ids(db, candidates)
+    bloom = get_post_id_bloom(db)
+    maybe_existing = {pid for pid in candidates if pid in bloom}
+    return (candidates - maybe_existing) | filter_new_post_ids(db, maybe_existing)
+
+
+# ============================================================
+# Job status (JSON file per job)
+# ============================================================
+
+def _status_path(job_id: str) -> Path:
+    return IMPORT_WORK_DIR / f"{job_id}.json"
+
+
+def _write_status(job_id: str, status: Dict) -> None:
+    """Atomically replace the status file so readers never see a partial write."""
+    status["updated_at"] = datetime.now(timezone.utc).isoformat()
+    tmp_path = IMPORT_WORK_DIR / f"{job_id}.json.tmp"
+    tmp_path.write_text(json.dumps(status, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, _status_path(job_id))
+
+
+def get_import_status(job_id: str) -> Optional[Dict]:
+    """ジョブの進捗を返す。存在しない / 不正なIDの場合は None。"""
+    if not job_id or not _JOB_ID_RE.match(job_id):
+        return None
+    path = _status_path(job_id)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+# ============================================================
+# Chunked insert
+# ============================================================
+
+def _ensure_target_account(db: Session, username: str) -> None:
+    """collected_posts.username は target_accounts への外部キーなので、なければ作成する。"""
+    exists = db.query(TargetAccount.id).filter(TargetAccount.username == username).first()
+    if not exists:
+        db.add(TargetAccount(username=username, provider='Threads', is_active=True))
+        db.flush()
+
+
+def _to_row(post_data: Dict, now: datetime) -> Dict:
+    return {
+        "username": post_data["username"],
+        "post_id": post_data["post_id"],
+        "content_fingerprint": post_data["content_fingerprint"],
+        "original_text": post_data["original_text"],
+        "source_url": post_data.get("source_url", ""),
+        "posted_at": parse(post_data["posted_at"]),
+        "like_count": int(post_data.get("like_count", 0)),
+        "retweet_count": int(post_data.get("retweet_count", 0)),
+        "created_at": now,
+    }
+
+
+def _drop_fingerprint_duplicates(db: Session, posts: List[Dict]) -> List[Dict]:
+    """
+    同じアカウント・同じ正規化本文で、時間バケットが前後1つ以内の投稿を重複として除外する。
+    (相対時刻のずれで post_id が変わった再インポート対策)
+    """
+    candidates = {}
+    for post in posts:
+        post.setdefault("content_fingerprint", compute_content_fingerprint(post["original_text"], post["posted_at"]))
+        candidates[post["post_id"]] = [
+            (post["username"], fp) for fp in candidate_fingerprints(post["original_text"], post["posted_at"])
+        ]
+    existing = find_existing_fingerprints(db, (pair for pairs in candidates.values() for pair in pairs))
+
+    kept = []
+    for post in posts:
+        if any(pair in existing for pair in candidates[post["post_id"]]):
+            continue
+        existing.add((post["username"], post["content_fingerprint"]))  # チャンク内の重複も除外
+        kept.append(post)
+    return kept
+
+
+def insert_posts_chunk(db: Session, posts: List[Dict]) -> int:
+    """
+    投稿データのチャンクを1回の multi-row INSERT で登録する (コミットは呼び出し元)。
+    既存の post_id は事前のアンチジョインで除外し、同時実行による衝突は
+    DB 側 (post_keys のトリガー / ON CONFLICT DO NOTHING) でスキップされる。
+
+    Returns:
+        実際に追加された行数
+    """
+    if not posts:
+        return 0
+    new_ids = find_new_post_ids(db, (p["post_id"] for p in posts))
+    posts = [p for p in posts if p["post_id"] in new_ids]
+    posts = _drop_fingerprint_duplicates(db, posts)
+    if not posts:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    for username in {p["username"] for p in posts}:
+        _ensure_target_account(db, username)
+
+    stmt = (
+        pg_insert(CollectedPost)
+        .values([_to_row(p, now) for p in posts])
+        # 同時実行で post_id / (username, content_fingerprint) が衝突した行は post_keys のトリガーが捨てる。
+        # ON CONFLICT はパーティション表の (post_id, posted_at) 等の一意制約の分
+        .on_conflict_do_nothing()
+        .returning(CollectedPost.post_id)
+    )
+    inserted_ids = [row[0] for row in db.execute(stmt)]
+    if _bloom is not None:
+        for post_id in inserted_ids:
+            _bloom.add(post_id)
+    return len(inserted_ids)
+
+
+# ============================================================
+# Background job
+# ============================================================
+
+def run_threads_import(job_id: str, upload_path: Path, chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    スプールされた Threads テキストを逐次パースし、チャンク単位で挿入する。
+    各チャンクのコミット後に進捗ファイルを更新する。
+    """
+    status = get_import_status(job_id) or {"job_id": job_id}
+    status.update({
+        "state": "running",
+        "lines_parsed": 0,
+        "posts_parsed": 0,
+        "posts_added": 0,
+        "duplicates_skipped": 0,
+        "error": None,
+    })
+    _write_status(job_id, status)
+
+    stats = ParseStats()
+    db = SessionLocal()
+
+    def _flush_chunk(chunk: List[Dict]) -> None:
+        added = insert_posts_chunk(db, chunk)
+        db.commit()
+        status["posts_added"] += added
+        # ファイル内の重複 + DB に既に存在した投稿
+        status["duplicates_skipped"] = stats.duplicates_skipped + (stats.posts_parsed - status["posts_added"])
+        status["lines_parsed"] = stats.lines_parsed
+        status["posts_parsed"] = stats.posts_parsed
+        _write_status(job_id, status)
+
+    try:
+        chunk: List[Dict] = []
+        with open(upload_path, "r", encoding="utf-8", errors="replace", newline=None) as f:
+            for post_data in parse_threads_data_from_lines(f, set(), stats=stats):
+                chunk.append(post_data)
+                if len(chunk) >= chunk_size:
+                    _flush_chunk(chunk)
+                    chunk = []
+        _flush_chunk(chunk)
+
+        status["username"] = stats.username
+        status["state"] = "finished"
+        if not stats.lines_parsed:
+            status["state"] = "failed"
+            status["error"] = "ファイルが空です。"
+        elif not stats.username:
+            status["state"] = "failed"
+            status["error"] = "アカウント名を検出できませんでした。ファイル内容を確認してください。"
+        _write_status(job_id, status)
+        logger.info(
+            "Import job %s finished: %d added, %d skipped.",
+            job_id, status["posts_added"], status["duplicates_skipped"]
+        )
+    except Exception as e:
+        db.rollback()
+        logger.exception("Import job %s failed", job_id)
+        status["state"] = "failed"
+        status["error"] = str(e)
+        _write_status(job_id, status)
+    finally:
+        db.close()
+        try:
+            upload_path.unlink()
+        except OSError:
+            pass
+    return status
+
+
+def _start_job(file_storage, runner, **runner_kwargs) -> str:
+    """アップロードをディスクにスプールし、runner をバックグラウンドスレッドで開始する。"""
+    IMPORT_WORK_DIR.mkdir(parents=True, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    upload_path = IMPORT_WORK_DIR / f"{job_id}.upload"
+    file_storage.save(str(upload_path))  # チャンク単位でコピーされる
+
+    _write_status(job_id, {
+        "job_id": job_id,
+        "state": "queued",
+        "filename": file_storage.filename,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+    t = threading.Thread(
+        target=runner,
+        args=(job_id, upload_path),
+        kwargs=runner_kwargs,
+        name=f"post-import-{job_id[:8]}",
+        daemon=True,
+    )
+    t.start()
+    return job_id
+
+
+def start_threads_import(file_storage) -> str:
+    """
+    Threads のテキスト (werkzeug FileStorage) をディスクにスプールし、
+    バックグラウンドスレッドでインポートを開始する。
+
+    Returns:
+        job_id (進捗確認用)
+    """
+    return _start_job(file_storage, run_threads_import)
+
+
+def start_jsonl_import(file_storage) -> str:
+    """JSONL ダンプをスプールし、COPY ローダーをバックグラウンドで実行する。job_id を返す。"""
+    return _start_job(file_storage, run_jsonl_import)
+
+
+# ============================================================
+# JSONL bulk loader (COPY into staging + single merge)
+# ============================================================
+
+# JSONL のフィールド名 -> CollectedPost の列 (先に見つかったキーを採用)
+JSONL_FIELD_ALIASES = {
+    "post_id": ("post_id", "id"),
+    "username": ("username", "user", "account"),
+    "original_text": ("original_text", "text", "body"),
+    "posted_at": ("posted_at", "created_at", "timestamp"),
+    "source_url": ("source_url", "permalink", "url"),
+    "like_count": ("like_count", "likes"),
+    "retweet_count": ("retweet_count", "reshare_count", "retweets"),
+}
+
+_STAGING_COLUMNS = (
+    "username", "post_id", "original_text", "source_url", "posted_at", "like_count", "retweet_count",
+    "fp_prev", "content_fingerprint", "fp_next", "text_key", "bucket",
+)
+
+# 列は _STAGING_COLUMNS の順 + 出現順 (seq)。トランザクションの終わりに消える
+_STAGING_TABLE_DDL = (
+    "CREATE TEMP TABLE collected_posts_staging ("
+    " username text, post_id text, original_text text, source_url text,"
+    " posted_at timestamp, like_count integer, retweet_count integer,"
+    " fp_prev text, content_fingerprint text, fp_next text, text_key text, bucket bigint,"
+    " seq bigint GENERATED ALWAYS AS IDENTITY"
+    ") ON COMMIT DROP"
+)
+
+# 検証エラーは先頭の数件だけ保持する
+_MAX_REPORTED_ERRORS = 20
+
+
+class JsonlRecordError(ValueError):
+    """JSONL の1レコードが CollectedPost に変換できない場合の例外"""
+
+
+def _pick(record: Dict, column: str):
+    for key in JSONL_FIELD_ALIASES[column]:
+        value = record.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _parse_posted_at(value) -> datetime:
+    if isinstance(value, (int, float)):
+        dt = datetime.fromtimestamp(value, tz=timezone.utc)
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value))
+        except ValueError:
+            dt = parse(str(value))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def jsonl_record_to_row(record: Dict, default_username: Optional[str] = None) -> Tuple:
+    """1レコードを検証し、ステージングテーブルの列順のタプルに変換する。"""
+    if not isinstance(record, dict):
+        raise JsonlRecordError("record is not a JSON object")
+    post_id = _pick(record, "post_id")
+    username = _pick(record, "username") or default_username
+    original_text = _pick(record, "original_text")
+    posted_at = _pick(record, "posted_at")
+    if post_id is None:
+        raise JsonlRecordError("missing post_id")
+    if not username:
+        raise JsonlRecordError("missing username")
+    if original_text is None:
+        raise JsonlRecordError("missing original_text")
+    if posted_at is None:
+        raise JsonlRecordError("missing posted_at")
+    try:
+        posted_at_dt = _parse_posted_at(posted_at)
+        like_count = int(_pick(record, "like_count") or 0)
+        retweet_count = int(_pick(record, "retweet_count") or 0)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise JsonlRecordError(str(e))
+    fp_prev, fp, fp_next = candidate_fingerprints(str(original_text), posted_at_dt)
+    # ファイル内の前後バケットの重複判定用 (正規化本文のハッシュと時間バケット)
+    text_key = hashlib.sha256(normalize_post_text(str(original_text)).encode("utf-8")).hexdigest()
+    return (
+        str(username), str(post_id), str(original_text), str(_pick(record, "source_url") or ""),
+        posted_at_dt.isoformat(sep=" "), like_count, retweet_count,
+        fp_prev, fp, fp_next, text_key, time_bucket(posted_at_dt, FINGERPRINT_BUCKET_HOURS),
+    )
+
+
+def iter_jsonl_rows(fp, stats: Dict, default_username: Optional[str] = None) -> Iterator[Tuple]:
+    """
+    バイナリファイルから JSONL を1行ずつデコード・検証し、有効な行を返す。
+    stats の records_read / invalid_records / errors を更新する。
+    """
+    for line_no, raw in enumerate(fp, start=1):
+        if not raw.strip():
+            continue
+        stats["records_read"] += 1
+        try:
+            yield jsonl_record_to_row(_json_loads(raw), default_username)
+        except ValueError as e:
+            # JsonlRecordError と orjson.JSONDecodeError / json.JSONDecodeError はどれも ValueError のサブクラス
+            stats["invalid_records"] += 1
+            if len(stats["errors"]) < _MAX_REPORTED_ERRORS:
+                stats["errors"].append(f"line {line_no}: {e}")
+
+
+def _copy_rows(cursor, rows: List[Tuple]) -> None:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY collected_posts_staging ({', '.join(_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buf
+    )
+
+
+def _drop_staged_duplicates(cursor) -> None:
+    """
+    ステージング内の重複を消す (_drop_fingerprint_duplicates のファイル内版)。
+    1. 同じ post_id、同じ (username, content_fingerprint) は先に出てきた行だけ残す。
+    2. 同じアカウント・同じ正規化本文で時間バケットが隣り合う行は、バケット順に1つおきに残す
+       (残した行の前後1バケット以内は重複。連続するバケット b, b+1, b+2 なら b と b+2 が残る)。
+    """
+    cursor.execute(
+        "DELETE FROM collected_posts_staging s USING ("
+        " SELECT seq,"
+        "  row_number() OVER (PARTITION BY post_id ORDER BY seq) AS id_rank,"
+        "  row_number() OVER (PARTITION BY username, content_fingerprint ORDER BY seq) AS fp_rank"
+        " FROM collected_posts_staging"
+        ") d WHERE d.seq = s.seq AND (d.id_rank > 1 OR d.fp_rank > 1)"
+    )
+    # 1. の後は (username, text_key) ごとにバケットが一意なので、連続するバケットの島ごとに先頭からの距離を見る
+    cursor.execute(
+        "DELETE FROM collected_posts_staging s USING ("
+        " SELECT seq, bucket - min(bucket) OVER (PARTITION BY username, text_key, island) AS step"
+        " FROM (SELECT seq, username, text_key, bucket,"
+        "  bucket - row_number() OVER (PARTITION BY username, text_key ORDER BY bucket) AS island"
+        "  FROM collected_posts_staging) r"
+        ") d WHERE d.seq = s.seq AND d.step % 2 = 1"
+    )
+
+
+def load_jsonl_file(
+    path,
+    default_username: Optional[str] = None,
+    provider: str = 'X',
+    batch_size: int = JSONL_COPY_BATCH_SIZE,
+    progress=None,
+) -> Dict:
+    """
+    JSONL ダンプを一時ステージングテーブルへ COPY し、1回の INSERT ... SELECT で
+    collected_posts にマージする (ファイル内の重複は _drop_staged_duplicates で先に消し、
+    既存の post_id / フィンガープリントは post_keys との突き合わせでスキップ)。
+    未登録のアカウントは target_accounts に provider で作成する。
+
+    Args:
+        progress: 各 COPY バッチ後に stats を受け取るコールバック (任意)
+
+    Returns:
+        stats dict (records_read, invalid_records, posts_added, duplicates_skipped, seconds, posts_per_sec)
+    """
+    stats = {"records_read": 0, "invalid_records": 0, "staged": 0,
+             "posts_added": 0, "duplicates_skipped": 0, "errors": []}
+    started = time.perf_counter()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(_STAGING_TABLE_DDL)
+        batch: List[Tuple] = []
+        with open(path, "rb") as fp:
+            for row in iter_jsonl_rows(fp, stats, default_username):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    _copy_rows(cursor, batch)
+                    stats["staged"] += len(batch)
+                    batch = []
+                    if progress:
+                        progress(stats)
+        if batch:
+            _copy_rows(cursor, batch)
+            stats["staged"] += len(batch)
+
+        # 未登録アカウントを作成 (collected_posts.username の外部キー)
+        cursor.execute(
+            "INSERT INTO target_accounts (username, provider, is_active, added_at) "
+            "SELECT DISTINCT username, %s, true, now() FROM collected_posts_staging "
+            "ON CONFLICT (username) DO NOTHING",
+            (provider,)
+        )
+        accounts_created = cursor.rowcount
+        _drop_staged_duplicates(cursor)
+        # DB の既存IDと前後の時間バケットを含む既存フィンガープリントは NOT EXISTS (post_keys) で、
+        # 同時実行による衝突は post_keys のトリガーで除外
+        cursor.execute(
+            "INSERT INTO collected_posts "
+            "(username, post_id, content_fingerprint, original_text, source_url, posted_at, "
+            "like_count, retweet_count, created_at) "
+            "SELECT s.username, s.post_id, s.content_fingerprint, s.original_text, "
+            "s.source_url, s.posted_at, s.like_count, s.retweet_count, now() AT TIME ZONE 'utc' "
+            "FROM collected_posts_staging s "
+            "WHERE NOT EXISTS (SELECT 1 FROM post_keys p WHERE p.post_id = s.post_id) "
+            "AND NOT EXISTS (SELECT 1 FROM post_keys p WHERE p.username = s.username "
+            "AND p.content_fingerprint IN (s.fp_prev, s.content_fingerprint, s.fp_next)) "
+            "ORDER BY s.seq "
+            "ON CONFLICT DO NOTHING"
+        )
+        stats["posts_added"] = cursor.rowcount
+        stats["duplicates_skipped"] = stats["staged"] - stats["posts_added"]
+        conn.commit()
+        if accounts_created:
+            invalidate_reference_cache("accounts", broadcast=True)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["posts_per_sec"] = stats["staged"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def run_jsonl_import(job_id: str, upload_path: Path) -> Dict:
+    """バックグラウンドジョブ: スプール済み JSONL を load_jsonl_file で取り込み、進捗ファイルを更新する。"""
+    status = get_import_status(job_id) or {"job_id": job_id}
+    status.update({"state": "running", "lines_parsed": 0, "posts_added": 0,
+                   "duplicates_skipped": 0, "invalid_records": 0, "error": None})
+    _write_status(job_id, status)
+
+    def _progress(stats: Dict) -> None:
+        status["lines_parsed"] = stats["records_read"]
+        status["invalid_records"] = stats["invalid_records"]
+        _write_status(job_id, status)
+
+    try:
+        stats = load_jsonl_file(upload_path, progress=_progress)
+        status.update({
+            "state": "finished",
+            "lines_parsed": stats["records_read"],
+            "posts_added": stats["posts_added"],
+            "duplicates_skipped": stats["duplicates_skipped"],
+            "invalid_records": stats["invalid_records"],
+            "validation_errors": stats["errors"],
+        })
+        if not stats["records_read"]:
+            status["state"] = "failed"
+            status["error"] = "ファイルが空です。"
+        _write_status(job_id, status)
+        logger.info("JSONL import job %s finished: %d added, %d skipped, %d invalid.",
+                    job_id, stats["posts_added"], stats["duplicates_skipped"], stats["invalid_records"])
+    except Exception as e:
+        logger.exception("JSONL import job %s failed", job_id)
+        status["state"] = "failed"
+        status["error"] = str(e)
+        _write_status(job_id, status)
+    finally:
+        try:
+            upload_path.unlink()
+        except OSError:
+            pass
+    return status
+
+
+# ============================================================
+# CLI Entry Point
+# ============================================================
+
+def _run_cli():
+    parser = argparse.ArgumentParser(description="Bulk-load JSONL post dumps into collected_posts (COPY + merge).")
+    parser.add_argument("files", nargs="+", help="JSONL files (one post object per line)")
+    parser.add_argument("--username", help="Username for records without a username field")
+    parser.add_argument("--provider", default="X", help="Provider for target accounts created on the fly (default: X)")
+    parser.add_argument("--batch-size", type=int, default=JSONL_COPY_BATCH_SIZE, help="Rows per COPY batch")
+    args = parser.parse_args()
+
+    exit_code = 0
+    for path in args.files:
+        if not os.path.exists(path):
+            print(f"❌ File not found: {path}")
+            exit_code = 1
+            continue
+        stats = load_jsonl_file(path, default_username=args.username, provider=args.provider, batch_size=args.batch_size)
+        print(f"✅ {path}: {stats['records_read']} records, {stats['posts_added']} added, "
+              f"{stats['duplicates_skipped']} duplicates, {stats['invalid_records']} invalid "
+              f"({stats['seconds']:.2f}s, {stats['posts_per_sec']:,.0f} posts/s)")
+        for err in stats["errors"]:
+            print(f"   - {err}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    _run_cli()
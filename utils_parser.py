@@ -3,12 +3,21 @@
 import re
 import os
 import sys
+import glob
+import unicodedata
+import json
+import mmap
+import time
 import argparse
 import hashlib
 import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from logging.handlers import RotatingFileHandler
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import List, Set, Tuple, Dict
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
 
 
 # ============================================================
@@ -46,105 +55,162 @@ if not logger.handlers:
 
 JST = timezone(timedelta(hours=9))  # Japan Standard Time (UTC+9)
 
+# Width of the time bucket folded into content fingerprints. Relative timestamps
+# ("3時間前", "2日") drift by up to a day between pastes, so imports treat the
+# neighbouring buckets as the same post (see candidate_fingerprints).
+# Changing this value invalidates all stored fingerprints.
+FINGERPRINT_BUCKET_HOURS = 48
+
 
 # ============================================================
 # Main Parsing Function
 # ============================================================
 
-def parse_threads_data_from_lines(
-    lines: List[str],
-    processed_ids_set: Set[str],
-    verbose: bool = False
-) -> Tuple[List[Dict], int]:
-    """
-    Parses raw text lines copied from a Threads profile page and extracts structured post data.
+# Number of leading lines scanned for the account name (see detect_username).
+USERNAME_SCAN_LINES = 50
 
-    Args:
-        lines: List of text lines from a Threads profile.
-        processed_ids_set: Set of post_ids already processed (updated in place).
-        verbose: If True, temporarily sets logging to DEBUG level for this call.
 
-    Returns:
-        (parsed_posts_data, newly_added_count)
+class PostIdChecker(Protocol):
     """
+    Membership checker used by the parser to skip already-seen post_ids.
 
-    # --- Adjust temporary log level if verbose ---
-    original_level = logger.level
-    if verbose:
-        logger.setLevel(logging.DEBUG)
-        logger.debug("Verbose mode enabled — detailed logs will be shown.")
+    A plain ``set`` satisfies this. Any object with ``__contains__`` and ``add``
+    can be plugged in (e.g. a shared ID space across processes). Checkers must
+    not report false positives, or new posts would be dropped.
+    """
 
-    parsed_posts_data = []
-    newly_added_count = 0
+    def __contains__(self, post_id: object) -> bool: ...
 
-    if not lines:
-        logger.warning("Input lines are empty — returning no posts.")
-        if verbose:
-            logger.setLevel(original_level)
-        return [], 0
+    def add(self, post_id: str) -> None: ...
 
-    logger.info("Starting parsing of %d lines.", len(lines))
 
-    # --- 1. Detect username (account ID) ---
-    username = detect_username(lines)
-    if not username:
-        logger.warning("Could not detect username. Aborting parse.")
-        if verbose:
-            logger.setLevel(original_level)
-        return [], 0
-    else:
-        logger.info("Detected username: %s", username)
+@dataclass
+class ParseStats:
+    """Running counters for one streaming parse (updated while the generator is consumed)."""
+    lines_parsed: int = 0
+    posts_parsed: int = 0
+    duplicates_skipped: int = 0
+    empty_skipped: int = 0
+    username: str = ""
 
-    # --- 2. Find timestamp lines marking posts ---
-    timestamp_indices = [
-        i for i, line in enumerate(lines)
-        if is_timestamp_line(line)
-    ]
-    logger.debug("Detected %d timestamp markers.", len(timestamp_indices))
 
-    # --- 3. Extract each post block ---
-    for idx, ts_i in enumerate(timestamp_indices):
-        start = ts_i + 1
-        end = timestamp_indices[idx + 1] if idx + 1 < len(timestamp_indices) else len(lines)
-        post_block_lines = lines[start:end]
+def iter_post_blocks(lines: Iterable[str], stats: Optional[ParseStats] = None) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Splits a stream of lines into post blocks without materializing the input.
 
-        raw_text = clean_post_text(post_block_lines)
-        if not raw_text.strip():
-            logger.debug("Skipped post at line %d: empty text after cleaning.", ts_i)
-            continue
+    Yields:
+        (timestamp_line, body_lines) for every timestamp marker. Lines before the
+        first marker (profile header) are dropped.
+    """
+    current_ts = None
+    block: List[str] = []
+    for line in lines:
+        if stats is not None:
+            stats.lines_parsed += 1
+        if is_timestamp_line(line):
+            if current_ts is not None:
+                yield current_ts, block
+            current_ts = line.strip()
+            block = []
+        elif current_ts is not None:
+            block.append(line)
+    if current_ts is not None:
+        yield current_ts, block
 
-        time_str = lines[ts_i].strip()
-        iso_time = parse_time_string_to_iso(time_str)
 
-        post_id = generate_pseudo_id(username, iso_time, raw_text[:50])
+def parse_threads_data_from_lines(
+    lines: Iterable[str],
+    seen_ids: Optional[PostIdChecker] = None,
+    verbose: bool = False,
+    stats: Optional[ParseStats] = None
+) -> Iterator[Dict]:
+    """
+    Parses raw text lines copied from a Threads profile page and yields structured post data.
 
-        if post_id in processed_ids_set:
-            logger.debug("Skipped duplicate post ID: %s", post_id)
-            continue
+    This is a generator: lines are consumed lazily (a file object can be passed directly)
+    and each post dict is yielded as soon as its block is complete.
 
-        post_dict = {
-            "username": username,
-            "posted_at": iso_time,
-            "original_text": raw_text.strip(),
-            "post_id": post_id,
-            "source_url": "",
-            "like_count": 0,
-            "retweet_count": 0
-        }
+    Args:
+        lines: Iterable of text lines from a Threads profile (list or open file).
+        seen_ids: Membership checker of post_ids already processed (updated in place).
+            A fresh set is used when omitted, so duplicates inside the input are still skipped.
+            Database-level duplicates are handled by the caller (see utils_db.filter_new_post_ids).
+        verbose: If True, temporarily sets logging to DEBUG level while the generator runs.
+        stats: Optional ParseStats instance that receives line / post / duplicate counters.
+
+    Yields:
+        post dicts (username, posted_at, original_text, post_id, source_url, like_count, retweet_count)
+    """
+    if seen_ids is None:
+        seen_ids = set()
+    if stats is None:
+        stats = ParseStats()
 
-        parsed_posts_data.append(post_dict)
-        processed_ids_set.add(post_id)
-        newly_added_count += 1
-        logger.debug("Added new post: %s", post_id)
+    # --- Adjust temporary log level if verbose ---
+    original_level = logger.level
+    if verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.debug("Verbose mode enabled — detailed logs will be shown.")
 
-    logger.info("Parsing complete. %d new posts added.", newly_added_count)
+    try:
+        line_iter = iter(lines)
 
-    # --- Restore log level ---
-    if verbose:
-        logger.setLevel(original_level)
-        logger.debug("Verbose mode complete — log level restored.")
+        # --- 1. Detect username (account ID) from the buffered head ---
+        head = list(islice(line_iter, USERNAME_SCAN_LINES))
+        if not head:
+            logger.warning("Input lines are empty — returning no posts.")
+            return
 
-    return parsed_posts_data, newly_added_count
+        logger.info("Starting streaming parse.")
+
+        username = detect_username(head)
+        if not username:
+            logger.warning("Could not detect username. Aborting parse.")
+            return
+        logger.info("Detected username: %s", username)
+        stats.username = username
+
+        # --- 2. Extract each post block (timestamp marker -> next marker) ---
+        for time_str, post_block_lines in iter_post_blocks(chain(head, line_iter), stats):
+            raw_text = clean_post_text(post_block_lines)
+            if not raw_text.strip():
+                logger.debug("Skipped post '%s': empty text after cleaning.", time_str)
+                stats.empty_skipped += 1
+                continue
+
+            iso_time = parse_time_string_to_iso(time_str)
+
+            post_id = generate_pseudo_id(username, iso_time, raw_text[:50])
+
+            if post_id in seen_ids:
+                logger.debug("Skipped duplicate post ID: %s", post_id)
+                stats.duplicates_skipped += 1
+                continue
+
+            seen_ids.add(post_id)
+            stats.posts_parsed += 1
+            logger.debug("Added new post: %s", post_id)
+
+            yield {
+                "username": username,
+                "posted_at": iso_time,
+                "original_text": raw_text.strip(),
+                "post_id": post_id,
+                "content_fingerprint": compute_content_fingerprint(raw_text, iso_time),
+                "source_url": "",
+                "like_count": 0,
+                "retweet_count": 0
+            }
+
+        logger.info(
+            "Parsing complete. %d lines read, %d new posts, %d duplicates skipped.",
+            stats.lines_parsed, stats.posts_parsed, stats.duplicates_skipped
+        )
+    finally:
+        # --- Restore log level ---
+        if verbose:
+            logger.setLevel(original_level)
+            logger.debug("Verbose mode complete — log level restored.")
 
 
 # ============================================================
@@ -233,6 +299,223 @@ def generate_pseudo_id(username: str, timestamp: str, text_snippet: str) -> str:
     return hashlib.md5(base).hexdigest()[:10]
 
 
+def normalize_post_text(text: str) -> str:
+    """Normalizes post text for fingerprinting (NFKC, case-folded, whitespace collapsed)."""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = re.sub(r"[\u200b-\u200d\ufeff]", "", text)  # zero-width characters
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def time_bucket(posted_at, bucket_hours: int) -> int:
+    """Returns the bucket index of an ISO string or datetime (naive values are treated as UTC)."""
+    if isinstance(posted_at, str):
+        posted_at = datetime.fromisoformat(posted_at.replace("Z", "+00:00"))
+    if posted_at.tzinfo is None:
+        posted_at = posted_at.replace(tzinfo=timezone.utc)
+    return int(posted_at.timestamp() // (bucket_hours * 3600))
+
+
+def compute_content_fingerprint(text: str, posted_at, bucket_offset: int = 0,
+                                bucket_hours: int = FINGERPRINT_BUCKET_HOURS) -> str:
+    """
+    Generates a stable content fingerprint: SHA-256 of the normalized text plus the
+    coarse time bucket of posted_at. Uniqueness is enforced per account
+    (collected_posts.username + content_fingerprint).
+    """
+    bucket = time_bucket(posted_at, bucket_hours) + bucket_offset
+    base = f"{bucket}|{normalize_post_text(text)}".encode("utf-8")
+    return hashlib.sha256(base).hexdigest()
+
+
+def candidate_fingerprints(text: str, posted_at, bucket_hours: int = FINGERPRINT_BUCKET_HOURS) -> List[str]:
+    """Fingerprints of the previous, same and next time bucket (the dedupe tolerance window)."""
+    return [
+        compute_content_fingerprint(text, posted_at, offset, bucket_hours)
+        for offset in (-1, 0, 1)
+    ]
+
+
+# ============================================================
+# Batch Mode (multi-file, process pool)
+# ============================================================
+
+# Files at least this large are read through mmap instead of buffered text I/O.
+DEFAULT_MMAP_THRESHOLD_MB = 64
+
+
+def expand_input_paths(patterns: Iterable[str]) -> List[str]:
+    """Expands files, directories (recursive *.txt) and glob patterns into a sorted, unique file list."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, "**", "*.txt"), recursive=True))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            paths.update(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def iter_file_lines(path: str, mmap_threshold_bytes: int) -> Iterator[str]:
+    """Yields decoded lines of a file, memory-mapping it when it is larger than the threshold."""
+    if os.path.getsize(path) >= mmap_threshold_bytes > 0:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for raw in iter(mm.readline, b""):
+                yield raw.decode("utf-8", errors="replace")
+    else:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
+def _parse_file_worker(path: str, mmap_threshold_bytes: int, spool_path: str) -> Dict:
+    """
+    Process-pool task: parses one file into a JSONL spool file and returns its path plus
+    timing counters. Only the counters are pickled back, so neither side holds a whole
+    file's posts in memory.
+    """
+    started = time.perf_counter()
+    stats = ParseStats()
+    posts = 0
+    with open(spool_path, "w", encoding="utf-8") as spool:
+        for post in parse_threads_data_from_lines(iter_file_lines(path, mmap_threshold_bytes), set(), stats=stats):
+            spool.write(json.dumps(post, ensure_ascii=False) + "\n")
+            posts += 1
+    return {
+        "path": path,
+        "pid": os.getpid(),
+        "spool_path": spool_path,
+        "posts": posts,
+        "lines": stats.lines_parsed,
+        "in_file_duplicates": stats.duplicates_skipped,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def run_batch(
+    patterns: Iterable[str],
+    output_path: Optional[str] = None,
+    insert_into_db: bool = False,
+    workers: Optional[int] = None,
+    mmap_threshold_mb: int = DEFAULT_MMAP_THRESHOLD_MB,
+    seen_ids: Optional[PostIdChecker] = None,
+    spool_dir: Optional[str] = None,
+) -> Dict:
+    """
+    Parses many Threads exports in parallel and streams the posts to a JSONL file
+    and/or the bulk insert path (utils_import.insert_posts_chunk).
+
+    Files are spread over a process pool. Each worker writes its posts to a spool
+    file (one JSONL per input, under ``spool_dir`` or a temporary directory); the
+    parent streams every finished spool file, de-duplicates across files against one
+    shared ID space (``seen_ids``) and deletes it. Memory stays flat regardless of
+    the input size.
+
+    Returns:
+        Summary dict with overall and per-worker throughput.
+    """
+    files = expand_input_paths(patterns)
+    if seen_ids is None:
+        seen_ids = set()
+    summary = {
+        "files": len(files), "lines": 0, "posts_written": 0,
+        "cross_file_duplicates": 0, "in_file_duplicates": 0, "posts_inserted": 0,
+        "per_worker": {},
+    }
+    if not files:
+        logger.warning("No input files matched: %s", list(patterns))
+        return summary
+
+    db = None
+    insert_posts_chunk = None
+    if insert_into_db:
+        # DB 接続情報が必要になるため、--insert 指定時のみ読み込む
+        from models import SessionLocal
+        from utils_import import insert_posts_chunk, IMPORT_CHUNK_SIZE
+        db = SessionLocal()
+    pending_chunk: List[Dict] = []
+
+    def _flush_chunk():
+        if pending_chunk:
+            summary["posts_inserted"] += insert_posts_chunk(db, pending_chunk)
+            db.commit()
+            pending_chunk.clear()
+
+    out = open(output_path, "w", encoding="utf-8") if output_path else None
+    spool = tempfile.TemporaryDirectory(prefix="threads-spool-", dir=spool_dir)
+    mmap_threshold_bytes = mmap_threshold_mb * 1024 * 1024
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_parse_file_worker, path, mmap_threshold_bytes,
+                            os.path.join(spool.name, f"{index:06d}.jsonl"))
+                for index, path in enumerate(files)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                worker = summary["per_worker"].setdefault(
+                    result["pid"], {"files": 0, "lines": 0, "posts": 0, "seconds": 0.0}
+                )
+                worker["files"] += 1
+                worker["lines"] += result["lines"]
+                worker["posts"] += result["posts"]
+                worker["seconds"] += result["seconds"]
+                summary["lines"] += result["lines"]
+                summary["in_file_duplicates"] += result["in_file_duplicates"]
+
+                with open(result["spool_path"], "r", encoding="utf-8") as spooled:
+                    for line in spooled:
+                        post = json.loads(line)
+                        if post["post_id"] in seen_ids:
+                            summary["cross_file_duplicates"] += 1
+                            continue
+                        seen_ids.add(post["post_id"])
+                        summary["posts_written"] += 1
+                        if out:
+                            out.write(line)
+                        if db is not None:
+                            pending_chunk.append(post)
+                            if len(pending_chunk) >= IMPORT_CHUNK_SIZE:
+                                _flush_chunk()
+                os.remove(result["spool_path"])
+                logger.info("Parsed %s: %d posts (%.2fs)", result["path"], result["posts"], result["seconds"])
+        if db is not None:
+            _flush_chunk()
+    except Exception:
+        if db is not None:
+            db.rollback()
+        raise
+    finally:
+        if out:
+            out.close()
+        if db is not None:
+            db.close()
+        spool.cleanup()
+
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = elapsed
+    summary["lines_per_sec"] = summary["lines"] / elapsed if elapsed else 0.0
+    summary["posts_per_sec"] = summary["posts_written"] / elapsed if elapsed else 0.0
+    for worker in summary["per_worker"].values():
+        worker["lines_per_sec"] = worker["lines"] / worker["seconds"] if worker["seconds"] else 0.0
+        worker["posts_per_sec"] = worker["posts"] / worker["seconds"] if worker["seconds"] else 0.0
+    return summary
+
+
+def _print_batch_summary(summary: Dict) -> None:
+    print(f"\n✅ Batch parsed {summary['files']} files, {summary['lines']} lines in {summary.get('seconds', 0):.2f}s")
+    print(f"🧩 Posts written: {summary['posts_written']} "
+          f"(cross-file duplicates: {summary['cross_file_duplicates']}, in-file duplicates: {summary['in_file_duplicates']})")
+    if summary["posts_inserted"]:
+        print(f"💾 Inserted into DB: {summary['posts_inserted']}")
+    print(f"⚡ Overall: {summary.get('lines_per_sec', 0):,.0f} lines/s, {summary.get('posts_per_sec', 0):,.0f} posts/s")
+    for pid, worker in sorted(summary["per_worker"].items()):
+        print(f"   - worker {pid}: {worker['files']} files, {worker['posts']} posts, "
+              f"{worker['lines_per_sec']:,.0f} lines/s, {worker['posts_per_sec']:,.0f} posts/s")
+    print(f"🪵 Logs saved to: {LOG_FILE}")
+    print()
+
+
 # ============================================================
 # CLI Entry Point for Testing
 # ============================================================
@@ -241,25 +524,47 @@ def _run_cli():
     parser = argparse.ArgumentParser(
         description="Parse raw Threads profile text files into structured post data."
     )
-    parser.add_argument("file", help="Path to the text file exported from Threads")
+    parser.add_argument("paths", nargs="+", help="Text file exported from Threads (or files / directories / globs with --batch)")
     parser.add_argument("--verbose", action="store_true", help="Enable detailed debug logging for this run")
+    parser.add_argument("--batch", action="store_true", help="Parse many files in parallel (directories and globs are expanded)")
+    parser.add_argument("--output", help="[batch] Write de-duplicated posts to this JSONL file")
+    parser.add_argument("--insert", action="store_true", help="[batch] Insert posts into collected_posts via the bulk insert path")
+    parser.add_argument("--workers", type=int, default=None, help="[batch] Number of worker processes (default: CPU count)")
+    parser.add_argument("--spool-dir", default=None,
+                        help="[batch] Directory for the per-file spool JSONL written by the workers (default: system temp)")
+    parser.add_argument("--mmap-threshold-mb", type=int, default=DEFAULT_MMAP_THRESHOLD_MB,
+                        help="[batch] Memory-map files at least this large (0 disables mmap)")
 
     args = parser.parse_args()
 
-    if not os.path.exists(args.file):
-        print(f"❌ File not found: {args.file}")
+    if args.batch:
+        summary = run_batch(
+            args.paths,
+            output_path=args.output,
+            insert_into_db=args.insert,
+            workers=args.workers,
+            mmap_threshold_mb=args.mmap_threshold_mb,
+            spool_dir=args.spool_dir,
+        )
+        _print_batch_summary(summary)
+        return
+
+    if len(args.paths) != 1:
+        parser.error("multiple inputs require --batch")
+    path = args.paths[0]
+
+    if not os.path.exists(path):
+        print(f"❌ File not found: {path}")
         sys.exit(1)
 
-    with open(args.file, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    processed = set()
-    posts, count = parse_threads_data_from_lines(lines, processed, verbose=args.verbose)
+    stats = ParseStats()
+    with open(path, "r", encoding="utf-8") as f:
+        posts = list(parse_threads_data_from_lines(f, set(), verbose=args.verbose, stats=stats))
 
-    print(f"\n✅ Parsed {count} new posts from '{args.file}'")
+    print(f"\n✅ Parsed {stats.posts_parsed} new posts from '{path}'")
     print(f"🧩 Detected username: {posts[0]['username'] if posts else '(none)'}")
     print(f"🪵 Logs saved to: {LOG_FILE}")
-    print(f"💾 Output sample (first 1–2 posts):\n")
+    print("💾 Output sample (first 1–2 posts):\n")
     for p in posts[:2]:
         print(f"- [{p['posted_at']}] {p['original_text'][:100]}...")
     print()
@@ -0,0 +1,293 @@
+# utils_partitions.py
+"""
+Monthly range partitions of collected_posts and ticker_sentiment, both by
+posted_at (ticker_sentiment.posted_at is a copy of the post's posted_at, so a
+sentiment always lives in the same month as its post). The tables are
+converted in alembic 000007_partitions.
+
+Each table has one partition per month named <table>_pYYYY_MM, plus a
+<table>_default partition that catches rows outside every month range, so
+an insert never fails. Queries bounded on the partition key only scan the
+matching months (e.g. /api/filter-posts with period_days, or the worker
+query for the latest post).
+
+ensure_partitions() creates the partitions for the coming months. worker.py
+calls it at the start of every run, and it should also run from cron:
+
+    python utils_partitions.py --ensure 3          # this month + 3 months ahead
+
+Moving rows that already landed in <table>_default into a new month needs a
+DETACH / ATTACH of the default partition (ACCESS EXCLUSIVE on the table), so
+only the CLI does that. The worker only creates missing months whose range
+the default partition does not hold, under a short lock_timeout, and leaves
+the rest to cron.
+    python utils_partitions.py --list
+    python utils_partitions.py --detach-before 2024-01 [--drop]
+    python utils_partitions.py --check
+
+Retention is a DETACH PARTITION per month: a catalog change instead of a
+DELETE over millions of rows. Both tables are detached together, one
+transaction per month, along with the rows that point at the month's posts
+without a partition of their own (analysis_posts_link, post_keys) and the
+month's counts in ticker_sentiment_daily (detaching does not fire the rollup
+triggers). Detached partitions stay as plain tables until they are dropped
+(or archived first). --check counts rows left pointing at missing posts.
+"""
+
+import argparse
+import re
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import SessionLocal
+
+# パーティション表 -> パーティションキー
+PARTITIONED_TABLES: Dict[str, str] = {
+    "collected_posts": "posted_at",
+    "ticker_sentiment": "posted_at",
+}
+DEFAULT_MONTHS_AHEAD = 3
+
+_NAME_RE = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(db: Session, table: str) -> bool:
+    return db.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+                      {"table": table}).scalar() is True
+
+
+def list_partitions(db: Session, table: str) -> List[Dict]:
+    """table のパーティションを [{name, bound, month}] で返す (month は月パーティションのみ、既定パーティションは None)。"""
+    rows = db.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table
+        ORDER BY c.relname
+    """), {"table": table}).all()
+    partitions = []
+    for name, bound in rows:
+        match = _NAME_RE.search(name)
+        month = date(int(match.group(1)), int(match.group(2)), 1) if match else None
+        partitions.append({"name": name, "bound": bound, "month": month})
+    return partitions
+
+
+def _plain_columns(db: Session, table: str) -> List[str]:
+    """生成列 (search_vector) を除いた列名。既定パーティションから行を移すときの INSERT 用。"""
+    return list(db.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """), {"table": table}).scalars())
+
+
+def create_month_partition(db: Session, table: str, month: date, move_stray: bool = False) -> Optional[str]:
+    """
+    table の month のパーティションを作る (既にあれば None)。
+    既定パーティションにその月の行が入っている場合、move_stray=True なら既定パーティションを一時的に外して行を移す。
+    move_stray=False (worker から) なら何もせず None を返す (テーブル全体を止める操作は cron / CLI に任せる)。
+    """
+    key = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return None
+
+    default = f"{table}_default"
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    bound = f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    stray = db.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {key} >= :lower AND {key} < :upper)"),
+        {"lower": lower, "upper": upper},
+    ).scalar()
+
+    if not stray:
+        db.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bound}"))
+        return name
+    if not move_stray:
+        print(f"{default} holds rows for {month:%Y-%m}; run `python utils_partitions.py --ensure` to move them.")
+        return None
+
+    columns = ", ".join(_plain_columns(db, table))
+    db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    db.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bound}"))
+    db.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default} "
+                    f"WHERE {key} >= :lower AND {key} < :upper"), {"lower": lower, "upper": upper})
+    db.execute(text(f"DELETE FROM {default} WHERE {key} >= :lower AND {key} < :upper"),
+               {"lower": lower, "upper": upper})
+    db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    return name
+
+
+def ensure_partitions(db: Optional[Session] = None, months_ahead: int = DEFAULT_MONTHS_AHEAD,
+                      today: Optional[date] = None, move_stray: bool = False) -> List[str]:
+    """
+    今月から months_ahead か月先までの月パーティションを全パーティション表に作る。作った名前を返す。
+    move_stray=False のときは既定パーティションの行の移動をせず、ロック待ちも lock_timeout で打ち切る
+    (worker の起動時に他のクエリを止めないように)。
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    current = month_start(today or datetime.now(timezone.utc).date())
+    created = []
+    try:
+        if not move_stray:
+            db.execute(text("SET LOCAL lock_timeout = '2s'"))
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(db, table):
+                # 000007_partitions を当てる前の DB
+                continue
+            for offset in range(months_ahead + 1):
+                name = create_month_partition(db, table, add_months(current, offset), move_stray=move_stray)
+                if name:
+                    created.append(name)
+        db.commit()
+        return created
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+
+def _drop_post_foreign_keys(db: Session, table: str) -> None:
+    """切り離したセンチメントのパーティションに残る collected_posts への外部キーを外す (投稿側を切り離せるように)。"""
+    names = db.execute(text("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = to_regclass(:table) AND contype = 'f' AND confrelid = 'collected_posts'::regclass
+    """), {"table": table}).scalars().all()
+    for name in names:
+        db.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+
+
+def _detach_month(db: Session, posts: Optional[str], sentiments: Optional[str], drop: bool) -> None:
+    """
+    1 か月分の投稿とセンチメントのパーティションを切り離す。
+    DETACH はトリガーを起こさないので、ticker_sentiment_daily の件数、リンク、post_keys はここで片付ける。
+    """
+    if sentiments:
+        db.execute(text(f"""
+            UPDATE ticker_sentiment_daily d SET
+                positive = d.positive - m.positive, negative = d.negative - m.negative,
+                neutral = d.neutral - m.neutral, total = d.total - m.total
+            FROM (
+                SELECT s.posted_at::date AS day, s.ticker,
+                       count(*) FILTER (WHERE lower(s.sentiment) = 'positive') AS positive,
+                       count(*) FILTER (WHERE lower(s.sentiment) = 'negative') AS negative,
+                       count(*) FILTER (WHERE lower(s.sentiment) = 'neutral') AS neutral,
+                       count(*) AS total
+                FROM {sentiments} s GROUP BY 1, 2
+            ) m
+            WHERE d.day = m.day AND d.ticker = m.ticker
+        """))
+        db.execute(text("DELETE FROM ticker_sentiment_daily WHERE total <= 0"))
+        db.execute(text(f"ALTER TABLE ticker_sentiment DETACH PARTITION {sentiments}"))
+        _drop_post_foreign_keys(db, sentiments)
+        if drop:
+            db.execute(text(f"DROP TABLE {sentiments}"))
+    if posts:
+        db.execute(text(f"DELETE FROM analysis_posts_link l USING {posts} p WHERE l.collected_post_id = p.id"))
+        db.execute(text(f"DELETE FROM post_keys k USING {posts} p WHERE k.post_id = p.post_id"))
+        db.execute(text(f"ALTER TABLE collected_posts DETACH PARTITION {posts}"))
+        if drop:
+            db.execute(text(f"DROP TABLE {posts}"))
+
+
+def detach_partitions_before(db: Session, before: date, drop: bool = False) -> List[str]:
+    """
+    before より前の月の collected_posts / ticker_sentiment のパーティションを切り離す (drop=True なら削除も)。
+    月ごとに 1 トランザクションで、両方の表と参照行を一緒に片付ける。切り離した名前の一覧を返す。
+    """
+    months: Dict[date, Dict[str, str]] = {}
+    for table in PARTITIONED_TABLES:
+        for partition in list_partitions(db, table):
+            if partition["month"] is None or add_months(partition["month"], 1) > before:
+                continue
+            months.setdefault(partition["month"], {})[table] = partition["name"]
+
+    detached = []
+    for month in sorted(months):
+        names = months[month]
+        try:
+            _detach_month(db, names.get("collected_posts"), names.get("ticker_sentiment"), drop)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        detached.extend(names.values())
+    return detached
+
+
+def check_consistency(db: Session) -> Dict[str, int]:
+    """投稿が無くなった参照行を数える (キー -> 件数。すべて 0 なら整合している)。"""
+    checks = {
+        # 外部キーは DEFERRABLE なので、同じ月の投稿が無いセンチメントはトランザクション途中以外では出ないはず
+        "ticker_sentiment without post": """
+            SELECT count(*) FROM ticker_sentiment s
+            WHERE NOT EXISTS (SELECT 1 FROM collected_posts p WHERE p.id = s.collected_post_id AND p.posted_at = s.posted_at)
+        """,
+        "analysis_posts_link without post": """
+            SELECT count(*) FROM analysis_posts_link l
+            WHERE NOT EXISTS (SELECT 1 FROM collected_posts p WHERE p.id = l.collected_post_id)
+        """,
+        # アーカイブした投稿のキー (archived) は投稿が無くても残す
+        "post_keys without post": """
+            SELECT count(*) FROM post_keys k
+            WHERE NOT k.archived AND NOT EXISTS (SELECT 1 FROM collected_posts p WHERE p.post_id = k.post_id)
+        """,
+    }
+    return {name: db.execute(text(sql)).scalar() for name, sql in checks.items()}
+
+
+def _parse_month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monthly partition maintenance for collected_posts / ticker_sentiment.")
+    parser.add_argument("--ensure", type=int, metavar="MONTHS", help="Create partitions up to MONTHS months ahead")
+    parser.add_argument("--detach-before", type=_parse_month, metavar="YYYY-MM",
+                        help="Detach the partitions of the months before YYYY-MM")
+    parser.add_argument("--drop", action="store_true", help="Drop the detached partitions")
+    parser.add_argument("--list", action="store_true", help="List the partitions")
+    parser.add_argument("--check", action="store_true", help="Count rows that point at missing posts")
+    args = parser.parse_args()
+
+    if args.ensure is not None:
+        print(f"Created: {ensure_partitions(months_ahead=args.ensure, move_stray=True) or 'nothing'}")
+    session = SessionLocal()
+    try:
+        if args.detach_before:
+            names = detach_partitions_before(session, args.detach_before, drop=args.drop)
+            print(f"{'Dropped' if args.drop else 'Detached'}: {names or 'nothing'}")
+        if args.list:
+            for table in PARTITIONED_TABLES:
+                for partition in list_partitions(session, table):
+                    print(f"{partition['name']:<36} {partition['bound']}")
+        if args.check:
+            problems = {name: count for name, count in check_consistency(session).items() if count}
+            for name, count in problems.items():
+                print(f"{name}: {count}")
+            print("Consistent." if not problems else "Inconsistent rows found.")
+            if problems:
+                raise SystemExit(1)
+    finally:
+        session.close()
@@ -0,0 +1,148 @@
+# utils_search.py
+"""
+Keyword search over collected_posts.original_text.
+
+match_mode:
+  substring : 従来どおりの部分一致 (ILIKE)。pg_trgm GIN index のみで候補を絞る。新しい順。
+              バイグラム tsvector の位置は 16383 で頭打ちになり、同じ語彙素の位置は 256 個までしか
+              持たないので、隣接 tsquery (<->) を併用すると長い投稿の一致を取りこぼす。
+  fulltext  : キーワードの全バイグラムを含む投稿を ts_rank_cd (近接度) の順に返す。
+  fuzzy     : pg_trgm の word_similarity による表記ゆれ・タイポ許容検索。類似度の順。
+
+DB 側の関数 / 列は alembic 000002_search を参照。
+
+fuzzy の `%>` は pg_trgm.word_similarity_threshold を使う。検索ごとに set_config を
+発行すると1ページ3クエリになるので、models.engine の接続を作るときに1回だけ設定する
+(SEARCH_FUZZY_THRESHOLD)。
+"""
+
+import html
+import os
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event, func
+
+from models import CollectedPost, engine
+
+MATCH_MODES = ('substring', 'fulltext', 'fuzzy')
+DEFAULT_MATCH_MODE = 'substring'
+RANKED_MATCH_MODES = ('fulltext', 'fuzzy')
+
+FUZZY_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.4"))
+SNIPPET_RADIUS = 60
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@event.listens_for(engine, "connect")
+def _set_fuzzy_threshold(dbapi_connection, connection_record):
+    # セッション単位の設定なので、プールに戻してロールバックされても残るようにコミットしておく
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                       (str(FUZZY_SIMILARITY_THRESHOLD),))
+    finally:
+        cursor.close()
+    dbapi_connection.commit()
+
+
+def normalize_match_mode(value) -> str:
+    return value if value in MATCH_MODES else DEFAULT_MATCH_MODE
+
+
+def effective_match_mode(keyword: str, match_mode) -> str:
+    """
+    バイグラムが作れない (空白除去後1文字の) キーワードはランク付き検索ができないので
+    部分一致にフォールバックする。
+    """
+    mode = normalize_match_mode(match_mode)
+    if mode == 'fulltext' and len(_WHITESPACE_RE.sub('', keyword)) < 2:
+        return 'substring'
+    return mode
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+
+def keyword_condition(keyword: str, match_mode: str):
+    """
+    キーワード条件と、ランク付きモードではその並び順に使うスコア式を返す。
+
+    Returns:
+        (WHERE 条件のリスト, スコア式 or None)
+    """
+    if match_mode == 'fulltext':
+        tsquery = func.post_search_tsquery(keyword, '&')
+        return (
+            [CollectedPost.search_vector.op('@@')(tsquery)],
+            func.ts_rank_cd(CollectedPost.search_vector, tsquery),
+        )
+
+    if match_mode == 'fuzzy':
+        # `text %> kw` は word_similarity(kw, text) > pg_trgm.word_similarity_threshold で、GIN index を使える
+        # (閾値は接続時に設定済み)
+        return (
+            [CollectedPost.original_text.op('%>')(keyword)],
+            func.word_similarity(keyword, CollectedPost.original_text),
+        )
+
+    # 3文字以上なら pg_trgm の GIN index (ix_collected_posts_original_text_trgm) が使える
+    return [CollectedPost.original_text.ilike(f"%{_escape_like(keyword)}%", escape='/')], None
+
+
+def _find_spans(body: str, keyword: str, match_mode: str) -> List[Tuple[int, int]]:
+    """本文中でハイライトする範囲 [(start, end), ...] を返す (大文字小文字は区別しない)。"""
+    lowered = body.lower()
+    terms = [keyword.lower()]
+    if match_mode in RANKED_MATCH_MODES:
+        terms += [t for t in _WHITESPACE_RE.split(keyword.lower()) if t]
+
+    for term in terms:
+        spans = [(m.start(), m.end()) for m in re.finditer(re.escape(term), lowered)]
+        if spans:
+            return spans
+
+    if match_mode != 'fulltext':
+        return []
+
+    # 完全一致が無い場合は、キーワードのバイグラムに一致する箇所を連結してハイライトする
+    normalized = _WHITESPACE_RE.sub('', keyword.lower())
+    bigrams = {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+    spans: List[Tuple[int, int]] = []
+    for i in range(len(lowered) - 1):
+        if lowered[i:i + 2] in bigrams:
+            if spans and spans[-1][1] >= i:
+                spans[-1] = (spans[-1][0], i + 2)
+            else:
+                spans.append((i, i + 2))
+    return spans
+
+
+def build_snippet(body: Optional[str], keyword: str, match_mode: str, radius: int = SNIPPET_RADIUS) -> str:
+    """
+    最初の一致箇所の前後 radius 文字を切り出し、一致部分を <mark> で囲んだ HTML を返す。
+    本文は HTML エスケープ済み。一致が無ければ先頭を返す。
+    """
+    body = body or ''
+    spans = _find_spans(body, keyword, match_mode)
+    if not spans:
+        snippet = html.escape(body[:radius * 2])
+        return snippet + ('…' if len(body) > radius * 2 else '')
+
+    start = max(0, spans[0][0] - radius)
+    end = min(len(body), spans[0][1] + radius)
+
+    parts = ['…' if start > 0 else '']
+    pos = start
+    for span_start, span_end in spans:
+        if span_end <= start or span_start >= end:
+            continue
+        span_start, span_end = max(span_start, start), min(span_end, end)
+        parts.append(html.escape(body[pos:span_start]))
+        parts.append(f"<mark>{html.escape(body[span_start:span_end])}</mark>")
+        pos = span_end
+    parts.append(html.escape(body[pos:end]))
+    parts.append('…' if end < len(body) else '')
+    return ''.join(parts)
@@ -0,0 +1,229 @@
+# utils_suggest.py
+"""
+In-memory autocomplete index for /api/suggest.
+
+StockTickerMap is small (hundreds to a few thousand rows) and changes rarely, so
+each process keeps a SuggestIndex built from it and answers every keystroke
+without a database round trip:
+
+  - a prefix trie over tickers, normalized company names and each word of the
+    company name. Every node keeps its best few entries, so a prefix lookup is
+    a walk of len(query) nodes.
+  - a trigram inverted index for fuzzy matches (typos, partial words).
+
+Results are ranked exact ticker > ticker prefix > company name prefix >
+company word prefix > fuzzy (trigram similarity).
+
+The index lives in the utils_db reference cache under "ticker_index". It is
+rebuilt after StockTickerMap writes through the same invalidation (including
+LISTEN/NOTIFY across processes).
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, StockTickerMap
+from utils_db import get_cached
+
+SUGGEST_LIMIT = 10
+# 各トライノードに保持する候補数 (表示件数より多めに持ち、重複除去後も足りるようにする)
+NODE_CANDIDATES = 32
+# トライの深さの上限。これより長いクエリは上限の深さのノードの候補を文字列比較で絞る
+MAX_TRIE_DEPTH = 12
+# あいまい検索: クエリのトライグラムのうち候補に含まれる割合 (pg_trgm の word_similarity 相当)
+FUZZY_MIN_SIMILARITY = 0.6
+# これより短いクエリはプレフィックス一致だけで十分なので、あいまい検索をしない
+FUZZY_MIN_QUERY_LENGTH = 4
+SUGGEST_INDEX_TTL = float(os.environ.get("SUGGEST_INDEX_TTL_SECONDS", "3600"))
+
+# ランク (小さいほど上位)
+RANK_EXACT_TICKER = 0
+RANK_TICKER_PREFIX = 1
+RANK_NAME_PREFIX = 2
+RANK_WORD_PREFIX = 3
+RANK_FUZZY = 4
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def normalize_query(value: Optional[str]) -> str:
+    """NFKC + casefold し、記号を空白に寄せる ("Berkshire Hathaway Inc." -> "berkshire hathaway inc")"""
+    value = unicodedata.normalize("NFKC", value or "").casefold()
+    return _NON_WORD_RE.sub(" ", value).strip()
+
+
+def trigrams(value: str) -> Set[str]:
+    """pg_trgm と同様に単語ごとに前2文字・後1文字の空白を補ってトライグラムを作る。"""
+    grams: Set[str] = set()
+    for word in value.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass(frozen=True)
+class TickerEntry:
+    ticker: str
+    company_name: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.ticker} ({self.company_name})"
+
+
+class _TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.entries: List[int] = []
+
+
+class _Trie:
+    """各ノードに (挿入順 = 優先順の) 上位 NODE_CANDIDATES 件の entry id を持つプレフィックス木。"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.keys: Dict[int, List[str]] = {}
+
+    def insert(self, key: str, entry_id: int) -> None:
+        self.keys.setdefault(entry_id, []).append(key)
+        node = self.root
+        for ch in key[:MAX_TRIE_DEPTH]:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _TrieNode()
+            node = child
+            if len(node.entries) < NODE_CANDIDATES and entry_id not in node.entries:
+                node.entries.append(entry_id)
+
+    def lookup(self, prefix: str) -> List[int]:
+        node = self.root
+        for ch in prefix[:MAX_TRIE_DEPTH]:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        if len(prefix) <= MAX_TRIE_DEPTH:
+            return node.entries
+        return [entry_id for entry_id in node.entries
+                if any(key.startswith(prefix) for key in self.keys[entry_id])]
+
+
+class SuggestIndex:
+    def __init__(self, rows: Sequence[Tuple[str, str, Optional[str]]]):
+        """rows: (ticker, company_name, gics_sector)"""
+        # 短いティッカー・アルファベット順を優先 (トライの各ノードはこの順で埋まる)
+        rows = sorted(rows, key=lambda r: (len(r[0]), r[0]))
+        self.entries = [TickerEntry(ticker, company_name or "") for ticker, company_name, _ in rows]
+        self.by_ticker = {normalize_query(e.ticker): i for i, e in enumerate(self.entries)}
+        self.sectors = sorted({sector for _, _, sector in rows if sector})
+
+        self.ticker_trie = _Trie()
+        self.name_trie = _Trie()
+        self.word_trie = _Trie()
+        self.trigram_index: Dict[str, List[int]] = {}
+        self.trigram_counts: List[int] = []
+
+        for entry_id, entry in enumerate(self.entries):
+            ticker_key = normalize_query(entry.ticker)
+            name_key = normalize_query(entry.company_name)
+            self.ticker_trie.insert(ticker_key, entry_id)
+            self.name_trie.insert(name_key, entry_id)
+            for word in name_key.split()[1:]:
+                self.word_trie.insert(word, entry_id)
+
+            grams = trigrams(f"{ticker_key} {name_key}")
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigram_index.setdefault(gram, []).append(entry_id)
+
+    def _fuzzy(self, query: str, exclude: Set[int], limit: int) -> List[int]:
+        query_grams = trigrams(query)
+        if len(query) < FUZZY_MIN_QUERY_LENGTH or not query_grams:
+            return []
+        shared: Counter = Counter()
+        for gram in query_grams:
+            shared.update(self.trigram_index.get(gram, ()))
+        scored = []
+        for entry_id, common in shared.items():
+            if entry_id in exclude:
+                continue
+            similarity = common / len(query_grams)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                # 同程度なら候補側の語が短い (余計な語が少ない) ものを上に
+                scored.append((-similarity, self.trigram_counts[entry_id], entry_id))
+        scored.sort()
+        return [entry_id for _, _, entry_id in scored[:limit]]
+
+    def search(self, query: str, limit: int = SUGGEST_LIMIT) -> List[Tuple[int, TickerEntry]]:
+        """[(rank, entry), ...] をランク順に返す。"""
+        q = normalize_query(query)
+        if not q:
+            return []
+
+        seen: Set[int] = set()
+        results: List[Tuple[int, TickerEntry]] = []
+
+        def _add(rank: int, entry_ids) -> None:
+            for entry_id in entry_ids:
+                if len(results) >= limit:
+                    return
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    results.append((rank, self.entries[entry_id]))
+
+        exact = self.by_ticker.get(q)
+        if exact is not None:
+            _add(RANK_EXACT_TICKER, [exact])
+        _add(RANK_TICKER_PREFIX, self.ticker_trie.lookup(q))
+        _add(RANK_NAME_PREFIX, self.name_trie.lookup(q))
+        _add(RANK_WORD_PREFIX, self.word_trie.lookup(q))
+        if len(results) < limit:
+            _add(RANK_FUZZY, self._fuzzy(q, seen, limit - len(results)))
+        return results
+
+    def search_sectors(self, query: str, limit: int = SUGGEST_LIMIT) -> List[str]:
+        q = normalize_query(query)
+        if not q:
+            return []
+        prefix = [s for s in self.sectors if normalize_query(s).startswith(q)]
+        contains = [s for s in self.sectors if q in normalize_query(s) and s not in prefix]
+        return (prefix + contains)[:limit]
+
+
+def build_suggest_index(db: Session) -> SuggestIndex:
+    rows = db.query(StockTickerMap.ticker, StockTickerMap.company_name, StockTickerMap.gics_sector).all()
+    return SuggestIndex([tuple(row) for row in rows])
+
+
+def get_suggest_index(db: Session) -> SuggestIndex:
+    """プロセス内の索引を返す (無ければ構築)。StockTickerMap の書き込みで無効化される。"""
+    return get_cached("ticker_index", lambda: build_suggest_index(db), ttl=SUGGEST_INDEX_TTL)
+
+
+def suggest(db: Session, query: str, search_type: str = 'ticker', limit: int = SUGGEST_LIMIT) -> List[Dict]:
+    """/api/suggest のレスポンス形式 [{"value": ..., "label": ...}, ...] で候補を返す。"""
+    index = get_suggest_index(db)
+    if search_type == 'sector':
+        return [{"value": sector, "label": sector} for sector in index.search_sectors(query, limit)]
+    return [{"value": entry.ticker, "label": entry.label} for _, entry in index.search(query, limit)]
+
+
+def warm_suggest_index() -> None:
+    """起動時にバックグラウンドで索引を構築しておく (失敗しても最初のリクエストで再試行される)。"""
+    def _warm():
+        db = SessionLocal()
+        try:
+            get_suggest_index(db)
+        except Exception as e:
+            print(f"Suggest index warm-up failed: {e}")
+        finally:
+            db.close()
+    threading.Thread(target=_warm, name="suggest-index-warmup", daemon=True).start()
@@ -2,15 +2,20 @@ import os
 import json
 from dotenv import load_dotenv
 # import tweepy # (★) tweepy は使わない
-from models import SessionLocal, CollectedPost, Setting, StockTickerMap, Prompt, TargetAccount
+from models import engine, SessionLocal, CollectedPost, StockTickerMap, Prompt, TargetAccount
 from datetime import datetime, timezone
 from dateutil.parser import parse
 import time
 import requests
 from sqlalchemy.exc import IntegrityError
 from requests_oauthlib import OAuth1Session
-from utils_db import _run_analysis_logic, AVAILABLE_MODELS, client_openai, DEFAULT_PROMPT_KEY, get_current_prompt
+from utils_db import _run_analysis_logic, AVAILABLE_MODELS, client_openai, DEFAULT_PROMPT_KEY, get_current_prompt_record, get_current_provider, claim_post_key
 from calculate_weights import recalculate_all_weights
+from utils_parser import compute_content_fingerprint
+from utils_partitions import ensure_partitions
+from worker_events import emit_event
+from query_profiler import instrument_engine as instrument_query_profiler, profile_queries
+from metrics import instrument_engine, observe_stage, count_posts_fetched, count_post_saved, export_worker_metrics
 import logging
 import sys
 
@@ -155,11 +160,23 @@ def get_latest_posts_from_threads(user_id, since_timestamp=None):
 # ▲▲▲【変更ここまで】▲▲▲
 
 def run_worker():
+    instrument_engine(engine)
+    instrument_query_profiler(engine)
+    # 先の月のパーティションを用意しておく (既にあれば何もしない)。既定パーティションからの行の移動は cron の --ensure に任せる。
+    # 失敗しても収集は続ける (既定パーティションに入る)
+    try:
+        created = ensure_partitions()
+        if created:
+            print(f"Created partitions: {created}")
+    except Exception as e:
+        print(f"Partition maintenance failed: {e}")
     db = SessionLocal()
+    # 進捗イベント用の累計 (管理画面のライブ表示で使う)
+    started_at = time.monotonic()
+    totals = {"fetched": 0, "saved": 0, "analyzed": 0, "cost_usd": 0.0}
     try:
         # DBからAPI選択設定を取得
-        api_provider_setting = db.query(Setting).filter(Setting.key == "api_provider").first()
-        API_PROVIER = api_provider_setting.value if api_provider_setting else "X"
+        API_PROVIER = get_current_provider(db)
 
         print(f"worker sttarted at {datetime.now(timezone.utc).isoformat()} (Provider: {API_PROVIER})")
 
@@ -171,7 +188,7 @@ def run_worker():
         else:
             try:
                 ticker_maps = db.query(StockTickerMap).all()
-                current_prompt_obj = get_current_prompt(db)
+                current_prompt_obj = get_current_prompt_record(db)
                 if not current_prompt_obj:
                     raise Exception("現在選択されているプロンプトが取得できません。")
                 prompt_template_text = current_prompt_obj.template_text
@@ -189,6 +206,7 @@ def run_worker():
                 print("Workerは分析を実行せず、投稿収集のみ行います。")
                 run_ai_analysis = False
 
+        emit_event("run_started", provider=API_PROVIER, analysis_enabled=run_ai_analysis)
 
         target_list = []
         fetch_function = None
@@ -236,14 +254,17 @@ def run_worker():
         for target in target_list:
             username_to_process = provider_username_map.get(target)
             print(f"---- Processing user: {target} (as user: {username_to_process}) ----")
+            emit_event("account_started", account=username_to_process)
+            account_saved = account_analyzed = 0
         
             latest_post_in_db = db.query(CollectedPost).filter(CollectedPost.username == username_to_process).order_by(CollectedPost.id.desc()).first()
             since_value = get_since_value(latest_post_in_db)
 
-            if API_PROVIER == "X":
-                success, raw_posts = fetch_function(oauth_session, target, since_id=since_value) # (★) client_x -> oauth_session
-            elif API_PROVIER == "Threads":
-                success, raw_posts = fetch_function(target, since_value)
+            with observe_stage("fetch"):
+                if API_PROVIER == "X":
+                    success, raw_posts = fetch_function(oauth_session, target, since_id=since_value) # (★) client_x -> oauth_session
+                elif API_PROVIER == "Threads":
+                    success, raw_posts = fetch_function(target, since_value)
 
             if not success:
                 print(f"Failed to fetch posts for user: {target}. Skipping.")
@@ -253,6 +274,9 @@ def run_worker():
                 continue
                 
             print(f"Fetched {len(raw_posts)} new posts for user: {target}.")
+            totals["fetched"] += len(raw_posts)
+            count_posts_fetched(API_PROVIER, len(raw_posts))
+            emit_event("posts_fetched", account=username_to_process, count=len(raw_posts))
             
             # --- 投稿ごとのループ (古い順) ---
             for raw_post in reversed(raw_posts):
@@ -265,9 +289,17 @@ def run_worker():
                 post_text_preview = normalized_data.get("text", "")[:30]
                 print(f"Processing new post: {post_id_to_print} - {post_text_preview}...")
 
+                content_fingerprint = compute_content_fingerprint(normalized_data["text"] or "", normalized_data["posted_at"])
+                # 同じ post_id / 同じ本文が既に (テキストインポート等で) 登録済みなら post_keys で弾かれ、再分析されない
+                if not claim_post_key(db, normalized_data["post_id"], normalized_data["username"], content_fingerprint):
+                    db.rollback()
+                    print(f"Saved Post {normalized_data['post_id']} already exists. Skipping.")
+                    continue
+
                 new_collected_post = CollectedPost(
                     username=normalized_data["username"],
                     post_id=normalized_data["post_id"],
+                    content_fingerprint=content_fingerprint,
                     original_text=normalized_data["text"],
                     ai_summary=None,
                     link_summary=None,
@@ -288,32 +320,47 @@ def run_worker():
                         try:
                             print(f" -> Running AI analysis for DB ID: {new_collected_post.id}...")
                             
-                            ai_result = _run_analysis_logic(
-                                db=db,
-                                posts_to_analyze=[new_collected_post],
-                                prompt_text=prompt_template_text,
-                                selected_model=ai_model_to_use,
-                                selected_prompt_name=prompt_name_to_use,
-                                ticker_context_map=ticker_maps
-                            )
+                            with observe_stage("analysis"), profile_queries("worker:analysis", log=True):
+                                ai_result = _run_analysis_logic(
+                                    db=db,
+                                    posts_to_analyze=[new_collected_post],
+                                    prompt_text=prompt_template_text,
+                                    selected_model=ai_model_to_use,
+                                    selected_prompt_name=prompt_name_to_use,
+                                    ticker_context_map=ticker_maps
+                                )
                             print(f" -> AI analysis COMPLETED (Cost: ${ai_result.get('cost_usd', 0):.6f})")
+                            account_analyzed += 1
+                            totals["analyzed"] += 1
+                            totals["cost_usd"] += ai_result.get('cost_usd', 0) or 0
+                            emit_event("post_analyzed", account=username_to_process, post_db_id=new_collected_post.id,
+                                       cost_usd=ai_result.get('cost_usd', 0))
 
                             # 追加: この投稿により更新された total_mentions を元に
                             # weight_ratio を再計算してターゲット管理ページに即時反映させる
                             try:
                                 print(" -> Recalculating user ticker weight ratios...")
-                                recalculate_all_weights()
+                                with observe_stage("weights"), profile_queries("worker:weights", log=True):
+                                    recalculate_all_weights()
                                 print(" -> Recalculation completed.")
                             except Exception as e:
                                 print(f" -> Failed to recalculate weights: {e}")
 
                         except Exception as ai_e:
                             print(f"!!!!!!!! AI analysis FAILED for DB ID {new_collected_post.id}: {ai_e} !!!!!!!!")
+                            emit_event("post_failed", account=username_to_process, post_id=normalized_data['post_id'],
+                                       stage="analysis", error=str(ai_e))
                     # --- AI分析ここまで ---
 
                     # (★) 3. トランザクションをコミット
-                    db.commit()
+                    with observe_stage("save"), profile_queries("worker:save", log=True):
+                        db.commit()
                     print(f"Saved post {normalized_data['post_id']} to database.")
+                    count_post_saved(API_PROVIER)
+                    account_saved += 1
+                    totals["saved"] += 1
+                    emit_event("post_saved", account=username_to_process, post_id=normalized_data['post_id'],
+                               post_db_id=new_collected_post.id)
 
                 except IntegrityError as e:
                     db.rollback()
@@ -324,10 +371,13 @@ def run_worker():
                 except Exception as e:
                     db.rollback()
                     print(f"An unexpected error occurred while saving post {normalized_data['post_id']}: {e}")
+                    emit_event("post_failed", account=username_to_process, post_id=normalized_data['post_id'],
+                               stage="save", error=str(e))
 
                 print(f"Waiting {SLEEP_TIME_SECONDS_BETWEEN_POSTS} seconds before next post...")
                 time.sleep(SLEEP_TIME_SECONDS_BETWEEN_POSTS)
 
+            emit_event("account_finished", account=username_to_process, saved=account_saved, analyzed=account_analyzed)
             print(f"Waiting {SLEEP_TIME_SECONDS_BETWEEN_USER} seconds before next user...")
             time.sleep(SLEEP_TIME_SECONDS_BETWEEN_USER)
 
@@ -336,6 +386,8 @@ def run_worker():
         db.rollback()
     finally:
         db.close()
+        emit_event("run_finished", elapsed_seconds=round(time.monotonic() - started_at, 1), **totals)
+        export_worker_metrics()
         print("Worker finished.")
 
 def normalize_post_data(raw_post, provider, username=None):
@@ -0,0 +1,47 @@
+# worker_events.py
+"""
+Structured progress events emitted by worker.py.
+
+The worker prints each event to stdout as one line,
+
+    @@worker-event {"event": "posts_fetched", "ts": "...", "account": "foo", "count": 12}
+
+interleaved with its normal log output. When the worker is started from the
+admin page, app.admin_worker relays its stdout and appends the event lines to
+logs/worker_events.jsonl (one file per run, headed by its run id). The page
+polls /admin/worker/events?run=<run_id>&offset=N for the lines after the
+offset it has read. When run from a shell or cron, the lines simply appear
+in the log.
+
+Events: run_started, account_started, posts_fetched, post_saved,
+post_analyzed, post_failed, account_finished, run_finished
+(app.admin_worker adds process_exited).
+"""
+
+import json
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional, Union
+
+EVENT_PREFIX = "@@worker-event "
+
+
+def emit_event(event: str, **fields) -> None:
+    """イベントを1行の JSON として stdout に書き、すぐに flush する (パイプ越しでも遅延しないように)。"""
+    payload = {"event": event, "ts": datetime.now(timezone.utc).isoformat()}
+    payload.update(fields)
+    sys.stdout.write(EVENT_PREFIX + json.dumps(payload, ensure_ascii=False, default=str) + "\n")
+    sys.stdout.flush()
+
+
+def parse_event_line(line: Union[str, bytes]) -> Optional[Dict]:
+    """イベント行ならその dict を、通常のログ行なら None を返す。"""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        payload = json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None